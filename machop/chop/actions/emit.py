@@ -1,5 +1,6 @@
 import torch.nn
 import os
+from collections.abc import Mapping
 from os import PathLike
 from ..tools.checkpoint_load import load_model
 
@@ -67,11 +68,11 @@ def emit(
     # TEMPORARY: Update the metadata (see https://github.com/jianyicheng/mase-tools/issues/502)
     for node in mg.fx_graph.nodes:
         for arg, arg_info in node.meta["mase"]["common"]["args"].items():
-            if isinstance(arg_info, dict):
+            if isinstance(arg_info, Mapping):
                 arg_info["type"] = "fixed"
                 arg_info["precision"] = [8, 3]
         for result, result_info in node.meta["mase"]["common"]["results"].items():
-            if isinstance(result_info, dict):
+            if isinstance(result_info, Mapping):
                 result_info["type"] = "fixed"
                 result_info["precision"] = [8, 3]
 
@@ -63,7 +63,8 @@ class GraphSearchSpaceMixedPrecisionPTQ(SearchSpaceBase):
             )
             self.mg = mg
         if sampled_config is not None:
-            mg, _ = quantize_transform_pass(self.mg, sampled_config)
+            # quantize a copy sharing the weights, so trials start from the same baseline
+            mg, _ = quantize_transform_pass(self.mg.clone(), sampled_config)
         mg.model.to(self.accelerator)
         return mg
 
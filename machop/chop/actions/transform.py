@@ -7,7 +7,7 @@ import torch
 import pytorch_lightning as pl
 import copy
 import pdb
-from chop.passes.graph import PASSES
+from chop.passes.graph import PASSES, PassManager
 from chop.passes.graph.analysis import (
     add_common_metadata_analysis_pass,
     add_software_metadata_analysis_pass,
@@ -128,6 +128,29 @@ def conv_flop(model, act_masks, dict_weight_masks):
     return conv_flop_before_prune, conv_flop_after_prune
 
 
+def post_train_quantize(
+    pl_model, cf_args, model_info, data_module, task, accelerator, quantize_config
+):
+    """Quantize a fresh graph of the (fine-tuned) model, ready for Huffman coding."""
+    graph = MaseGraph(model=pl_model, cf_args=cf_args)
+    graph, _ = init_metadata_analysis_pass(graph, pass_args=None)
+    dummy_in = get_dummy_input(
+        model_info=model_info, data_module=data_module, task=task, device=accelerator
+    )
+    graph, _ = add_common_metadata_analysis_pass(
+        graph, pass_args={"dummy_in": dummy_in}
+    )
+    graph, _ = add_software_metadata_analysis_pass(graph, pass_args=None)
+    graph, _ = metadata_value_type_cast_transform_pass(
+        graph, pass_args={"fn": to_numpy_if_tensor}
+    )
+    graph, _ = PASSES["quantize"](graph, pass_args=quantize_config | {"by": "type"})
+    graph, _ = add_software_metadata_analysis_pass(
+        graph, pass_args={"incremental": True}
+    )
+    return graph
+
+
 def transform(
     model: torch.nn.Module,
     model_info,
@@ -194,12 +217,14 @@ def transform(
 
     # graph generation
     graph = MaseGraph(model=model, cf_args=cf_args)
+    # runs the passes below, skipping analyses that are still valid
+    pass_manager = PassManager(graph)
     # graph_metadata = Mase
-    graph, _ = init_metadata_analysis_pass(graph, pass_args=None)
+    graph, _ = pass_manager.run("init_metadata")
 
     # create metadata
     if load_name is not None and load_type == "mz":
-        graph, _ = load_mase_graph_interface_pass(graph, pass_args=load_name)
+        graph, _ = pass_manager.run("load_mase_graph", pass_args=load_name)
     else:
         dummy_in = get_dummy_input(
             model_info=model_info,
@@ -209,12 +234,11 @@ def transform(
         )  # generate dummy_in for generating metadata & generating weight mask
         if len(graph.model.additional_inputs) > 0:
             dummy_in = dummy_in | graph.model.additional_inputs
-        graph, _ = add_common_metadata_analysis_pass(
-            graph, pass_args={"dummy_in": dummy_in}
-        )  # generate common_metadata
-        graph, _ = add_software_metadata_analysis_pass(
-            graph, pass_args=None
-        )  # generate software_metadata
+        # also the arguments when common metadata is re-generated as a prerequisite
+        pass_manager.pass_args["add_common_metadata"] = {"dummy_in": dummy_in}
+        # generate common_metadata and software_metadata
+        graph, _ = pass_manager.run("add_common_metadata")
+        graph, _ = pass_manager.run("add_software_metadata")
 
     pass_config = config["passes"]  # config set in "toml" file
     huffman_pass_config = copy.deepcopy(pass_config)
@@ -231,7 +255,12 @@ def transform(
                 graph, _ = metadata_value_type_cast_transform_pass(
                     graph, pass_args={"fn": to_numpy_if_tensor}
                 )
-                graph, _ = PASSES["quantize"](graph, pass_args=pass_config)
+                graph, _ = pass_manager.run("quantize", pass_args=pass_config)
+                # quantize updates the common metadata of the layers it replaces and
+                # marks them dirty, re-analyse the software metadata of those only
+                graph, _ = pass_manager.run(
+                    "add_software_metadata", pass_args={"incremental": True}
+                )
                 is_quantize = True
 
                 """
@@ -281,7 +310,7 @@ def transform(
                 graph, _ = metadata_value_type_cast_transform_pass(
                     graph, pass_args={"fn": to_numpy_if_tensor}
                 )
-                graph, _ = save_mase_graph_interface_pass(graph, pass_args=save_dir)
+                graph, _ = pass_manager.run("save_mase_graph", pass_args=save_dir)
                 logger.info(f"model is successfully quantized and saved to {save_dir}!")
 
             case "profile_statistics":
@@ -292,45 +321,45 @@ def transform(
                     which_dataloader="train",
                 )
                 pass_config["input_generator"] = input_generator
-                graph, _ = PASSES[pass_name](graph, pass_args=pass_config)
+                graph, _ = pass_manager.run(pass_name, pass_args=pass_config)
             case "report_graph":
                 pass_file_name = pass_config.get(
                     "file_name", save_dir / "report_graph.txt"
                 )
-                graph, _ = PASSES[pass_name](graph, file_name=pass_file_name)
+                graph, _ = pass_manager.run(pass_name, file_name=pass_file_name)
             case "report_node_type":
-                graph, _ = PASSES[pass_name](graph, pass_args=None)
+                graph, _ = pass_manager.run(pass_name, pass_args=None)
             case "report_node_meta_param":
                 # {"save_path": ..., "which": "all"|["common", "hardware", "software"]}
                 pass_save_path = pass_config.get("save_path", save_dir / "report")
                 pass_config["save_path"] = pass_save_path
-                graph, _ = PASSES[pass_name](graph, pass_args=pass_config)
+                graph, _ = pass_manager.run(pass_name, pass_args=pass_config)
             case "report_node_shape":
-                graph, _ = PASSES[pass_name](graph, pass_args=None)
+                graph, _ = pass_manager.run(pass_name, pass_args=None)
             case "report_node_type":
-                graph, _ = PASSES[pass_name](graph, pass_args=None)
+                graph, _ = pass_manager.run(pass_name, pass_args=None)
             case "report_node_hardware_type":
-                graph, _ = PASSES[pass_name](graph, pass_args=None)
+                graph, _ = pass_manager.run(pass_name, pass_args=None)
             case "report_node_shape":
-                graph, _ = PASSES[pass_name](graph, pass_args=None)
+                graph, _ = pass_manager.run(pass_name, pass_args=None)
             case "report_node_type":
-                graph, _ = PASSES[pass_name](graph, pass_args=None)
+                graph, _ = pass_manager.run(pass_name, pass_args=None)
             case "load_mase_graph":
                 pass_load_dir = pass_config["load_dir"]
-                graph, _ = PASSES[pass_name](graph, pass_args=pass_load_dir)
+                graph, _ = pass_manager.run(pass_name, pass_args=pass_load_dir)
             case "load_node_meta_param":
                 pass_load_path = pass_config["load_path"]
-                graph, _ = PASSES[pass_name](graph, pass_args=pass_load_path)
+                graph, _ = pass_manager.run(pass_name, pass_args=pass_load_path)
             case "save_mase_graph":
                 pass_save_dir = pass_config.get(
                     "save_dir", save_dir / "saved_mase_graph"
                 )
-                graph, _ = PASSES[pass_name](graph, pass_args=pass_save_dir)
+                graph, _ = pass_manager.run(pass_name, pass_args=pass_save_dir)
             case "save_node_meta_param":
                 pass_save_path = pass_config.get(
                     "save_path", save_dir / "saved_node_meta_param"
                 )
-                graph, _ = PASSES[pass_name](graph, pass_args=pass_save_path)
+                graph, _ = pass_manager.run(pass_name, pass_args=pass_save_path)
 
             case "prune":
                 input_generator = InputGenerator(
@@ -366,16 +395,12 @@ def transform(
                 )
 
                 # pruning process
-                graph, _ = PASSES[pass_name](
-                    graph,
-                    batch_size,
-                    pass_config,
-                )
+                graph, _ = pass_manager.run(pass_name, batch_size, pass_config)
 
                 # calculate the pruning sparsity
-                graph, sparsity_info, weight_masks, act_masks = PASSES[
-                    "add_pruning_metadata"
-                ](graph, {"dummy_in": dummy_in, "add_value": False})
+                graph, sparsity_info, weight_masks, act_masks = pass_manager.run(
+                    "add_pruning_metadata", {"dummy_in": dummy_in, "add_value": False}
+                )
 
                 """
                 weight pruning is of static process, where the weight mask for each layer remains during fine-tuning
@@ -459,7 +484,7 @@ def transform(
                 graph, _ = metadata_value_type_cast_transform_pass(
                     graph, pass_args={"fn": to_numpy_if_tensor}
                 )
-                graph, _ = save_mase_graph_interface_pass(graph, pass_args=save_dir)
+                graph, _ = pass_manager.run("save_mase_graph", pass_args=save_dir)
                 logger.info(f"model is successfully pruned and saved to {save_dir}!")
 
             case "retrain":
@@ -534,6 +559,21 @@ def transform(
                     ]
                     plt_trainer_args["logger"] = visualizer
 
+                """
+                gradual pruning: raise the sparsity of the pruning masks while training
+                """
+                prune_schedule = config["passes"].get("prune", {}).get("schedule")
+                if prune_schedule is not None:
+                    from chop.passes.graph.transforms.pruning.schedule import (
+                        GradualPruningCallback,
+                    )
+
+                    plt_trainer_args.setdefault("callbacks", []).append(
+                        GradualPruningCallback.from_config(
+                            config["passes"]["prune"]["weight"], prune_schedule
+                        )
+                    )
+
                 plugins = None
                 plt_trainer_args["plugins"] = plugins
 
@@ -617,27 +657,35 @@ def transform(
                     """
                     Huffman Encoding must follow quantization, so that weight elemnets are in a finite set
                     """
-                    layer_huffman_info = PASSES["huffman"](
+                    huffman_graph = post_train_quantize(
                         pl_model,
                         cf_args,
                         model_info,
                         data_module,
                         task,
                         accelerator,
-                        huffman_pass_config,
+                        huffman_pass_config["quantize"],
+                    )
+                    save_dir = Path(huffman_save_dir)
+                    save_dir.mkdir(parents=True, exist_ok=True)
+                    huffman_args = {
+                        "save_path": save_dir / "huffman_model.mzc",
+                    } | {k: v for k, v in pass_config.items() if k != "is_huffman"}
+                    huffman_graph, huffman_report = PASSES["huffman"](
+                        huffman_graph, pass_args=huffman_args
                     )
                     """
                     Decode weights
                     """
-                    decoded_weights = PASSES["huffman_decode"](layer_huffman_info)
+                    decoded_weights = PASSES["huffman_decode"](huffman_report)
 
             case "remove_prune_wrappers":
                 # Removes the pruning-related hooks and makes pruning permanent
-                graph, _ = PASSES[pass_name](graph, pass_args=None)
+                graph, _ = pass_manager.run(pass_name, pass_args=None)
             case "conv_bn_fusion":
-                graph, _ = PASSES[pass_name](graph, pass_args=None)
+                graph, _ = pass_manager.run(pass_name, pass_args=None)
             case "logicnets_fusion":
-                graph, _ = PASSES[pass_name](graph, pass_args=pass_config)
+                graph, _ = pass_manager.run(pass_name, pass_args=pass_config)
             case "onnx_annotate":
                 onnx_dir = save_dir / "onnx"
                 onnx_dir.mkdir(parents=True, exist_ok=True)
@@ -645,15 +693,16 @@ def transform(
                     "save_path": onnx_dir,
                     "data_path": pass_config["data_path"],
                 }
-                graph, _ = PASSES[pass_name](graph, **kwargs)
+                graph, _ = pass_manager.run(pass_name, **kwargs)
             case _:
-                my_pass = PASSES[pass_name]
-                graph, _ = my_pass(graph, pass_args=pass_config)
+                graph, _ = pass_manager.run(pass_name, pass_args=pass_config)
 
         assert isinstance(
             graph, MaseGraph
         ), f"Return type of {pass_name} must be MaseGraph, got {type(graph)}"
 
+    logger.info(f"Pass timing:\n{pass_manager.report()}")
+
     """
     if save_dir is not None:
         transformed_ckpt = save_dir / "transformed_ckpt"
@@ -120,6 +120,7 @@ LOAD_TYPE = [
     "pt",  # PyTorch module state dictionary
     "pl",  # PyTorch Lightning checkpoint
     "mz",  # fx.GraphModule saved by MASE
+    "mzc",  # deep-compression checkpoint saved by the huffman pass
     "hf",  # HuggingFace's checkpoint directory saved by 'save_pretrained'
 ]
 OPTIMIZERS = ["adam", "sgd", "adamw"]
@@ -308,7 +309,7 @@ class ChopCLI:
 
         # Load from a checkpoint!
         load_name = None
-        load_types = ["pt", "pl", "mz"]
+        load_types = ["pt", "pl", "mz", "mzc"]
         if self.args.load_name is not None and self.args.load_type in load_types:
             load_name = self.args.load_name
 
@@ -342,7 +343,7 @@ class ChopCLI:
 
         # Load model from a checkpoint!
         load_name = None
-        load_types = ["pt", "pl", "mz"]
+        load_types = ["pt", "pl", "mz", "mzc"]
         if self.args.load_name is not None and self.args.load_type in load_types:
             load_name = self.args.load_name
 
@@ -467,7 +468,7 @@ class ChopCLI:
 
     def _run_search(self):
         load_name = None
-        load_types = ["pt", "pl", "mz"]
+        load_types = ["pt", "pl", "mz", "mzc"]
         if self.args.load_name is not None and self.args.load_type in load_types:
             load_name = self.args.load_name
 
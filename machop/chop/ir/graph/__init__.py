@@ -1,2 +1,2 @@
 from .mase_graph import MaseGraph, MaseTracer
-from .mase_metadata import MaseMetadata
+from .mase_metadata import MaseMetadata, TensorMetadata
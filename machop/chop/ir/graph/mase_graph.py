@@ -1,9 +1,13 @@
+import copy
+import enum
 import logging
 import math
 import os
+import weakref
+from collections import OrderedDict
 from pathlib import Path
 
-from types import FunctionType, ModuleType
+from types import FunctionType, MappingProxyType, MethodType, ModuleType
 from typing import Any, Callable, Dict, Optional, Tuple
 
 import toml
@@ -23,6 +27,8 @@ from torch.fx import wrap as fx_wrap
 import onnx
 from optimum.exporters.onnx import main_export
 from ...tools.onnx_importer import ONNX_Importer
+from .mase_graph_metadata import MaseGraphMetadata
+from .mase_metadata import copy_containers
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +90,282 @@ class MaseTracer(fx.Tracer):
         )
 
 
+# ----------------------------------------
+#   Mase Trace Cache
+# ----------------------------------------
+
+# Symbolic traces keyed on the model architecture, so that graphs built from the
+# same architecture (search spaces, train/transform jobs, ...) trace only once.
+# Entries are copied on the way in and out, as the passes mutate graphs in place.
+_TRACE_CACHE = OrderedDict()
+_TRACE_CACHE_SIZE = 32
+
+# module attributes that hold the module tree or tensors, not configuration
+_NON_CONFIG_ATTRS = {
+    "_parameters",
+    "_buffers",
+    "_modules",
+    "_non_persistent_buffers_set",
+    "_state_dict_hooks",
+    "_state_dict_pre_hooks",
+    "_load_state_dict_pre_hooks",
+    "_load_state_dict_post_hooks",
+}
+
+
+def clear_trace_cache():
+    """Drop all symbolic traces cached by MaseGraph."""
+    _TRACE_CACHE.clear()
+
+
+class _Unfrozen:
+    """Stands for a value that cannot be frozen. It is unhashable, so that a key
+    containing it is never cached: two such values may differ in ways the control
+    flow depends on."""
+
+    __hash__ = None
+
+
+def _freeze(value):
+    """Turn a (nested) configuration value into a hashable key.
+
+    Values that cannot be frozen give an unhashable key.
+    """
+    if value is None or isinstance(
+        value, (bool, int, float, complex, str, bytes, enum.Enum, type)
+    ):
+        return value
+    if isinstance(value, (torch.dtype, torch.device, torch.Size)):
+        return value
+    if isinstance(value, (tuple, list)):
+        return (type(value), tuple(_freeze(v) for v in value))
+    if isinstance(value, (set, frozenset)):
+        return (type(value), frozenset(_freeze(v) for v in value))
+    if isinstance(value, dict):
+        return (type(value), tuple((_freeze(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, torch.Tensor):
+        return (torch.Tensor, tuple(value.shape), value.dtype)
+    if isinstance(value, MethodType):
+        # bound to the instance, key on the class instead
+        return (type(value.__self__), value.__func__)
+    if hasattr(value, "to_json_string"):
+        # e.g. huggingface configs
+        return (type(value), value.to_json_string())
+    if callable(value):
+        try:
+            hash(value)
+            return value
+        except TypeError:
+            pass
+    return _Unfrozen()
+
+
+def _architecture_key(model: torch.nn.Module):
+    """Module tree of the model with the non-tensor attributes of every module,
+    which includes the training flag and configs that control flow may depend on."""
+    key = []
+    for name, module in model.named_modules():
+        attrs = tuple(
+            (attr, _freeze(value))
+            for attr, value in sorted(vars(module).items())
+            if attr not in _NON_CONFIG_ATTRS
+        )
+        params = tuple(
+            (n, tuple(p.shape), p.dtype)
+            for n, p in module.named_parameters(recurse=False)
+        )
+        buffers = tuple(
+            (n, tuple(b.shape), b.dtype) for n, b in module.named_buffers(recurse=False)
+        )
+        key.append((name, type(module), attrs, params, buffers))
+    return tuple(key)
+
+
+def _trace_cache_key(model, tracer: MaseTracer, cf_args):
+    key = (
+        type(model),
+        frozenset(tracer.custom_leaf_modules),
+        frozenset(tracer.custom_leaf_layers),
+        frozenset(tracer.custom_leaf_functions),
+        _freeze(cf_args),
+        _architecture_key(model),
+    )
+    try:
+        hash(key)
+    except TypeError:
+        # unhashable leaf, argument or configuration value, do not cache
+        return None
+    return key
+
+
+def _rebindable(graph: fx.Graph, model: torch.nn.Module) -> bool:
+    # tracing stores tensor constants on the traced instance, a cached graph
+    # that refers to them cannot be bound to another instance
+    for node in graph.nodes:
+        if node.op != "get_attr":
+            continue
+        obj = model
+        for atom in node.target.split("."):
+            if not hasattr(obj, atom):
+                return False
+            obj = getattr(obj, atom)
+    return True
+
+
+def trace_with_cache(
+    tracer: MaseTracer, model: torch.nn.Module, cf_args=None
+) -> fx.Graph:
+    """Symbolically trace the model, reusing the trace of a previous model with
+    the same architecture, leaf sets and concrete args if there is one.
+
+    :param tracer: tracer to run on a cache miss
+    :type tracer: MaseTracer
+    :param model: model to trace
+    :type model: torch.nn.Module
+    :param cf_args: concrete args passed to the tracer, defaults to None
+    :type cf_args: dict, optional
+    :return: a graph owned by the caller
+    :rtype: fx.Graph
+    """
+    key = _trace_cache_key(model, tracer, cf_args)
+    if key is not None and key in _TRACE_CACHE:
+        graph = _TRACE_CACHE[key]
+        if _rebindable(graph, model):
+            _TRACE_CACHE.move_to_end(key)
+            logger.debug(f"Reusing cached trace of {type(model).__name__}")
+            return copy.deepcopy(graph)
+
+    graph = tracer.trace(model, cf_args)
+    if key is not None:
+        _TRACE_CACHE[key] = copy.deepcopy(graph)
+        _TRACE_CACHE.move_to_end(key)
+        while len(_TRACE_CACHE) > _TRACE_CACHE_SIZE:
+            _TRACE_CACHE.popitem(last=False)
+    return graph
+
+
+# ----------------------------------------
+#   Mase Graph Cloning
+# ----------------------------------------
+
+
+def _share_module(module: torch.nn.Module, memo: dict) -> torch.nn.Module:
+    """Copy a module tree without copying the parameter storage.
+
+    Every module is copied shallowly with its own parameter, buffer, submodule
+    and hook dicts, so replacing a submodule or parameter in the copy does not
+    affect the original. Parameters are new ``nn.Parameter`` objects viewing the
+    same storage, buffers (e.g. batch norm running stats, which are updated in
+    place during training) are copied.
+    """
+    if id(module) in memo:
+        return memo[id(module)]
+    shared = module.__class__.__new__(module.__class__)
+    memo[id(module)] = shared
+    for key, value in vars(module).items():
+        if isinstance(value, (dict, set)):
+            value = copy.copy(value)
+        shared.__dict__[key] = value
+    for name, param in module._parameters.items():
+        if param is not None:
+            if id(param) not in memo:
+                memo[id(param)] = torch.nn.Parameter(
+                    param.data, requires_grad=param.requires_grad
+                )
+            shared._parameters[name] = memo[id(param)]
+    for name, buffer in module._buffers.items():
+        if buffer is not None:
+            shared._buffers[name] = buffer.clone()
+    for name, submodule in module._modules.items():
+        if submodule is not None:
+            shared._modules[name] = _share_module(submodule, memo)
+    return shared
+
+
+# ----------------------------------------
+#   Mase Graph Index
+# ----------------------------------------
+
+# Live module indices, notified whenever a submodule is registered anywhere
+_LIVE_MODULE_INDICES = weakref.WeakSet()
+
+
+def _notify_module_registration(module, name, submodule):
+    for index in list(_LIVE_MODULE_INDICES):
+        index.on_register(module, name, submodule)
+
+
+# register_module_module_registration_hook is only available from torch 2.0
+_TRACK_MODULE_REGISTRATION = hasattr(
+    torch.nn.modules.module, "register_module_module_registration_hook"
+)
+if _TRACK_MODULE_REGISTRATION:
+    torch.nn.modules.module.register_module_module_registration_hook(
+        _notify_module_registration
+    )
+
+
+class _ModuleIndex:
+    """A qualified name -> module index over the module tree of a model.
+
+    The index is kept in sync incrementally through a global module registration
+    hook, so replacing a submodule (e.g. in the quantize pass) only re-walks the
+    affected subtree instead of the whole ``named_modules()`` of the model.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.by_name = None
+        self.name_of = {}
+        _LIVE_MODULE_INDICES.add(self)
+
+    def __reduce__(self):
+        # entries refer to module identities, copies are rebuilt lazily
+        return (_ModuleIndex, ())
+
+    def get(self, root: torch.nn.Module) -> dict:
+        if (
+            self.by_name is None
+            or self.root is not root
+            or not _TRACK_MODULE_REGISTRATION
+        ):
+            self.build(root)
+        return self.by_name
+
+    def build(self, root: torch.nn.Module):
+        self.root = root
+        self.by_name = dict(root.named_modules())
+        self.name_of = {id(m): n for n, m in self.by_name.items()}
+
+    def invalidate(self):
+        self.root = None
+        self.by_name = None
+        self.name_of = {}
+
+    def on_register(self, parent, name, submodule):
+        if self.by_name is None:
+            return
+        prefix = self.name_of.get(id(parent))
+        if prefix is None:
+            # not (yet) part of the indexed module tree
+            return
+        qualname = f"{prefix}.{name}" if prefix else name
+        old = self.by_name.get(qualname)
+        if old is not None:
+            for n, m in old.named_modules(prefix=qualname):
+                if self.by_name.get(n) is m:
+                    del self.by_name[n]
+                if self.name_of.get(id(m)) == n:
+                    del self.name_of[id(m)]
+        if submodule is not None:
+            for n, m in submodule.named_modules(prefix=qualname):
+                # shared modules keep their first name, as in named_modules()
+                if id(m) in self.name_of:
+                    continue
+                self.by_name[n] = m
+                self.name_of[id(m)] = n
+
+
 # ----------------------------------------
 #   Mase Graph IR
 # ----------------------------------------
@@ -96,6 +378,7 @@ class MaseGraph:
         self,
         model: torch.nn.Module | str | onnx.onnx_ml_pb2.ModelProto,
         cf_args: Optional[Dict[str, Any]] = None,
+        trace_cache: bool = True,
     ) -> None:
         """Mase takes a torch.fx graph representation of a model and translates
         it into a customised representation (Mase graph IR). The Mase graph
@@ -106,6 +389,9 @@ class MaseGraph:
         :type model: torch.nn.Module | str | onnx.onnx_ml_pb2.ModelProto
         :param cf_args: _description_, defaults to None
         :type cf_args: Optional[Dict[str, Any]], optional
+        :param trace_cache: reuse the symbolic trace of a model with the same
+            architecture traced before, defaults to True
+        :type trace_cache: bool, optional
         """
         assert isinstance(
             model, (torch.nn.Module, str, onnx.onnx_ml_pb2.ModelProto)
@@ -126,6 +412,8 @@ class MaseGraph:
             custom_leaf_functions += tuple(patched_nodes["functions"])
 
         self.cf_args = cf_args
+        self._module_index = _ModuleIndex()
+        self._node_index = {}
 
         # Defined model checkpoint, run optimum onnx export
         if isinstance(model, str):
@@ -152,7 +440,11 @@ class MaseGraph:
                 custom_leaf_functions=custom_leaf_functions,
                 custom_leaf_layers=custom_leaf_layers,
             )
-            self.model = fx.GraphModule(model, self.tracer.trace(model, cf_args))
+            if trace_cache:
+                graph = trace_with_cache(self.tracer, model, cf_args)
+            else:
+                graph = self.tracer.trace(model, cf_args)
+            self.model = fx.GraphModule(model, graph)
             if patched_nodes:
                 self.model.patched_op_names = [
                     obj.__name__.lower()
@@ -171,6 +463,15 @@ class MaseGraph:
         drawer = FxGraphDrawer(self.model, "masegraph")
         drawer.get_dot_graph().write_svg(file)
 
+    @property
+    def model(self):
+        return self._model
+
+    @model.setter
+    def model(self, model):
+        self._model = model
+        self.invalidate_index()
+
     @property
     def fx_graph(self):
         return self.model.graph
@@ -181,4 +482,127 @@ class MaseGraph:
 
     @property
     def modules(self):
-        return dict(self.model.named_modules())
+        """A read-only qualified name -> module mapping of the model.
+
+        The mapping is maintained incrementally when submodules are registered,
+        so accessing it inside a per-node loop does not re-walk the module tree.
+        """
+        return MappingProxyType(self._module_index.get(self.model))
+
+    def invalidate_index(self):
+        """Drop the cached node and module indices.
+
+        Changes to the fx graph and submodule registrations are picked up
+        automatically. This is only needed after mutations that bypass both,
+        e.g. deleting a submodule with ``delattr``.
+        """
+        self._module_index.invalidate()
+        self._node_index = {}
+
+    def get_module_by_name(self, name: str) -> torch.nn.Module | None:
+        return self._module_index.get(self.model).get(name)
+
+    def clone(self) -> "MaseGraph":
+        """Return a copy of the graph to apply transforms to, e.g. in a search trial.
+
+        Unlike ``deepcopy_mase_graph``, the weights are not copied: parameters of
+        the clone share storage with this graph, while the module tree and fx
+        graph are copied, so transforms that replace modules, parameters or nodes
+        only affect the clone. In-place writes to a shared parameter (e.g.
+        ``weight.data.mul_()``) are seen by both graphs.
+        Node metadata is shared copy-on-write, see ``MaseMetadata.fork``.
+
+        :return: the cloned graph
+        :rtype: MaseGraph
+        """
+        memo = {}
+        source = _share_module(self.model, memo)
+        model = fx.GraphModule(source, copy.deepcopy(self.fx_graph))
+        # keep the whole module tree, including modules the graph does not call
+        model._parameters = source._parameters
+        model._buffers = source._buffers
+        model._modules = source._modules
+        for key, value in vars(self.model).items():
+            if not key.startswith("_"):
+                setattr(model, key, copy.copy(value))
+
+        cloned = MaseGraph.__new__(MaseGraph)
+        for key, value in vars(self).items():
+            if key not in ["_model", "_module_index", "_node_index"]:
+                setattr(cloned, key, value)
+        cloned._module_index = _ModuleIndex()
+        cloned._node_index = {}
+        cloned.model = model
+
+        for node, cloned_node in zip(self.fx_graph.nodes, cloned.fx_graph.nodes):
+            if "mase" in node.meta:
+                cloned_node.meta["mase"] = node.meta["mase"].fork(cloned_node, model)
+        if hasattr(self, "meta"):
+            cloned.meta = copy.copy(self.meta)
+            if "mase" in self.meta:
+                cloned.meta["mase"] = MaseGraphMetadata(cloned)
+                cloned.meta["mase"].parameters = copy_containers(
+                    self.meta["mase"].parameters
+                )
+        return cloned
+
+    def get_node_by_name(self, name: str) -> fx.Node:
+        node = self._node_index.get(name)
+        if not self._is_live_node(node, name):
+            # the fx graph changed since the index was built
+            self._node_index = {n.name: n for n in self.fx_graph.nodes}
+            node = self._node_index.get(name)
+        if node is None:
+            raise RuntimeError(f"No node named {name} found in graph")
+        return node
+
+    def mark_dirty(self, nodes: fx.Node | list[fx.Node]):
+        """Mark nodes changed by a transform, together with their downstream cone,
+        so that metadata passes run with ``incremental`` re-analyse them only.
+
+        :param nodes: the changed node(s)
+        :type nodes: fx.Node | list[fx.Node]
+        """
+        for node in self._cone(nodes):
+            meta = node.meta.get("mase", None)
+            if hasattr(meta, "invalidate"):
+                meta.invalidate()
+
+    def downstream_cone(self, nodes: fx.Node | list[fx.Node]) -> list[fx.Node]:
+        """Return the nodes and all their transitive users in topological order."""
+        cone = self._cone(nodes)
+        return [node for node in self.fx_graph.nodes if node in cone]
+
+    def _cone(self, nodes: fx.Node | list[fx.Node]) -> set[fx.Node]:
+        if isinstance(nodes, fx.Node):
+            nodes = [nodes]
+        cone = set()
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            if node in cone:
+                continue
+            cone.add(node)
+            stack.extend(node.users)
+        return cone
+
+    def dirty_nodes(self, domain: str) -> list[fx.Node]:
+        """Return the nodes whose ``domain`` (common, software or hardware)
+        metadata is missing or out of date, in topological order."""
+        return [node for node in self.fx_graph.nodes if self._is_dirty(node, domain)]
+
+    def _is_dirty(self, node: fx.Node, domain: str) -> bool:
+        meta = node.meta.get("mase", None)
+        return (
+            not hasattr(meta, "analysed")
+            or meta.node is not node
+            or domain not in meta.analysed
+        )
+
+    def _is_live_node(self, node: fx.Node | None, name: str) -> bool:
+        return (
+            node is not None
+            and node.name == name
+            and node.graph is self.fx_graph
+            and not getattr(node, "_erased", False)
+        )
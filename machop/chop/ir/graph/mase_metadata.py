@@ -1,4 +1,6 @@
+import copy
 import logging
+from collections.abc import Mapping, MutableMapping
 
 from torch import nn
 
@@ -7,6 +9,143 @@ from ...passes.graph.utils import get_module_by_name
 logger = logging.getLogger(__name__)
 
 
+def copy_containers(obj):
+    """Copy the nested dicts and lists of a metadata tree, sharing the leaf values
+    (e.g. tensors) with the original."""
+    if isinstance(obj, Mapping):
+        return type(obj)((k, copy_containers(v)) for k, v in obj.items())
+    if isinstance(obj, list):
+        return [copy_containers(v) for v in obj]
+    return obj
+
+
+class _Unset:
+    """Value of the TensorMetadata slots without a key."""
+
+    def __reduce__(self):
+        return "_UNSET"
+
+
+_UNSET = _Unset()
+
+
+def _restore_tensor_metadata(*state):
+    record = TensorMetadata.__new__(TensorMetadata)
+    (
+        record.type,
+        record.precision,
+        record.shape,
+        record.torch_dtype,
+        record.value,
+        record.from_,
+        record._extra,
+    ) = state
+    return record
+
+
+class TensorMetadata(MutableMapping):
+    """
+    The metadata of an arg or result of a node, e.g.
+    parameters["common"]["args"]["data_in_0"].
+
+    The common keys (type, precision, shape, torch_dtype, value, from) are stored
+    in slots instead of a per-record dict, other keys added by later passes (e.g.
+    "stat") go to an overflow dict. The record behaves as a dict, but is not a
+    dict subclass, code that walks the metadata tree should check for Mapping.
+    """
+
+    # key -> slot, "from" is a keyword
+    _slot_of = {
+        "type": "type",
+        "precision": "precision",
+        "shape": "shape",
+        "torch_dtype": "torch_dtype",
+        "value": "value",
+        "from": "from_",
+    }
+    __slots__ = tuple(_slot_of.values()) + ("_extra",)
+
+    def __init__(self, *args, **kwargs):
+        self.type = self.precision = self.shape = _UNSET
+        self.torch_dtype = self.value = self.from_ = _UNSET
+        self._extra = None
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        slot = self._slot_of.get(key)
+        if slot is None:
+            if self._extra is None:
+                raise KeyError(key)
+            return self._extra[key]
+        value = getattr(self, slot)
+        if value is _UNSET:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        slot = self._slot_of.get(key)
+        if slot is None:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+        else:
+            setattr(self, slot, value)
+
+    def __delitem__(self, key):
+        slot = self._slot_of.get(key)
+        if slot is None:
+            if self._extra is None:
+                raise KeyError(key)
+            del self._extra[key]
+        elif getattr(self, slot) is _UNSET:
+            raise KeyError(key)
+        else:
+            setattr(self, slot, _UNSET)
+
+    def __iter__(self):
+        for key, slot in self._slot_of.items():
+            if getattr(self, slot) is not _UNSET:
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, key):
+        slot = self._slot_of.get(key)
+        if slot is None:
+            return self._extra is not None and key in self._extra
+        return getattr(self, slot) is not _UNSET
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __reduce__(self):
+        # positional slot values are smaller and faster to pickle than the
+        # default slot name -> value dict
+        return (
+            _restore_tensor_metadata,
+            (
+                self.type,
+                self.precision,
+                self.shape,
+                self.torch_dtype,
+                self.value,
+                self.from_,
+                self._extra,
+            ),
+        )
+
+    def copy(self):
+        return TensorMetadata(self)
+
+    def __or__(self, other):
+        record = self.copy()
+        record.update(other)
+        return record
+
+
 class MaseMetadata:
     """
     The metadata of a Mase node in a Mase graph describes the constraints of the
@@ -62,6 +201,11 @@ class MaseMetadata:
     known_types = ["fixed", "float", "NA"]
     known_toolchain = ["INTERNAL", "EXTERNAL", "HLS"]
     known_storage = ["BRAM"]
+    # layers that we have in RTL
+    internal_layers = {nn.Linear: "linear", nn.ReLU: "relu"}
+
+    # graphs have one metadata object per node, no per-instance dict
+    __slots__ = ("model", "node", "_parameters", "_shared", "analysed")
 
     def __init__(
         self,
@@ -72,14 +216,46 @@ class MaseMetadata:
         self.model = model
         # The fx node of the module in the fx graph of the model
         self.node = node
-        # layers that we have in RTL
-        self.internal_layers = {nn.Linear: "linear", nn.ReLU: "relu"}
 
         self.parameters = {
             "common": {},
             "software": {},
             "hardware": {},
         }
+        # parameter domains (common, software, hardware) that are up to date with
+        # the node, metadata passes skip domains listed here in incremental mode
+        self.analysed = set()
+
+    @property
+    def parameters(self):
+        # parameters shared with a fork are copied on first access
+        if self._shared:
+            self._parameters = copy_containers(self._parameters)
+            self._shared = False
+        return self._parameters
+
+    @parameters.setter
+    def parameters(self, parameters):
+        self._parameters = parameters
+        self._shared = False
+
+    def fork(self, node, model):
+        """Return a copy of this metadata for a node in a cloned graph.
+
+        The parameters are shared copy-on-write: each side copies the parameter
+        tree the first time it accesses it, so nodes a transform never looks at
+        are not copied.
+        """
+        forked = copy.copy(self)
+        forked.node = node
+        forked.model = model
+        forked.analysed = set(self.analysed)
+        forked._shared = self._shared = True
+        return forked
+
+    def invalidate(self):
+        # the node has changed, all parameter domains need to be re-analysed
+        self.analysed.clear()
 
     @property
     def module(self):
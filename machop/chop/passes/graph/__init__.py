@@ -16,12 +16,17 @@ from .analysis import (
     add_pruning_metadata_analysis_pass,
     add_natural_sparsity_metadata_analysis_pass,
     hook_inspection_analysis_pass,
+    prune_sensitivity_analysis_pass,
 )
 from .transforms import (
     prune_transform_pass,
     prune_detach_hook_transform_pass,
+    prune_shrink_transform_pass,
+    sparse_inference_transform_pass,
     # prune_unwrap_transform_pass,
     quantize_transform_pass,
+    pack_quantized_transform_pass,
+    integer_backend_transform_pass,
     summarize_quantization_analysis_pass,
     conv_bn_fusion_transform_pass,
     logicnets_fusion_transform_pass,
@@ -40,6 +45,7 @@ from .interface import (
 
 from .transforms.quantize import quantized_func_map, quantized_module_map
 from .transforms.quantize.quant_parsers import parse_node_config
+from .pass_manager import PASS_INFO, PassInfo, PassManager
 
 ANALYSIS_PASSES = [
     "init_metadata",
@@ -59,13 +65,18 @@ ANALYSIS_PASSES = [
     "add_pruning_metadata",
     "add_natural_sparsity",
     "hook_inspection",
+    "prune_sensitivity",
 ]
 
 TRANSFORM_PASSES = [
     "quantize",
+    "pack_quantized",
+    "integer_backend",
     "summarize_quantization",
     "prune",
     "prune_detach_hook" "conv_bn_fusion",
+    "prune_shrink",
+    "sparse_inference",
     "logicnets_fusion",
     "huffman",
     "huffman_decode",
@@ -97,6 +108,7 @@ PASSES = {
     "add_pruning_metadata": add_pruning_metadata_analysis_pass,
     "add_natural_sparsity": add_natural_sparsity_metadata_analysis_pass,
     "hook_inspection": hook_inspection_analysis_pass,
+    "prune_sensitivity": prune_sensitivity_analysis_pass,
     # interface
     "load_mase_graph": load_mase_graph_interface_pass,
     "load_node_meta_param": load_node_meta_param_interface_pass,
@@ -104,9 +116,13 @@ PASSES = {
     "save_node_meta_param": save_node_meta_param_interface_pass,
     # transform
     "quantize": quantize_transform_pass,
+    "pack_quantized": pack_quantized_transform_pass,
+    "integer_backend": integer_backend_transform_pass,
     "summarize_quantization": summarize_quantization_analysis_pass,
     "prune": prune_transform_pass,
     "prune_detach_hook": prune_detach_hook_transform_pass,
+    "prune_shrink": prune_shrink_transform_pass,
+    "sparse_inference": sparse_inference_transform_pass,
     "huffman": huffman_transform_pass,
     "huffman_decode": huffman_decode_pass,
     # "remove_prune_wrappers": prune_unwrap_transform_pass,
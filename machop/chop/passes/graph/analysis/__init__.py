@@ -30,4 +30,5 @@ from .pruning import (
     add_pruning_metadata_analysis_pass,
     add_natural_sparsity_metadata_analysis_pass,
     hook_inspection_analysis_pass,
+    prune_sensitivity_analysis_pass,
 )
@@ -1,10 +1,12 @@
 import logging
 import math
+from contextlib import nullcontext
 
 import toml
 import pdb
 import torch
 import torch.fx as fx
+from torch._subclasses.fake_tensor import FakeTensorMode
 from torch.fx.passes.shape_prop import ShapeProp
 from chop.passes.graph.analysis.utils import (
     is_tensor_constant,
@@ -35,8 +37,8 @@ from .common_metadata_layers import (
 logger = logging.getLogger(__name__)
 
 
-def graph_iterator_for_mase_ops(graph):
-    for node in graph.fx_graph.nodes:
+def graph_iterator_for_mase_ops(graph, nodes=None):
+    for node in graph.fx_graph.nodes if nodes is None else nodes:
         node: fx.Node
         if node.op == "call_module":
             module_name = node.target
@@ -167,10 +169,18 @@ def graph_iterator_for_mase_ops(graph):
 
 
 def graph_iterator_for_metadata(
-    graph, dummy_in=None, add_value=True, force_device_meta=False
+    graph,
+    dummy_in=None,
+    add_value=True,
+    force_device_meta=False,
+    use_fake_tensors=False,
+    nodes=None,
 ):
     """
     largely apated from https://pytorch.org/docs/stable/fx.html
+
+    If ``nodes`` is given, only these nodes are analysed. Upstream nodes are only
+    executed when their result is needed and not cached in their metadata.
     """
 
     model, fx_graph, modules = graph.model, graph.fx_graph, graph.modules
@@ -182,7 +192,98 @@ def graph_iterator_for_metadata(
         dummy_in = {k: v.to("meta") for k, v in dummy_in.items()}
         model = model.to("meta")
 
+    # propagate shapes and dtypes with fake tensors: no real activation is
+    # allocated and weights/buffers are converted on the fly without being modified
+    fake_mode = nullcontext()
+    if use_fake_tensors:
+        fake_mode = FakeTensorMode(allow_non_fake_inputs=True)
+        dummy_in = {
+            k: fake_mode.from_tensor(v) if isinstance(v, torch.Tensor) else v
+            for k, v in dummy_in.items()
+        }
+
+    if nodes is None:
+        to_analyse = to_execute = None
+    else:
+        to_analyse, to_execute = _nodes_to_interpret(nodes, use_fake_tensors)
+
+    with fake_mode:
+        graph = _interpret_for_metadata(
+            graph,
+            model,
+            modules,
+            env,
+            dummy_in,
+            add_value,
+            to_analyse,
+            to_execute,
+            use_fake_tensors,
+        )
+    return graph
+
+
+def _has_cached_result(node, use_fake_tensors):
+    """
+    Whether the result of a node was recorded by a previous run of this pass
+    """
+    result_meta = (
+        node.meta["mase"].parameters["common"].get("results", {}).get("data_out_0")
+    )
+    if result_meta is None:
+        return False
+    # with fake tensors, only the shape and dtype of the result are needed
+    return "value" in result_meta or (use_fake_tensors and "torch_dtype" in result_meta)
+
+
+def _cached_result(node):
+    result_meta = node.meta["mase"].parameters["common"]["results"]["data_out_0"]
+    if "value" in result_meta:
+        return result_meta["value"]
+    return torch.empty(result_meta["shape"], dtype=result_meta["torch_dtype"])
+
+
+def _nodes_to_interpret(nodes, use_fake_tensors):
+    """
+    The nodes to analyse, and the nodes to execute to get their inputs (the nodes
+    themselves plus any upstream node without a cached result)
+    """
+    to_analyse = set(nodes)
+    to_execute = set(nodes)
+    stack = []
+    for node in nodes:
+        stack.extend(node.all_input_nodes)
+        if node.op == "output":
+            # the output node records the result of the previous node
+            stack.append(node.prev)
+    while stack:
+        node = stack.pop()
+        if node in to_execute:
+            continue
+        to_execute.add(node)
+        if not _has_cached_result(node, use_fake_tensors):
+            stack.extend(node.all_input_nodes)
+    return to_analyse, to_execute
+
+
+def _interpret_for_metadata(
+    graph,
+    model,
+    modules,
+    env,
+    dummy_in,
+    add_value,
+    to_analyse=None,
+    to_execute=None,
+    use_fake_tensors=False,
+):
     for node in graph.fx_graph.nodes:
+        if to_execute is not None:
+            if node not in to_execute:
+                continue
+            if node not in to_analyse and _has_cached_result(node, use_fake_tensors):
+                env[node.name] = _cached_result(node)
+                continue
+
         args, kwargs = None, None
         if node.op == "placeholder":
             result = dummy_in[node.name]
@@ -227,6 +328,7 @@ def graph_iterator_for_metadata(
             result = modules[node.target](*args, **kwargs)
             analyse_fn = analyse_common_parameters_module
         elif node.op == "output":
+            result = env[node.prev.name]
             analyse_fn = analyse_common_parameters_output
 
         # This is the only code specific to shape propagation.
@@ -236,9 +338,10 @@ def graph_iterator_for_metadata(
         #     node.shape = result.shape
         #     node.dtype = result.dtype
 
-        node.meta["mase"] = analyse_fn(
-            node.meta["mase"], result, args, kwargs, add_value=add_value
-        )
+        if to_analyse is None or node in to_analyse:
+            node.meta["mase"] = analyse_fn(
+                node.meta["mase"], result, args, kwargs, add_value=add_value
+            )
         env[node.name] = result
 
     return graph
@@ -273,7 +376,14 @@ def _add_graph_metadata(graph):
 
 
 def add_common_metadata_analysis_pass(
-    graph, pass_args={"dummy_in": None, "add_value": True, "force_device_meta": False}
+    graph,
+    pass_args={
+        "dummy_in": None,
+        "add_value": True,
+        "force_device_meta": False,
+        "use_fake_tensors": False,
+        "incremental": False,
+    },
 ):
     """add common metadata
 
@@ -281,6 +391,10 @@ def add_common_metadata_analysis_pass(
     :type graph: MaseGraph
     :param pass_args: this pass does not need any arguments, defaults to None
     :type pass_args: _type_, optional, "add_value" controls whether tensor values would be added to the meta data, defaults to True
+        "use_fake_tensors" propagates shapes, dtypes and precisions with FakeTensors instead of running the model eagerly.
+        The model is left untouched and no activation memory is allocated, activation values are not recorded in this mode, defaults to False
+        "incremental" only re-analyses the nodes marked dirty by MaseGraph.mark_dirty (i.e. the changed nodes and their downstream cone)
+        and reuses the metadata of the other nodes. It assumes the same dummy input as the previous run, defaults to False
     :return: return a tuple of a MaseGraph and an empty dict (no additional info to return)
     :rtype: tuple(MaseGraph, Dict)
 
@@ -429,7 +543,15 @@ def add_common_metadata_analysis_pass(
     """
 
     logger.debug(graph.fx_graph)
-    graph = graph_iterator_for_mase_ops(graph)
-    graph = graph_iterator_for_metadata(graph, **pass_args)
+    pass_args = dict(pass_args)
+    if pass_args.pop("incremental", False):
+        nodes = graph.dirty_nodes("common")
+        logger.debug(f"Re-analysing {len(nodes)} dirty nodes")
+    else:
+        nodes = None
+    graph = graph_iterator_for_mase_ops(graph, nodes)
+    graph = graph_iterator_for_metadata(graph, nodes=nodes, **pass_args)
     graph = _add_graph_metadata(graph)
+    for node in graph.fx_graph.nodes if nodes is None else nodes:
+        node.meta["mase"].analysed.add("common")
     return graph, {}
@@ -1,4 +1,5 @@
 import logging
+from collections.abc import Mapping
 
 import toml
 import torch
@@ -52,7 +53,7 @@ def add_component_source(node):
         if "data_in" in arg:
             continue
         arg_info = args[arg]
-        if isinstance(arg_info, dict):
+        if isinstance(arg_info, Mapping):
             node.meta["mase"]["hardware"]["interface"][arg] = {
                 "storage": "BRAM",
                 "transpose": False,
@@ -71,7 +72,7 @@ def add_verilog_param(node):
     results = node.meta["mase"]["common"]["results"]
     vp = node.meta["mase"]["hardware"]["verilog_param"]
     for arg, arg_info in args.items():
-        if isinstance(arg_info, dict):
+        if isinstance(arg_info, Mapping):
             for i, precision in enumerate(arg_info["precision"]):
                 vp[_cap(arg + f"_precision_{i}")] = arg_info["precision"][i]
             for dim in range(0, len(arg_info["shape"])):
@@ -98,7 +99,7 @@ def add_verilog_param(node):
             vp[_cap(arg)] = arg_info
 
     for result, result_info in node.meta["mase"]["common"]["results"].items():
-        if isinstance(result_info, dict):
+        if isinstance(result_info, Mapping):
             for i, precision in enumerate(result_info["precision"]):
                 vp[_cap(result + f"_precision_{i}")] = result_info["precision"][i]
             for dim in range(0, len(result_info["shape"])):
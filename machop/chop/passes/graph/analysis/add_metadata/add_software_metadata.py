@@ -2,7 +2,6 @@ import logging
 from ...utils import get_mase_op, get_mase_type
 from .software_metadata_layers import SOFTWARE_PARAM_ANALYSIS_LAYERS
 
-
 logger = logging.getLogger(__name__)
 
 
@@ -11,13 +10,18 @@ def add_software_metadata_analysis_pass(graph, pass_args=None):
 
     :param graph: a MaseGraph
     :type graph: MaseGraph
-    :param pass_args: this pass does not need any arguments, defaults to None
+    :param pass_args: "incremental" only re-analyses the nodes marked dirty by MaseGraph.mark_dirty, defaults to None
     :type pass_args: _type_, optional
     :return: return a tuple of a MaseGraph and an empty dict (no additional info to return)
     :rtype: tuple(MaseGraph, Dict)
     """
 
-    for node in graph.fx_graph.nodes:
+    if (pass_args or {}).get("incremental", False):
+        nodes = graph.dirty_nodes("software")
+    else:
+        nodes = graph.fx_graph.nodes
+
+    for node in nodes:
         mase_op = get_mase_op(node)
         mase_type = get_mase_type(node)
 
@@ -28,4 +32,5 @@ def add_software_metadata_analysis_pass(graph, pass_args=None):
                 f"mase_type `{mase_type}`, mase_op `{mase_op}` not found in SOFTWARE_PARAM_ANALYSIS_LAYERS. Using default analysis layer"
             )
             SOFTWARE_PARAM_ANALYSIS_LAYERS[mase_type]["default"](node.meta["mase"])
+        node.meta["mase"].analysed.add("software")
     return graph, {}
@@ -3,15 +3,22 @@ import math
 
 import torch
 import inspect
+from torch._subclasses.fake_tensor import FakeTensor
 from chop.tools.utils import to_numpy_if_tensor as to_numpy
 from chop.passes.graph.utils import vf, get_node_by_name
+from chop.ir.graph.mase_metadata import TensorMetadata
 import traceback
 
-
 # ----------------------------------------------------------
 # Utility
 # ----------------------------------------------------------
 
+
+def _keep_value(x, add_value):
+    # FakeTensors only carry shapes and dtypes, there is no value to record
+    return add_value and not isinstance(x, FakeTensor)
+
+
 # The following information is fetched from pytorch documentation
 func_data = {
     # https://pytorch.org/docs/stable/generated/torch.flatten.html#torch.flatten
@@ -94,13 +101,13 @@ def match_args_and_kwargs(meta, args, kwargs, data, add_value):
 
     for i, x in enumerate(args):
         if isinstance(x, torch.Tensor) and ordered_func_data[i][1] == "data_in":
-            arg_meta = {
-                "shape": list(x.shape),
-                "torch_dtype": x.dtype,
-                "type": "float",
-                "precision": [32],
-            }
-            if add_value:
+            arg_meta = TensorMetadata(
+                shape=list(x.shape),
+                torch_dtype=x.dtype,
+                type="float",
+                precision=[32],
+            )
+            if _keep_value(x, add_value):
                 arg_meta["value"] = x
             meta.parameters["common"]["args"][f"data_in_{j}"] = arg_meta
             j += 1
@@ -112,13 +119,13 @@ def match_args_and_kwargs(meta, args, kwargs, data, add_value):
     for k, v in kwargs.items():
         if data[k] == "data_in":
             # rename this to mase data_in_number
-            arg_meta = {
-                "shape": list(v.shape),
-                "torch_dtype": v.dtype,
-                "type": "float",
-                "precision": [32],
-            }
-            if add_value:
+            arg_meta = TensorMetadata(
+                shape=list(v.shape),
+                torch_dtype=v.dtype,
+                type="float",
+                precision=[32],
+            )
+            if _keep_value(v, add_value):
                 arg_meta["value"] = v
             meta.parameters["common"]["args"][f"data_in_{j}"] = arg_meta
             j += 1
@@ -134,20 +141,20 @@ def analyse_result(meta, result, add_value):
     # deal with results
     meta.parameters["common"]["results"] = {}
     if isinstance(result, torch.Tensor):
-        meta.parameters["common"]["results"]["data_out_0"] = {
-            "type": "float",
-            "precision": [32],
-            "shape": list(result.shape),
-            "torch_dtype": result.dtype,
-        }
-        if add_value:
+        meta.parameters["common"]["results"]["data_out_0"] = TensorMetadata(
+            type="float",
+            precision=[32],
+            shape=list(result.shape),
+            torch_dtype=result.dtype,
+        )
+        if _keep_value(result, add_value):
             meta.parameters["common"]["results"]["data_out_0"]["value"] = result
     else:
-        meta.parameters["common"]["results"]["data_out_0"] = {
-            "type": type(result),
-            "shape": [1],
-            "value": result,
-        }
+        meta.parameters["common"]["results"]["data_out_0"] = TensorMetadata(
+            type=type(result),
+            shape=[1],
+            value=result,
+        )
     return meta
 
 
@@ -170,7 +177,7 @@ def analyse_common_parameters_placeholder(meta, result, args, kwargs, add_value=
             "shape": result.shape,
             "torhc_dtype": result.dtype,
         }
-        if add_value:
+        if _keep_value(result, add_value):
             meta.parameters["common"]["results"]["data_out_0"]["value"] = result
         return meta
 
@@ -205,12 +212,14 @@ def analyse_common_parameters_module(meta, result, args, kwargs, add_value=True)
     mase_op = meta.parameters["common"]["mase_op"]
     meta = match_args_and_kwargs(meta, args, kwargs, module_data[mase_op], add_value)
     for name, parameter in meta.module.named_parameters():
-        meta.parameters["common"]["args"][name] = {
-            "type": "float",
-            "precision": [32],
-            "shape": list(parameter.shape),
-            "from": None,
-        }
+        meta.parameters["common"]["args"][name] = TensorMetadata(
+            {
+                "type": "float",
+                "precision": [32],
+                "shape": list(parameter.shape),
+                "from": None,
+            }
+        )
         if add_value:
             meta.parameters["common"]["args"][name]["value"] = parameter
 
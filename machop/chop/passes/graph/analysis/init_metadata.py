@@ -8,11 +8,22 @@ def init_metadata_analysis_pass(graph, pass_args=None):
 
     :param graph: a MaseGraph
     :type graph: MaseGraph
-    :param pass_args: arguments for this pass, this pass does not take any argumetns, defaults to None
+    :param pass_args: arguments for this pass, "incremental" only re-initialises the nodes
+        marked dirty by MaseGraph.mark_dirty (or without metadata) and keeps the rest, defaults to None
     :type pass_args: dict, optional
     :return: MaseGraph, pass info (empty in this case)
     :rtype: tuple(MaseGraph, dict)
     """
+    incremental = (pass_args or {}).get("incremental", False)
+    if incremental and hasattr(graph, "meta"):
+        dirty_nodes = set(graph.dirty_nodes("common"))
+        for node in graph.fx_graph.nodes:
+            if node in dirty_nodes:
+                node.meta["mase"] = MaseMetadata(node=node, model=graph.model)
+            else:
+                node.meta["mase"].model = graph.model
+        return graph, {}
+
     for node in graph.fx_graph.nodes:
         node.meta["mase"] = MaseMetadata(node=node, model=graph.model)
 
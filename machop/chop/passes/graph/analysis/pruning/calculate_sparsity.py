@@ -1,9 +1,31 @@
+import logging
+
 import torch
+from torch.nn.utils import parametrize
 from chop.passes.graph.analysis.utils import fetch_attr, load_arg
+from chop.passes.graph.transforms.pruning.packed_mask import PackedMask
+from chop.passes.graph.transforms.pruning.sparse_parameterization import (
+    FakeNMSparseWeight,
+)
 import pdb
 
+logger = logging.getLogger(__name__)
+
+
+def _nm_weight_memory(module):
+    # the weight memory in the compact N:M format, rather than from the mask count
+    parametrization = module.parametrizations.weight[0]
+    weight = module.parametrizations.weight.original
+    dense = weight.numel() * weight.element_size()
+    compressed = parametrization.compress(weight).nbytes
+    return {
+        "dense": dense,
+        "compressed": compressed,
+        "reduction": 1 - compressed / dense,
+    }
+
 
-def graph_iterator_for_metadata(graph, dummy_in=None, add_value=True):
+def graph_iterator_for_metadata(graph, dummy_in=None, add_value=True, pack_masks=True):
     """
     largely adapted from https://pytorch.org/docs/stable/fx.html
     """
@@ -14,6 +36,11 @@ def graph_iterator_for_metadata(graph, dummy_in=None, add_value=True):
 
     weight_masks = []
     act_masks = []
+
+    def mask_value(mask):
+        # 8 mask values per byte in the metadata, unpacked with .unpack()
+        return PackedMask.pack(mask) if pack_masks else mask
+
     for node in graph.fx_graph.nodes:
         args, kwargs = None, None
         if node.op == "placeholder":
@@ -45,7 +72,28 @@ def graph_iterator_for_metadata(graph, dummy_in=None, add_value=True):
             result = modules[node.target](*args, **kwargs)
 
             meta = node.meta["mase"]
-            if isinstance(modules[node.target], (torch.nn.Conv2d)):
+            module = modules[node.target]
+            if (
+                isinstance(module, torch.nn.Linear)
+                and parametrize.is_parametrized(module, "weight")
+                and isinstance(module.parametrizations.weight[0], FakeNMSparseWeight)
+            ):
+                # N:M pruned, without activation pruning
+                mask = module.parametrizations.weight[0].mask
+                weight_sparsity = 1 - float(mask.sum() / mask.numel())
+                meta.parameters["software"]["args"]["weight"][
+                    "sparsity"
+                ] = weight_sparsity
+                if add_value:
+                    meta.parameters["software"]["args"]["weight"]["mask_value"] = (
+                        mask_value(mask)
+                    )
+                sparsity_info[node.target] = {
+                    "weight_sparsity": weight_sparsity,
+                    "weight_memory": _nm_weight_memory(module),
+                }
+                weight_masks.append(mask)
+            elif isinstance(module, (torch.nn.Conv2d)):
                 mask = modules[node.target].parametrizations.weight[0].mask
                 weight_sparsity = 1 - float(mask.sum() / mask.numel())
                 meta.parameters["software"]["args"]["weight"][
@@ -59,19 +107,33 @@ def graph_iterator_for_metadata(graph, dummy_in=None, add_value=True):
                 ] = act_sparsity
 
                 if add_value:
-                    meta.parameters["software"]["args"]["weight"]["mask_value"] = mask
-                    meta.parameters["software"]["args"]["weight_mask"][
-                        "value"
-                    ] = act_mask
+                    meta.parameters["software"]["args"]["weight"]["mask_value"] = (
+                        mask_value(mask)
+                    )
+                    meta.parameters["software"]["args"]["data_in_0"]["mask_value"] = (
+                        mask_value(act_mask)
+                    )
                 sparsity_info[node.target] = {
                     "weight_sparsity": weight_sparsity,
                     "activation_sparsity": act_sparsity,
                 }
+                if isinstance(module.parametrizations.weight[0], FakeNMSparseWeight):
+                    sparsity_info[node.target]["weight_memory"] = _nm_weight_memory(
+                        module
+                    )
 
                 weight_masks.append(mask)
                 act_masks.append(act_mask)
 
         env[node.name] = result
+
+    for name, info in sparsity_info.items():
+        if "weight_memory" in info:
+            memory = info["weight_memory"]
+            logger.info(
+                f"{name}: N:M weight {memory['dense']} -> {memory['compressed']} "
+                f"bytes ({memory['reduction']:.1%} smaller)"
+            )
     return graph, sparsity_info, weight_masks, act_masks
 
 
@@ -84,15 +146,21 @@ def add_pruning_metadata_analysis_pass(graph, pass_args: dict = {}):
 
     :param pass_args: Additional arguments for the pruning metadata analysis pass.
     This pass requires a dummy_in and a bool value for add_value.
-    If add value is true, the mask values would be added to meta data.
+    If add value is true, the mask values would be added to meta data, as bit-packed
+    PackedMask objects unless pack_masks is set to False.
     :type pass_args: dict
 
     :return: The updated graph and sparsity information.
     The returned dict contains {'weight_sparsity': float, 'activation_sparsity': float}
+    per layer, and for N:M pruned layers 'weight_memory': the dense and compressed
+    weight bytes and their relative reduction, computed from the N:M storage format.
     :rtype: tuple(MaseGraph, dict)
     """
 
     graph, sparsity_info, weight_masks, act_masks = graph_iterator_for_metadata(
-        graph, pass_args["dummy_in"], pass_args["add_value"]
+        graph,
+        pass_args["dummy_in"],
+        pass_args["add_value"],
+        pass_args.get("pack_masks", True),
     )
     return graph, sparsity_info, weight_masks, act_masks
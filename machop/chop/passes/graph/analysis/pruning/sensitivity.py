@@ -0,0 +1,247 @@
+# Per-layer pruning sensitivity analysis
+# --------------------------------------------------------------------------------------
+# Prunes one Conv2d or Linear layer at a time, at each of a list of sparsity levels, and
+# measures the accuracy drop of the model on a fixed set of evaluation batches. Layers
+# are evaluated in parallel worker processes. The model weights are moved to shared
+# memory once and only read by the workers: a pruned layer is evaluated by passing a
+# masked copy of its weight to torch.func.functional_call, so no worker ever writes to
+# the shared parameters.
+#
+# The sensitivities are then used to recommend a sparsity for every layer such that the
+# FLOPs of the pruned layers fall within flop_budget times their dense FLOPs. Starting
+# from the dense model, the recommendation greedily raises the sparsity of the layer
+# losing the least accuracy per FLOP saved, assuming that the accuracy drops of the
+# layers add up. The FLOPs assume that pruned weights cost nothing, as with the sparse
+# kernels of the sparse_inference pass, and only count the prunable layers.
+#
+# The recommendation maps node targets to sparsities.
+
+import logging
+import os
+
+import torch
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.func import functional_call
+from torch.nn.utils import parametrize
+
+from ...transforms.pruning.pruning_methods import weight_criteria_map
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    # sparsity levels tried for each layer
+    "sparsities": [0.25, 0.5, 0.75, 0.9],
+    # local elementwise ranking criterion, as in the prune pass config
+    "method": "l1-norm",
+    # FLOPs of the pruned layers allowed, relative to the dense ones
+    "flop_budget": 0.5,
+    # worker processes, 0 evaluates the layers in this process
+    "num_workers": os.cpu_count(),
+}
+
+PRUNABLE_MODULES = (nn.Conv2d, nn.Linear)
+
+# set in each worker process by _init_worker
+_worker_state = {}
+
+
+def _weight_name(model: nn.Module, target: str) -> str:
+    """The name of the tensor to override to change the weight of the given layer."""
+    if parametrize.is_parametrized(model.get_submodule(target), "weight"):
+        return f"{target}.parametrizations.weight.original"
+    return f"{target}.weight"
+
+
+def _forward(model, x, weights=None):
+    # inputs are a tensor, or a dict of keyword arguments
+    args, kwargs = ((), x) if isinstance(x, dict) else ((x,), {})
+    if weights is None:
+        return model(*args, **kwargs)
+    return functional_call(model, weights, args, kwargs)
+
+
+@torch.no_grad()
+def evaluate_accuracy(model: nn.Module, batches: list, weights: dict = None) -> float:
+    """Top-1 accuracy over (inputs, labels) batches, with weights overridden if given."""
+    correct, total = 0, 0
+    for x, y in batches:
+        logits = _forward(model, x, weights)
+        correct += (logits.argmax(dim=-1) == y).sum().item()
+        total += y.numel()
+    return correct / total
+
+
+def layer_sensitivity(
+    model: nn.Module, target: str, batches: list, sparsities: list, method: str
+) -> list:
+    """Accuracy of the model with the given layer pruned to each sparsity."""
+    module = model.get_submodule(target)
+    criterion = weight_criteria_map["local"]["elementwise"][method]
+    name = _weight_name(model, target)
+    # the parametrized weight is the original one times the current mask
+    original = model.get_parameter(name).detach()
+    weight = module.weight.detach()
+    accuracies = []
+    for sparsity in sparsities:
+        mask = criterion(weight, {}, sparsity)
+        accuracies.append(evaluate_accuracy(model, batches, {name: original * mask}))
+    return accuracies
+
+
+def _init_worker(model, batches, sparsities, method, num_threads):
+    torch.set_num_threads(num_threads)
+    _worker_state.update(
+        model=model, batches=batches, sparsities=sparsities, method=method
+    )
+
+
+def _run_worker(target):
+    state = _worker_state
+    accuracies = layer_sensitivity(
+        state["model"], target, state["batches"], state["sparsities"], state["method"]
+    )
+    return target, accuracies
+
+
+def layer_flops(model: nn.Module, targets: list, x) -> dict:
+    """
+    Multiply-accumulate FLOPs per sample of each layer, counted on a forward pass and
+    summed over the calls of layers applied more than once.
+    """
+    flops = dict.fromkeys(targets, 0)
+
+    def get_hook(target):
+        def hook(module, args, output):
+            # output positions per sample, each costing a MAC per weight
+            channels = output.shape[-1 if isinstance(module, nn.Linear) else 1]
+            positions = output.numel() // output.shape[0] // channels
+            flops[target] += 2 * module.weight.numel() * positions
+
+        return hook
+
+    handles = [model.get_submodule(t).register_forward_hook(get_hook(t)) for t in flops]
+    with torch.no_grad():
+        _forward(model, x)
+    for handle in handles:
+        handle.remove()
+    return flops
+
+
+def recommend_sparsities(
+    drops: dict, flops: dict, sparsities: list, flop_budget: float
+) -> dict:
+    """
+    Greedily pick a sparsity per layer meeting the FLOP budget for the least summed
+    accuracy drop.
+    """
+    levels = [0.0] + sorted(sparsities)
+    choice = {target: 0 for target in drops}
+    drop_at = {t: [0.0] + [drops[t][s] for s in sorted(sparsities)] for t in drops}
+    budget = flop_budget * sum(flops.values())
+    current = sum(flops.values())
+    while current > budget:
+        best = None
+        for target, i in choice.items():
+            for j in range(i + 1, len(levels)):
+                saved = flops[target] * (levels[j] - levels[i])
+                if saved <= 0:
+                    # pruning a layer without FLOPs does not help the budget
+                    continue
+                cost = max(drop_at[target][j] - drop_at[target][i], 0.0) / saved
+                if best is None or cost < best[0]:
+                    best = (cost, target, j, saved)
+        if best is None:
+            logger.warning(
+                f"The FLOP budget {flop_budget} cannot be met with sparsities "
+                f"up to {levels[-1]}"
+            )
+            break
+        _, target, j, saved = best
+        choice[target] = j
+        current -= saved
+    return {target: levels[i] for target, i in choice.items()}
+
+
+def prune_sensitivity_analysis_pass(graph, pass_args: dict = {}):
+    """
+    Measure the accuracy drop of pruning each Conv2d and Linear layer alone and
+    recommend per-layer sparsities meeting a FLOP budget.
+
+    pass_args takes "eval_batches", a list of (inputs, labels) batches, and optionally
+    the keys of DEFAULT_CONFIG.
+
+    Returns the graph, unchanged, and a dict with the baseline accuracy, the accuracy
+    drop of each layer at each sparsity, the dense FLOPs per sample of each layer, the
+    recommended sparsity of each layer and the FLOP ratio it achieves.
+    """
+    pass_args = dict(pass_args)
+    batches = pass_args.pop("eval_batches", None)
+    if not batches:
+        raise ValueError("prune_sensitivity requires a non-empty list of eval_batches")
+    unknown = set(pass_args) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown prune_sensitivity arguments: {sorted(unknown)}")
+    config = DEFAULT_CONFIG | pass_args
+    sparsities = sorted(config["sparsities"])
+    if not all(0 < s < 1 for s in sparsities):
+        raise ValueError(f"Sparsities must lie in (0, 1), got {sparsities}")
+    if config["method"] not in weight_criteria_map["local"]["elementwise"]:
+        raise ValueError(f"Unknown elementwise pruning method: {config['method']}")
+
+    model = graph.model
+    # a layer called several times is analysed once
+    targets = list(
+        dict.fromkeys(
+            node.target
+            for node in graph.fx_graph.nodes
+            if node.op == "call_module"
+            and isinstance(graph.modules[node.target], PRUNABLE_MODULES)
+        )
+    )
+    was_training = model.training
+    model.eval()
+    baseline = evaluate_accuracy(model, batches)
+    flops = layer_flops(model, targets, batches[0][0])
+
+    num_workers = min(config["num_workers"] or 0, len(targets))
+    accuracies = {}
+    if num_workers > 1:
+        model.share_memory()
+        num_threads = max(1, torch.get_num_threads() // num_workers)
+        init_args = (model, batches, sparsities, config["method"], num_threads)
+        with mp.Pool(num_workers, _init_worker, init_args) as pool:
+            for target, accs in pool.imap_unordered(_run_worker, targets):
+                accuracies[target] = accs
+    else:
+        for target in targets:
+            accuracies[target] = layer_sensitivity(
+                model, target, batches, sparsities, config["method"]
+            )
+    model.train(was_training)
+
+    drops = {
+        target: {s: baseline - acc for s, acc in zip(sparsities, accuracies[target])}
+        for target in targets
+    }
+    recommendation = recommend_sparsities(
+        drops, flops, sparsities, config["flop_budget"]
+    )
+    pruned_flops = sum(flops[t] * (1 - recommendation[t]) for t in targets)
+    flop_ratio = pruned_flops / max(sum(flops.values()), 1)
+    for target in targets:
+        logger.debug(
+            f"{target}: accuracy drop "
+            + ", ".join(f"{s}: {d:.4f}" for s, d in drops[target].items())
+        )
+    logger.info(
+        f"Recommended sparsities for {flop_ratio:.3f} of the dense FLOPs: "
+        f"{recommendation}"
+    )
+    return graph, {
+        "baseline": baseline,
+        "accuracy_drop": drops,
+        "flops": flops,
+        "recommendation": recommendation,
+        "flop_ratio": flop_ratio,
+    }
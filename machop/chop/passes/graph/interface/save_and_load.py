@@ -1,5 +1,8 @@
+import gc
 import logging
 import os
+from contextlib import contextmanager
+
 import numpy as np
 
 import toml
@@ -9,10 +12,22 @@ from chop.passes.graph.analysis.init_metadata import init_metadata_analysis_pass
 from chop.tools.config_load import convert_none_to_str_na, convert_str_na_to_none
 import pickle
 
-
 logger = logging.getLogger(__name__)
 
 
+@contextmanager
+def _gc_paused():
+    # (un)pickling metadata creates many small containers, which would trigger
+    # repeated garbage collection passes over all of them
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
 def save_graph_module_ckpt(graph_module: fx.GraphModule, save_path: str) -> None:
     """Save graph as a checkpoint
     :param graph_module: graph module
@@ -58,18 +73,21 @@ def collect_n_meta_param(graph) -> dict:
 
 def save_n_meta_param(node_meta: dict, save_path: str) -> None:
     """
-    Save a mase graph metadata to a toml file.
+    Save a mase graph metadata to a pickle file.
     """
-    node_meta = convert_none_to_str_na(node_meta)
-
-    with open(save_path, "wb") as f:
+    # pickle keeps None, no need for the "NA" conversion of toml
+    with open(save_path, "wb") as f, _gc_paused():
         pickle.dump(node_meta, f)
 
 
 def load_n_meta_param(load_path: str) -> dict:
     """
-    Load a mase graph metadata from a toml file.
+    Load a mase graph metadata from a pickle or toml file.
     """
+    if load_path.endswith(".pkl"):
+        with open(load_path, "rb") as f, _gc_paused():
+            return pickle.load(f)
+
     with open(load_path, "r") as f:
         node_meta = toml.load(f)
     node_meta = convert_str_na_to_none(node_meta)
@@ -176,21 +194,21 @@ def load_mase_graph_interface_pass(graph, pass_args: dict = {"load_dir": None}):
     if load_dir is None:
         raise ValueError(f"load dir cannot be {load_dir}")
 
-    if os.path.isdir(load_dir):
-        graph_module_ckpt = os.path.join(load_dir, "graph_module.mz")
-        n_meta_param_ckpt = os.path.join(load_dir, "node_meta_param.toml")
-    else:
+    if not os.path.isdir(load_dir):
         # Handle the case when the load directory is not a directory
         # ...
         load_dir = os.path.dirname(load_dir)
-        graph_module_ckpt = os.path.join(load_dir, "graph_module.mz")
+    graph_module_ckpt = os.path.join(load_dir, "graph_module.mz")
+    # save_mase_graph_interface_pass writes a pickle, older checkpoints a toml
+    n_meta_param_ckpt = os.path.join(load_dir, "node_meta_param.pkl")
+    if not os.path.exists(n_meta_param_ckpt):
         n_meta_param_ckpt = os.path.join(load_dir, "node_meta_param.toml")
-    # load metadata.parameters from toml
+    # load metadata.parameters
     node_n_meta_param = load_n_meta_param(n_meta_param_ckpt)
     # load graph module
     graph.model = load_graph_module_ckpt(graph_module_ckpt)
     graph.model.additional_inputs = {}
-    graph = init_metadata_analysis_pass(graph)
+    graph, _ = init_metadata_analysis_pass(graph)
     # add metadata.parameters to graph
     graph = graph_iterator_add_n_meta_param(graph, node_n_meta_param)
     logger.info(f"Loaded mase graph from {load_dir}")
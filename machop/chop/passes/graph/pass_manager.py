@@ -0,0 +1,321 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+import torch
+from tabulate import tabulate
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+logger = logging.getLogger(__name__)
+
+# invalidate every analysis
+ALL = "*"
+
+
+@dataclass(frozen=True)
+class PassInfo:
+    """
+    How a pass interacts with the analyses of a graph:
+    - requires: passes that must have run (and still be valid) before this one
+    - invalidates: analyses whose results are stale after this pass, ALL for every
+      analysis. Passes that require an invalidated analysis are invalidated too
+    - provides: analyses that are valid after this pass, e.g. metadata loaded from
+      a checkpoint
+    - cacheable: the pass is an analysis whose result can be reused while it is
+      valid and called with the same arguments
+    """
+
+    requires: tuple = ()
+    invalidates: tuple = ()
+    provides: tuple = ()
+    cacheable: bool = False
+
+
+_METADATA_ANALYSES = (
+    "add_common_metadata",
+    "add_software_metadata",
+    "add_hardware_metadata",
+    "profile_statistics",
+    "calculate_avg_bits",
+)
+
+PASS_INFO = {
+    # analysis
+    "init_metadata": PassInfo(cacheable=True),
+    "add_common_metadata": PassInfo(requires=("init_metadata",), cacheable=True),
+    "add_software_metadata": PassInfo(
+        requires=("add_common_metadata",), cacheable=True
+    ),
+    "add_hardware_metadata": PassInfo(
+        requires=("add_common_metadata",), cacheable=True
+    ),
+    "profile_statistics": PassInfo(requires=("add_common_metadata",), cacheable=True),
+    "calculate_avg_bits": PassInfo(requires=("add_common_metadata",), cacheable=True),
+    "verify_common_metadata": PassInfo(requires=("add_common_metadata",)),
+    "add_pruning_metadata": PassInfo(requires=("add_common_metadata",)),
+    "add_natural_sparsity": PassInfo(requires=("add_common_metadata",)),
+    "hook_inspection": PassInfo(),
+    "prune_sensitivity": PassInfo(),
+    "report_graph": PassInfo(requires=("init_metadata",)),
+    "report_node_hardware_type": PassInfo(requires=("add_hardware_metadata",)),
+    "report_node_meta_param": PassInfo(requires=("init_metadata",)),
+    "report_node_shape": PassInfo(requires=("add_common_metadata",)),
+    "report_node_type": PassInfo(requires=("add_common_metadata",)),
+    "summarize_quantization": PassInfo(),
+    # interface
+    "save_mase_graph": PassInfo(),
+    "save_node_meta_param": PassInfo(),
+    "load_mase_graph": PassInfo(
+        invalidates=(ALL,), provides=("init_metadata", "add_common_metadata")
+    ),
+    "load_node_meta_param": PassInfo(
+        requires=("init_metadata",),
+        invalidates=_METADATA_ANALYSES,
+        provides=("add_common_metadata",),
+    ),
+    # transform
+    # quantize updates the common metadata of the nodes it replaces
+    "quantize": PassInfo(
+        requires=("add_common_metadata",),
+        invalidates=("add_hardware_metadata", "calculate_avg_bits"),
+    ),
+    "pack_quantized": PassInfo(invalidates=(ALL,)),
+    "integer_backend": PassInfo(invalidates=(ALL,)),
+    "prune": PassInfo(
+        requires=("add_common_metadata",),
+        invalidates=("add_software_metadata", "profile_statistics"),
+    ),
+    "prune_detach_hook": PassInfo(invalidates=("profile_statistics",)),
+    "prune_shrink": PassInfo(invalidates=(ALL,)),
+    "sparse_inference": PassInfo(invalidates=(ALL,)),
+    "conv_bn_fusion": PassInfo(invalidates=(ALL,)),
+    "logicnets_fusion": PassInfo(invalidates=(ALL,)),
+    "huffman": PassInfo(),
+    "huffman_decode": PassInfo(),
+}
+
+
+@dataclass
+class PassRecord:
+    name: str
+    seconds: float
+    # peak increase of the process resident memory during the pass, in bytes
+    peak_memory: int | None = None
+    # peak CUDA memory allocated during the pass, in bytes
+    peak_cuda_memory: int | None = None
+    cached: bool = False
+
+
+def _freeze_args(value):
+    """A hashable key of pass arguments, tensors are keyed on identity and version
+    so in-place updates are noticed."""
+    if isinstance(value, torch.Tensor):
+        return ("tensor", id(value), value._version)
+    if isinstance(value, dict):
+        return tuple((k, _freeze_args(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_args(v) for v in value)
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return ("object", id(value))
+
+
+class _PeakMemory:
+    """Sample the resident memory of the process in a background thread."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+
+    def _sample(self, process):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, process.memory_info().rss)
+
+    def __enter__(self):
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+            self.cuda_start = torch.cuda.memory_allocated()
+        if psutil is None:
+            return self
+        process = psutil.Process()
+        self.start = self.peak = process.memory_info().rss
+        self._thread = threading.Thread(
+            target=self._sample, args=(process,), daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.peak_memory = self.peak_cuda_memory = None
+        if psutil is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, psutil.Process().memory_info().rss)
+            self.peak_memory = self.peak - self.start
+        if torch.cuda.is_available():
+            self.peak_cuda_memory = torch.cuda.max_memory_allocated() - self.cuda_start
+
+
+class PassManager:
+    """
+    Runs graph passes by name, tracking which analyses are valid.
+
+    Prerequisites of a pass are run first unless they are still valid, cacheable
+    analyses called again with the same arguments return their previous result,
+    and each pass run is recorded with its wall time and peak memory.
+
+    Passes that modify the graph outside the manager leave the manager unaware,
+    call ``invalidate`` afterwards.
+
+    :param graph: the graph to run passes on
+    :type graph: MaseGraph
+    :param pass_args: default arguments per pass name, used when a pass is run
+        without arguments, e.g. as a prerequisite, defaults to None
+    :type pass_args: dict, optional
+    :param passes: pass name -> pass, defaults to PASSES
+    :type passes: dict, optional
+    :param pass_info: pass name -> PassInfo, passes without an entry invalidate
+        all analyses, defaults to PASS_INFO
+    :type pass_info: dict, optional
+    :param track_memory: record the peak memory of each pass, defaults to True
+    :type track_memory: bool, optional
+    """
+
+    def __init__(
+        self,
+        graph,
+        pass_args: dict = None,
+        passes: dict = None,
+        pass_info: dict = None,
+        track_memory: bool = True,
+    ):
+        if passes is None:
+            from chop.passes.graph import PASSES as passes
+
+        self.graph = graph
+        self.pass_args = {} if pass_args is None else pass_args
+        self.passes = passes
+        self.pass_info = PASS_INFO if pass_info is None else pass_info
+        self.track_memory = track_memory
+        # valid analysis -> (arguments key, result)
+        self.valid = {}
+        self.records = []
+
+    def run(self, name: str, *args, **kwargs):
+        """Run a pass on the graph after its prerequisites.
+
+        Without arguments the pass is called as ``pass(graph, pass_args=...)``
+        with the default arguments given to the manager, otherwise as
+        ``pass(graph, *args, **kwargs)``.
+
+        :return: what the pass returns
+        """
+        info = self.pass_info.get(name, PassInfo(invalidates=(ALL,)))
+        for required in info.requires:
+            if required not in self.valid:
+                self.run(required)
+
+        if not args and not kwargs:
+            kwargs = {"pass_args": self.pass_args.get(name, None)}
+        key = _freeze_args((args, kwargs))
+        if info.cacheable and name in self.valid and self.valid[name][0] == key:
+            logger.debug(f"Skipping {name}, its result is still valid")
+            self.records.append(PassRecord(name, 0.0, cached=True))
+            result = self.valid[name][1]
+            if self._returns_graph(result):
+                result = (self.graph,) + result[1:]
+            return result
+
+        start = time.perf_counter()
+        if self.track_memory:
+            with _PeakMemory() as memory:
+                result = self.passes[name](self.graph, *args, **kwargs)
+            record = PassRecord(
+                name,
+                time.perf_counter() - start,
+                memory.peak_memory,
+                memory.peak_cuda_memory,
+            )
+        else:
+            result = self.passes[name](self.graph, *args, **kwargs)
+            record = PassRecord(name, time.perf_counter() - start)
+        self.records.append(record)
+        logger.debug(f"Pass {name} took {record.seconds:.3f}s")
+
+        if self._returns_graph(result):
+            self.graph = result[0]
+        self.invalidate(info.invalidates)
+        # a re-run analysis invalidates the analyses built on its previous result
+        self.invalidate(self._dependents(name))
+        for provided in info.provides:
+            # valid, but not a cached result for any arguments
+            self.valid[provided] = (None, None)
+        if info.cacheable:
+            self.valid[name] = (key, result)
+        return result
+
+    def _returns_graph(self, result):
+        # passes return (graph, info), or extra results after the graph
+        return (
+            isinstance(result, tuple)
+            and len(result) > 0
+            and isinstance(result[0], type(self.graph))
+        )
+
+    def invalidate(self, names=(ALL,)):
+        """Mark analyses as stale, and with them the analyses that require them.
+
+        :param names: analyses to invalidate, defaults to all
+        :type names: Iterable[str], optional
+        """
+        names = set(names)
+        if ALL in names:
+            self.valid = {}
+            return
+        stale = set()
+        for name in names:
+            stale |= {name} | self._dependents(name)
+        for name in stale:
+            self.valid.pop(name, None)
+
+    def _dependents(self, name):
+        # passes that require name, directly or transitively
+        dependents = set()
+        stack = [name]
+        while stack:
+            current = stack.pop()
+            for other, info in self.pass_info.items():
+                if current in info.requires and other not in dependents:
+                    dependents.add(other)
+                    stack.append(other)
+        return dependents
+
+    def report(self) -> str:
+        """A table of the recorded pass runs."""
+
+        def _mib(num_bytes):
+            return "" if num_bytes is None else f"{num_bytes / 2**20:.1f}"
+
+        table = [
+            [
+                r.name,
+                "cached" if r.cached else f"{r.seconds:.3f}",
+                _mib(r.peak_memory),
+                _mib(r.peak_cuda_memory),
+            ]
+            for r in self.records
+        ]
+        table.append(["total", f"{sum(r.seconds for r in self.records):.3f}", "", ""])
+        return tabulate(
+            table,
+            headers=["Pass", "Time (s)", "Peak RSS (MiB)", "Peak CUDA (MiB)"],
+            tablefmt="pretty",
+        )
@@ -1,5 +1,15 @@
-from .pruning import prune_transform_pass, prune_detach_hook_transform_pass
-from .quantize import quantize_transform_pass, summarize_quantization_analysis_pass
+from .pruning import (
+    prune_transform_pass,
+    prune_detach_hook_transform_pass,
+    prune_shrink_transform_pass,
+    sparse_inference_transform_pass,
+)
+from .quantize import (
+    quantize_transform_pass,
+    pack_quantized_transform_pass,
+    integer_backend_transform_pass,
+    summarize_quantization_analysis_pass,
+)
 from .huffman import huffman_transform_pass, huffman_decode_pass
 from .verilog import (
     emit_bram_transform_pass,
@@ -1,2 +1,3 @@
 from .huffman import huffman_transform_pass
 from .decode import huffman_decode_pass
+from .container import CompressedCheckpoint, save_compressed_checkpoint
@@ -0,0 +1,202 @@
+# Canonical Huffman coding of quantized weights
+# --------------------------------------------------------------------------------------
+# Quantized weights take few distinct values. They are mapped to integer codes, indices
+# into the sorted table of distinct values, whose histogram gives the Huffman code
+# lengths. The codes are canonical: sorted by (length, symbol), each code is the
+# previous one plus one, shifted left when the length grows. The lengths alone define
+# the codes, so an encoded tensor stores the symbol table, one byte of code length per
+# symbol and the codes bit-packed most significant bit first, without padding between
+# codes.
+#
+# Decoding is table driven. Codes are limited to MAX_CODE_LENGTH bits, so peeking at
+# the next MAX_CODE_LENGTH bits of the stream indexes a table giving the symbol and the
+# length of the code starting there. The encoder also records the bit offset of every
+# block_size-th code, splitting the stream into blocks decoded side by side: each step
+# decodes one code of every block with a few vectorised operations.
+
+import heapq
+import math
+
+import numpy as np
+
+# symbols encoded per step when packing the bitstream, bounding the memory used
+_CHUNK_SIZE = 1 << 20
+
+# longest code, so decoding tables have at most 2 ** MAX_CODE_LENGTH entries
+MAX_CODE_LENGTH = 16
+
+
+def _limit_lengths(lengths: np.ndarray, counts: np.ndarray, max_length: int):
+    # Shorten the longest codes as in annex K.3 of the JPEG standard: two codes of the
+    # longest length become one code a bit shorter and two codes below a shorter leaf,
+    # keeping the Kraft sum. The lengths then go to the symbols by decreasing count.
+    num_codes = np.bincount(lengths).tolist()
+    for length in range(len(num_codes) - 1, max_length, -1):
+        while num_codes[length] > 0:
+            shorter = length - 2
+            while num_codes[shorter] == 0:
+                shorter -= 1
+            num_codes[length] -= 2
+            num_codes[length - 1] += 1
+            num_codes[shorter + 1] += 2
+            num_codes[shorter] -= 1
+    limited = np.repeat(np.arange(len(num_codes)), num_codes).astype(np.uint8)
+    lengths = np.empty_like(lengths)
+    lengths[np.argsort(-counts, kind="stable")] = limited
+    return lengths
+
+
+def code_lengths(counts: np.ndarray, max_length: int = MAX_CODE_LENGTH) -> np.ndarray:
+    """
+    Huffman code length of each symbol given the symbol counts, all non-zero, with
+    codes no longer than max_length bits.
+    """
+    if len(counts) > 1 << max_length:
+        raise ValueError(
+            f"{len(counts)} symbols cannot be coded in {max_length} bits or less"
+        )
+    if len(counts) == 1:
+        return np.ones(1, dtype=np.uint8)
+    lengths = np.zeros(len(counts), dtype=np.uint8)
+    # merging two subtrees adds a bit to the codes of all their symbols
+    heap = [(int(count), i, [i]) for i, count in enumerate(counts)]
+    heapq.heapify(heap)
+    while len(heap) > 1:
+        count_lo, i, lo = heapq.heappop(heap)
+        count_hi, _, hi = heapq.heappop(heap)
+        lengths[lo] += 1
+        lengths[hi] += 1
+        heapq.heappush(heap, (count_lo + count_hi, i, lo + hi))
+    if lengths.max() > max_length:
+        lengths = _limit_lengths(lengths, counts, max_length)
+    return lengths
+
+
+def canonical_codes(lengths: np.ndarray) -> np.ndarray:
+    """Canonical code of each symbol given the code lengths."""
+    codes = np.zeros(len(lengths), dtype=np.uint64)
+    code, previous = 0, 0
+    for i in np.lexsort((np.arange(len(lengths)), lengths)):
+        code <<= int(lengths[i]) - previous
+        codes[i] = code
+        code, previous = code + 1, int(lengths[i])
+    return codes
+
+
+def block_size(num_symbols: int) -> int:
+    """Codes per block, balancing the steps of decoding against the lanes per step."""
+    return min(max(math.isqrt(num_symbols), 64), 4096)
+
+
+def pack_codes(indices: np.ndarray, codes: np.ndarray, lengths: np.ndarray, block):
+    """
+    The codes of the symbols at indices, bit-packed, the number of bits and the bit
+    offset of the first code of each block.
+    """
+    max_length = int(lengths.max())
+    shifts = np.arange(max_length - 1, -1, -1, dtype=np.uint64)
+    # bits of each code, aligned to the right of max_length columns
+    table = ((codes[:, None] >> shifts) & 1).astype(bool)
+    used = np.arange(max_length) >= max_length - lengths[:, None].astype(np.int64)
+    chunks, carry = [], np.zeros(0, dtype=bool)
+    for start in range(0, len(indices), _CHUNK_SIZE):
+        chunk = indices[start : start + _CHUNK_SIZE]
+        bits = np.concatenate([carry, table[chunk][used[chunk]]])
+        whole = len(bits) - len(bits) % 8
+        chunks.append(np.packbits(bits[:whole]))
+        carry = bits[whole:]
+    chunks.append(np.packbits(carry))
+    ends = np.cumsum(lengths[indices], dtype=np.int64)
+    num_bits = int(ends[-1])
+    num_blocks = -(-len(indices) // block)
+    offsets = np.concatenate([[0], ends[block - 1 : (num_blocks - 1) * block : block]])
+    offsets = offsets.astype(np.uint32 if num_bits < 1 << 32 else np.uint64)
+    return np.concatenate(chunks), num_bits, offsets
+
+
+class HuffmanEncoded:
+    """
+    A tensor Huffman coded as its distinct values, their code lengths, the packed
+    codes of its elements and the bit offsets of the blocks of codes.
+    """
+
+    def __init__(self, symbols, lengths, data, num_bits, shape, offsets, block):
+        self.symbols = symbols
+        self.lengths = lengths
+        self.data = data
+        self.num_bits = num_bits
+        self.shape = tuple(shape)
+        self.offsets = offsets
+        self.block = block
+
+    @classmethod
+    def encode(cls, values: np.ndarray) -> "HuffmanEncoded":
+        symbols, indices = np.unique(values.reshape(-1), return_inverse=True)
+        lengths = code_lengths(np.bincount(indices, minlength=len(symbols)))
+        block = block_size(len(indices))
+        data, num_bits, offsets = pack_codes(
+            indices, canonical_codes(lengths), lengths, block
+        )
+        return cls(symbols, lengths, data, num_bits, values.shape, offsets, block)
+
+    def decoding_tables(self):
+        """
+        The symbol and the code length for each value of the next max_length bits, and
+        max_length.
+        """
+        max_length = int(self.lengths.max())
+        # canonical codes in order are consecutive ranges of the table
+        by_code = np.lexsort((np.arange(len(self.lengths)), self.lengths))
+        lengths = self.lengths[by_code]
+        repeats = 1 << (max_length - lengths.astype(np.int64))
+        # a single symbol has the code 0 and leaves half of the table unused
+        padding = (1 << max_length) - repeats.sum()
+        symbols = np.repeat(self.symbols[by_code], repeats)
+        symbols = np.concatenate([symbols, symbols[:1].repeat(padding)])
+        steps = np.repeat(lengths.astype(np.int64), repeats)
+        steps = np.concatenate([steps, steps[:1].repeat(padding)])
+        return symbols, steps, max_length
+
+    def decode(self, out: np.ndarray = None) -> np.ndarray:
+        """The original values, decoded into out if given."""
+        num_symbols = math.prod(self.shape)
+        if out is None:
+            out = np.empty(self.shape, dtype=self.symbols.dtype)
+        elif out.size != num_symbols or not out.flags.c_contiguous:
+            raise ValueError(f"Cannot decode a {self.shape} tensor into {out.shape}")
+        flat = out.reshape(-1)
+        symbols, steps, max_length = self.decoding_tables()
+        # windows[i] holds the bytes i to i + 2, enough to peek at 16 bits from any bit
+        data = np.concatenate([self.data, np.zeros(2, dtype=np.uint8)]).astype(np.int32)
+        windows = (data[:-2] << 16) | (data[1:-1] << 8) | data[2:]
+        shift, mask = 24 - max_length, (1 << max_length) - 1
+
+        position = self.offsets.astype(np.int64)
+        lanes = np.arange(len(position)) * self.block
+        last = num_symbols - lanes[-1]
+        for step in range(self.block):
+            if step == last:
+                # the last block is shorter
+                position, lanes = position[:-1], lanes[:-1]
+                if not len(lanes):
+                    break
+            peek = (windows[position >> 3] >> (shift - (position & 7))) & mask
+            flat[lanes + step] = symbols[peek]
+            position += steps[peek]
+        return out
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the packed codes, block offsets, symbol and code length tables."""
+        return (
+            self.data.nbytes
+            + self.offsets.nbytes
+            + self.symbols.nbytes
+            + self.lengths.nbytes
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"HuffmanEncoded(shape={self.shape}, symbols={len(self.symbols)}, "
+            f"nbytes={self.nbytes})"
+        )
@@ -0,0 +1,313 @@
+# Deep-compression checkpoints
+# --------------------------------------------------------------------------------------
+# A single file holding a state dict with its weights pruned, quantized and Huffman
+# coded. The file starts with a magic string and the length of a JSON header, followed
+# by the header and the arrays of all tensors, each aligned to ALIGNMENT bytes:
+#
+#   MAGIC | header length (uint64, little endian) | JSON header | padding | arrays
+#
+# The header lists for each tensor its shape, torch dtype, encoding and the position of
+# its arrays relative to the start of the arrays. Tensors are stored with one of:
+#
+#   raw             the bytes of the tensor
+#   huffman         the tensor Huffman coded: its distinct values (the low-bit codes
+#                   index them), their code lengths, the packed codes and block offsets
+#   sparse_huffman  the non-zero values Huffman coded, and the sparse index: the gaps
+#                   between non-zero positions, Huffman coded as well
+#
+# whichever is the smallest for the tensors to entropy code, raw for the others.
+# Loading maps the file in memory and decodes a tensor only when it is accessed, so a
+# model is loaded one layer at a time.
+
+import json
+import math
+import mmap
+import os
+import time
+from collections.abc import Mapping
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from .canonical import HuffmanEncoded
+
+MAGIC = b"MASEMZC1"
+ALIGNMENT = 8
+
+# the arrays of a Huffman coded tensor
+_HUFFMAN_ARRAYS = ("symbols", "lengths", "data", "offsets")
+
+# set in each worker process by _init_worker
+_worker_tensors = {}
+
+# dtypes that can be entropy coded, with NumPy equivalents
+_NUMPY = {
+    torch.float64: np.float64,
+    torch.float32: np.float32,
+    torch.float16: np.float16,
+    torch.int64: np.int64,
+    torch.int32: np.int32,
+    torch.int16: np.int16,
+    torch.int8: np.int8,
+    torch.uint8: np.uint8,
+    torch.bool: np.bool_,
+}
+
+
+def _dtype_name(dtype: torch.dtype) -> str:
+    return str(dtype).removeprefix("torch.")
+
+
+def _huffman_entry(encoded: HuffmanEncoded, prefix: str):
+    meta = {"num_bits": encoded.num_bits, "block": encoded.block}
+    meta["shape"] = list(encoded.shape)
+    arrays = {f"{prefix}.{name}": getattr(encoded, name) for name in _HUFFMAN_ARRAYS}
+    return meta, arrays
+
+
+def _encode(tensor: torch.Tensor):
+    """The smallest entropy coding of the tensor, as its header entry and arrays."""
+    if tensor.dtype not in _NUMPY:
+        return _raw(tensor)
+    values = tensor.detach().cpu().numpy().reshape(-1)
+    candidates = []
+    try:
+        meta, arrays = _huffman_entry(HuffmanEncoded.encode(values), "values")
+        candidates.append(({"encoding": "huffman", "values": meta}, arrays))
+        nonzero = np.flatnonzero(values)
+        if 0 < len(nonzero) <= len(values) // 2:
+            gaps = np.diff(nonzero, prepend=-1) - 1
+            meta, arrays = _huffman_entry(
+                HuffmanEncoded.encode(values[nonzero]), "values"
+            )
+            index_meta, index_arrays = _huffman_entry(
+                HuffmanEncoded.encode(gaps), "index"
+            )
+            entry = {"encoding": "sparse_huffman", "values": meta, "index": index_meta}
+            candidates.append((entry, arrays | index_arrays))
+    except ValueError:
+        # too many distinct values for the longest code, not quantized
+        pass
+    candidates.append(_raw(tensor))
+    return min(candidates, key=lambda c: sum(a.nbytes for a in c[1].values()))
+
+
+def _raw(tensor: torch.Tensor):
+    data = tensor.detach().cpu().contiguous().reshape(-1).view(torch.uint8).numpy()
+    return {"encoding": "raw"}, {"data": data}
+
+
+def _timed_encode(tensor: torch.Tensor):
+    start = time.perf_counter()
+    entry, arrays = _encode(tensor)
+    return entry, arrays, time.perf_counter() - start
+
+
+def _init_worker(tensors):
+    torch.set_num_threads(1)
+    _worker_tensors.update(tensors)
+
+
+def _run_worker(name):
+    return name, *_timed_encode(_worker_tensors[name])
+
+
+def encode_tensors(tensors: dict, num_workers: int = 0) -> dict:
+    """
+    Entropy code each tensor, one per task in a pool of worker processes if num_workers
+    is above 1. The tensors are moved to shared memory and only read by the workers.
+
+    Returns the header entry, arrays and encoding time of each tensor.
+    """
+    num_workers = min(num_workers, len(tensors))
+    if num_workers <= 1:
+        return {name: _timed_encode(tensor) for name, tensor in tensors.items()}
+    tensors = {name: tensor.detach().cpu() for name, tensor in tensors.items()}
+    for tensor in tensors.values():
+        tensor.share_memory_()
+    encoded = {}
+    with mp.Pool(num_workers, _init_worker, (tensors,)) as pool:
+        # the largest tensors first, so that no large tensor is encoded last
+        names = sorted(tensors, key=lambda name: -tensors[name].numel())
+        for name, *result in pool.imap_unordered(_run_worker, names):
+            encoded[name] = tuple(result)
+    return encoded
+
+
+def save_compressed_checkpoint(
+    state_dict: dict, path, encode=None, num_workers: int = 0
+) -> dict:
+    """
+    Save a state dict as a deep-compression checkpoint.
+
+    Tensors named in encode, or all tensors if None, are entropy coded when it makes
+    them smaller, in num_workers processes. Returns the size report of the saved
+    checkpoint, with the encoding time of each entropy coded tensor.
+    """
+    to_encode = {
+        name: tensor
+        for name, tensor in state_dict.items()
+        if tensor.numel() > 0 and (encode is None or name in encode)
+    }
+    encoded = encode_tensors(to_encode, num_workers)
+    header, arrays, offset = {}, [], 0
+    for name, tensor in state_dict.items():
+        if name in encoded:
+            entry, tensor_arrays, _ = encoded[name]
+        else:
+            entry, tensor_arrays = _raw(tensor)
+        entry |= {"shape": list(tensor.shape), "dtype": _dtype_name(tensor.dtype)}
+        entry["arrays"] = {}
+        for array_name, array in tensor_arrays.items():
+            array = np.ascontiguousarray(array)
+            entry["arrays"][array_name] = {
+                "dtype": array.dtype.str,
+                "offset": offset,
+                "count": array.size,
+            }
+            arrays.append((offset, array))
+            offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        header[name] = entry
+
+    header_bytes = json.dumps(header).encode()
+    start = len(MAGIC) + 8 + len(header_bytes)
+    padding = -start % ALIGNMENT
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header_bytes).to_bytes(8, "little"))
+        f.write(header_bytes)
+        f.write(bytes(padding))
+        position = 0
+        for array_offset, array in arrays:
+            f.write(bytes(array_offset - position))
+            f.write(array.tobytes())
+            position = array_offset + array.nbytes
+    report = CompressedCheckpoint(path).report()
+    for name, (_, _, encode_time) in encoded.items():
+        report["tensors"][name]["encode_time"] = encode_time
+    return report
+
+
+class CompressedCheckpoint(Mapping):
+    """
+    A deep-compression checkpoint mapped in memory, decoding each tensor on access.
+
+    Passing it to load_state_dict decodes all tensors at once; load_into decodes them
+    one at a time straight into the tensors of a model.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a deep-compression checkpoint")
+        header_length = int.from_bytes(
+            self._mmap[len(MAGIC) : len(MAGIC) + 8], "little"
+        )
+        start = len(MAGIC) + 8
+        self.header = json.loads(self._mmap[start : start + header_length])
+        start += header_length
+        self._start = start + -start % ALIGNMENT
+
+    def _array(self, entry: dict, name: str) -> np.ndarray:
+        spec = entry["arrays"][name]
+        return np.frombuffer(
+            self._mmap,
+            dtype=np.dtype(spec["dtype"]),
+            count=spec["count"],
+            offset=self._start + spec["offset"],
+        )
+
+    def _huffman(self, entry: dict, prefix: str) -> HuffmanEncoded:
+        meta = entry[prefix]
+        arrays = [self._array(entry, f"{prefix}.{name}") for name in _HUFFMAN_ARRAYS]
+        return HuffmanEncoded(
+            *arrays[:3], meta["num_bits"], meta["shape"], arrays[3], meta["block"]
+        )
+
+    def decode(self, name: str, out: torch.Tensor = None) -> torch.Tensor:
+        """The tensor named name, decoded into out if given."""
+        entry = self.header[name]
+        dtype = getattr(torch, entry["dtype"])
+        shape = entry["shape"]
+        if out is None:
+            out = torch.empty(shape, dtype=dtype)
+        elif list(out.shape) != shape:
+            raise ValueError(f"Cannot decode {name} of shape {shape} into {out.shape}")
+        # decode in place unless a copy to another device or dtype is needed
+        direct = out.device.type == "cpu" and out.is_contiguous() and out.dtype == dtype
+        encoding = entry["encoding"]
+        if encoding == "raw":
+            data = self._array(entry, "data")
+            if direct:
+                out.detach().reshape(-1).view(torch.uint8).numpy()[:] = data
+            else:
+                with torch.no_grad():
+                    out.copy_(torch.from_numpy(data.copy()).view(dtype).reshape(shape))
+            return out
+        target = (
+            out.detach().numpy() if direct else np.empty(shape, dtype=_NUMPY[dtype])
+        )
+        if encoding == "huffman":
+            self._huffman(entry, "values").decode(out=target)
+        elif encoding == "sparse_huffman":
+            gaps = self._huffman(entry, "index").decode()
+            flat = target.reshape(-1)
+            flat.fill(0)
+            flat[np.cumsum(gaps + 1) - 1] = self._huffman(entry, "values").decode()
+        else:
+            raise ValueError(f"Unknown encoding {encoding} of {name}")
+        if not direct:
+            with torch.no_grad():
+                out.copy_(torch.from_numpy(target))
+        return out
+
+    def load_into(self, model: torch.nn.Module, strict: bool = True):
+        """Decode the tensors one at a time into the state dict tensors of a model."""
+        state_dict = model.state_dict()
+        missing = [name for name in state_dict if name not in self.header]
+        unexpected = [name for name in self.header if name not in state_dict]
+        if strict and (missing or unexpected):
+            raise RuntimeError(
+                f"Error loading {self.path}: missing keys {missing}, "
+                f"unexpected keys {unexpected}"
+            )
+        for name, tensor in state_dict.items():
+            if name in self.header:
+                self.decode(name, out=tensor)
+        return model
+
+    def report(self) -> dict:
+        """On-disk bytes of each tensor and of the file against their dense size."""
+        tensors = {}
+        for name, entry in self.header.items():
+            dense = math.prod(entry["shape"]) * getattr(torch, entry["dtype"]).itemsize
+            stored = sum(
+                np.dtype(spec["dtype"]).itemsize * spec["count"]
+                for spec in entry["arrays"].values()
+            )
+            tensors[name] = {
+                "encoding": entry["encoding"],
+                "dense": dense,
+                "stored": stored,
+            }
+        dense = sum(t["dense"] for t in tensors.values())
+        file_size = os.path.getsize(self.path)
+        return {
+            "path": str(self.path),
+            "tensors": tensors,
+            "dense": dense,
+            "file": file_size,
+            "ratio": dense / file_size,
+        }
+
+    def __getitem__(self, name):
+        return self.decode(name)
+
+    def __iter__(self):
+        return iter(self.header)
+
+    def __len__(self):
+        return len(self.header)
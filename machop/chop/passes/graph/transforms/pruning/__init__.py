@@ -1,2 +1,4 @@
 from .prune import prune_transform_pass
 from .prune_detach_hook import prune_detach_hook_transform_pass
+from .shrink import prune_shrink_transform_pass
+from .sparse_inference import sparse_inference_transform_pass
@@ -30,6 +30,12 @@ ACTIVATION_PRUNE_METHODS = [
     "feature-map-l1-norm",
     "feature-map-l2-norm",
 ]
+# n:m keeps round((1 - sparsity) * m) weights in every m consecutive input weights of
+# Conv2d and Linear layers
+PRUNE_GRANULARITIES = ["random", "elementwise", "kernelwise", "channelwise", "n:m"]
+# dynamic: ranked on the batch, every update_interval batches
+# static: ranked once on the mean magnitude of the first calibration_batches batches
+ACTIVATION_MASK_MODES = ["dynamic", "static"]
 
 # A registry of available pruning strategies (i.e. algorithms)
 # PRUNE_METHODS = {
@@ -46,10 +52,10 @@ def load(config: dict):
     granularity = config.get("granularity", "elementwise")
 
     # if granularity not in ["channel", "elementwise", "kernelwise", "channelwise"]:
-    if granularity not in ["random", "elementwise", "kernelwise", "channelwise"]:
+    if granularity not in PRUNE_GRANULARITIES:
         raise ValueError(
             "Unsupported pruning granularity {}. Please choose from {}".format(
-                granularity, ["random", "elementwise", "kernelwise", "channelwise"]
+                granularity, PRUNE_GRANULARITIES
             )
         )
     if scope not in ["local", "global"]:
@@ -86,11 +92,16 @@ def load_weight_prune_config(config: dict, graph):
             )
         )
 
+    m = config.get("m", 4)
+    if granularity == "n:m":
+        _verify_nm(sparsity, m, scope)
+
     return {
         "method": method,
         "granularity": granularity,
         "scope": scope,
         "sparsity": sparsity,
+        "m": m,
     }
 
 
@@ -98,19 +109,39 @@ def load_activation_prune_config(config: dict, graph):
     sparsity, scope, granularity = load(config)
 
     method = config.get("method", "random")
+    mode = config.get("mode", "dynamic")
+    calibration_batches = config.get("calibration_batches", 1)
+    update_interval = config.get("update_interval", 1)
     # Validate the parameters
+    if granularity == "n:m":
+        raise ValueError("N:M granularity is only supported for weights")
     if method not in ACTIVATION_PRUNE_METHODS:
         raise ValueError(
             "Unsupported pruning method {}. Please choose from {}".format(
                 method, ACTIVATION_PRUNE_METHODS
             )
         )
+    if mode not in ACTIVATION_MASK_MODES:
+        raise ValueError(
+            "Unsupported activation mask mode {}. Please choose from {}".format(
+                mode, ACTIVATION_MASK_MODES
+            )
+        )
+    for key, value in [
+        ("calibration_batches", calibration_batches),
+        ("update_interval", update_interval),
+    ]:
+        if not isinstance(value, int) or value < 1:
+            raise ValueError(f"{key} must be a positive integer. Got {value}")
 
     return {
         "method": method,
         "granularity": granularity,
         "scope": scope,
         "sparsity": sparsity,
+        "mode": mode,
+        "calibration_batches": calibration_batches,
+        "update_interval": update_interval,
     }
 
 
@@ -165,6 +196,18 @@ def _verify_sparsity(sparsity):
         raise ValueError("Sparsity must be between 0 and 1. Got {}".format(sparsity))
 
 
+def _verify_nm(sparsity, m, scope):
+    if not isinstance(m, int) or m < 1:
+        raise ValueError(f"m must be a positive integer. Got {m}")
+    if scope == "global":
+        # the number of weights kept per group is chosen layer by layer
+        return
+    sparsities = sparsity.values() if isinstance(sparsity, dict) else [sparsity]
+    for s in sparsities:
+        if abs(m * (1 - s) - round(m * (1 - s))) > 1e-6:
+            raise ValueError(f"N:M sparsity must be a multiple of 1/m={1 / m}. Got {s}")
+
+
 # def _log_metadata(graph):
 #     logger.info(
 #         "\n"
@@ -0,0 +1,129 @@
+# N:M semi-structured sparsity
+# --------------------------------------------------------------------------------------
+# In an N:M sparse weight, at most n of every m consecutive weights along the input
+# dimension are non-zero: along the input features of a Linear layer, and along the
+# input channels at each kernel position of a Conv2d layer. An input dimension that is
+# not a multiple of m is padded with zeros. The padding is never kept, but it fills the
+# last group: that group keeps n of its r < m weights (all of them if r <= n), so such
+# a layer is denser than n / m, e.g. 2:4 keeps 4 of 6 input channels rather than 3.
+#
+# Such a weight is stored as the n kept values of every group and their positions in
+# the group, ceil(log2(m)) bits each, packed into a byte stream.
+
+import math
+
+import torch
+
+
+def _groups(tensor: torch.Tensor, m: int, value=0) -> torch.Tensor:
+    # (..., num_groups, m) with the input dimension last, padded with value
+    x = tensor.movedim(1, -1)
+    pad = -x.shape[-1] % m
+    if pad:
+        x = torch.cat([x, x.new_full((*x.shape[:-1], pad), value)], dim=-1)
+    return x.reshape(*x.shape[:-1], -1, m)
+
+
+def _ungroup(grouped: torch.Tensor, shape) -> torch.Tensor:
+    x = grouped.reshape(*grouped.shape[:-2], -1)[..., : shape[1]]
+    return x.movedim(-1, 1)
+
+
+def nm_mask(scores: torch.Tensor, n: int, m: int) -> torch.Tensor:
+    """
+    The mask keeping the n highest scores of every group of m consecutive scores
+    along the input dimension (dim 1). A last group shorter than m keeps up to n
+    scores too, so the mask keeps more than n / m of the scores when the input
+    dimension is not a multiple of m.
+
+    :param scores: importance of the weights, e.g. their magnitude
+    :type scores: torch.Tensor
+    :param n: number of weights kept per group, in [0, m]
+    :type n: int
+    :param m: group size
+    :type m: int
+    :return: a boolean mask of the shape of scores
+    :rtype: torch.Tensor
+    """
+    if not 0 <= n <= m:
+        raise ValueError(f"Expected 0 <= n <= m, got n={n}, m={m}")
+    # padding never outranks a weight
+    grouped = _groups(scores, m, value=float("-inf"))
+    kept = grouped.topk(n, dim=-1).indices
+    mask = torch.zeros_like(grouped, dtype=torch.bool).scatter_(-1, kept, True)
+    return _ungroup(mask, scores.shape)
+
+
+def pack_bits(values: torch.Tensor, bits: int) -> torch.Tensor:
+    """Pack non-negative integers below 2**bits into a uint8 stream, LSB first."""
+    shifts = torch.arange(bits, device=values.device)
+    stream = ((values.reshape(-1, 1).long() >> shifts) & 1).flatten()
+    stream = torch.cat([stream, stream.new_zeros(-stream.numel() % 8)])
+    weights = 1 << torch.arange(8, device=values.device)
+    return (stream.view(-1, 8) * weights).sum(dim=1).to(torch.uint8)
+
+
+def unpack_bits(packed: torch.Tensor, bits: int, count: int) -> torch.Tensor:
+    """The first count integers of bits bits packed by pack_bits, as int64."""
+    shifts = torch.arange(8, device=packed.device)
+    stream = ((packed.long()[:, None] >> shifts) & 1).flatten()
+    stream = stream[: count * bits].view(count, bits)
+    return (stream << torch.arange(bits, device=packed.device)).sum(dim=1)
+
+
+class NMSparseTensor:
+    """
+    Compact storage of an N:M sparse tensor: the kept values, (..., num_groups, n)
+    with the input dimension grouped last, and their packed positions in the groups.
+    """
+
+    def __init__(self, values, indices, n: int, m: int, shape):
+        self.values = values
+        self.indices = indices
+        self.n = n
+        self.m = m
+        self.shape = torch.Size(shape)
+
+    @property
+    def index_bits(self) -> int:
+        return max(1, math.ceil(math.log2(self.m)))
+
+    @classmethod
+    def from_dense(cls, tensor: torch.Tensor, m: int, mask=None):
+        """
+        :param tensor: the dense weight
+        :param m: group size
+        :param mask: the kept weights, at most n in every group, defaults to the
+            non-zero weights
+        """
+        mask = tensor != 0 if mask is None else mask.bool()
+        grouped_mask = _groups(mask, m)
+        n = int(grouped_mask.sum(dim=-1).max()) if grouped_mask.numel() else 0
+        # the kept positions of every group in increasing order, completed with
+        # pruned ones in groups with fewer than n kept weights
+        positions = grouped_mask.to(torch.uint8).topk(n, dim=-1).indices
+        positions = positions.sort(dim=-1).values
+        values = torch.gather(_groups(tensor.detach() * mask, m), -1, positions)
+        bits = max(1, math.ceil(math.log2(m)))
+        return cls(values, pack_bits(positions, bits), n, m, tensor.shape)
+
+    def to_dense(self) -> torch.Tensor:
+        positions = unpack_bits(self.indices, self.index_bits, self.values.numel())
+        positions = positions.view(self.values.shape)
+        grouped = self.values.new_zeros(*self.values.shape[:-1], self.m)
+        grouped.scatter_(-1, positions, self.values)
+        return _ungroup(grouped, self.shape)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes taken by the values and the packed positions."""
+        return (
+            self.values.numel() * self.values.element_size()
+            + self.indices.numel() * self.indices.element_size()
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"NMSparseTensor(shape={tuple(self.shape)}, n={self.n}, m={self.m}, "
+            f"dtype={self.values.dtype}, nbytes={self.nbytes})"
+        )
@@ -3,17 +3,11 @@ import torch
 from .load import load_activation_prune_config, load_weight_prune_config
 from .pruning_methods import weight_criteria_map, activation_criteria_map
 
-from .sparse_parameterization import FakeSparseWeight, FakeStructuredSparseWeight
-
-try:
-    from actions.prune_and_retrain import act_masks
-except:
-    pass
-
-global has_finished_prune
-has_finished_prune = False
-global prune_count
-prune_count = 0
+from .sparse_parameterization import (
+    FakeNMSparseWeight,
+    FakeSparseWeight,
+    FakeStructuredSparseWeight,
+)
 
 
 def prune_with_a_function(info, fn, sparsity):
@@ -34,6 +28,12 @@ def get_weight_hook(name, info, named_info, w_config: dict):
     value = named_info["value"]  # tensor
     w_sparsity = named_info["weight_sparsity"]  # sparsity
     register_parameter_name = "weight"
+    if w_config["granularity"] == "n:m":
+        m = w_config["m"]
+        parameterization = FakeNMSparseWeight(
+            w_rank_fn(value, info, w_sparsity, m=m), m
+        )
+        return (register_parameter_name, parameterization)
     parameterization = FakeSparseWeight(
         w_rank_fn(value, info, w_sparsity)
     )  # [tensor, info, sparsity]
@@ -56,48 +56,53 @@ def get_weight_hook_channel(name, info, named_info, next_named_info, w_config: d
 def get_activation_hook(name, info, named_info, batch_size, a_config: dict):
     a_rank_fn = get_activation_rank_fn(a_config)
     a_sparsity = named_info["activation_sparsity"]
+    mode = a_config["mode"]
+    calibration_batches = a_config["calibration_batches"]
+    update_interval = a_config["update_interval"]
 
-    value = named_info["value"]
-    register_parameter_name = "register_forward_pre_hook"
-    global has_finished_prune
-    global prune_count
+    # number of batches seen, and the sum of their mean activation magnitudes
+    num_batches = 0
+    magnitude = None
 
     # register forward hook
     def sparsify_input(module, args):
-        global has_finished_prune
-        global prune_count
+        nonlocal num_batches, magnitude
         if len(args) > 1:
             raise ValueError(
                 f"{module.__class__.__name__} takes more than 1 argument at inference, the current sparsiy_input pre forward hook only allows one!"
             )
         x = args[0]
-        mask = a_rank_fn(x, info, a_sparsity)
-        module.activation_mask = mask
-
-        if not has_finished_prune:
-            prune_count += 1
-            if prune_count >= 6:
-                has_finished_prune = True
-        else:
-            try:
-                act_masks = torch.load("act_masks2.pth")
-                if x.shape == (batch_size, 3, 32, 32):
-                    mask = act_masks[0]
-                elif x.shape == (batch_size, 128, 32, 32):
-                    mask = act_masks[1]
-                elif x.shape == (batch_size, 128, 16, 16):
-                    mask = act_masks[2]
-                elif x.shape == (batch_size, 256, 16, 16):
-                    mask = act_masks[3]
-                elif x.shape == (batch_size, 256, 8, 8):
-                    mask = act_masks[4]
-                elif x.shape == (batch_size, 512, 8, 8):
-                    mask = act_masks[5]
-                else:
-                    pass
-            except:
-                pass
-
+        if mode == "static" and "activation_mask" in module._buffers:
+            # calibrated
+            return x * module.activation_mask
+
+        mask = getattr(module, "activation_mask", None)
+        if (
+            mode == "static"
+            or num_batches % update_interval == 0
+            or mask is None
+            or mask.shape != x.shape
+        ):
+            mask = a_rank_fn(x, info, a_sparsity)
+            module.activation_mask = mask
+        num_batches += 1
+
+        if mode == "static":
+            batch_magnitude = x.detach().abs().mean(dim=0, keepdim=True)
+            if magnitude is None:
+                magnitude = batch_magnitude
+            else:
+                magnitude += batch_magnitude
+            if num_batches == calibration_batches:
+                # rank the mean magnitude over the calibration batches once, the
+                # mask is shared by all samples
+                del module.activation_mask
+                module.register_buffer(
+                    "activation_mask",
+                    a_rank_fn(magnitude / num_batches, info, a_sparsity),
+                    persistent=False,
+                )
+                magnitude = None
         return x * mask
 
     return ("register_forward_pre_hook", sparsify_input)
@@ -319,12 +324,18 @@ def prune_graph_iterator(graph, batch_size, config: dict):
 
     print("finish building hooks!")
 
+    # N:M sparsity also applies to the weights of Linear layers, whose activations
+    # are not pruned
+    pruned_types = (torch.nn.Conv2d,)
+    if w_config["granularity"] == "n:m":
+        pruned_types += (torch.nn.Linear,)
+
     # prune in second loop by applying hooks to relevant modules
     for node in graph.fx_graph.nodes:
         # pruning only deals with modules at the moment
         if node.op == "call_module":
             module = graph.modules[node.target]
-            if isinstance(module, torch.nn.Conv2d):
+            if isinstance(module, pruned_types):
                 name = node.target
                 if name in hooks.keys():
                     node_hooks = hooks[name]
@@ -334,7 +345,9 @@ def prune_graph_iterator(graph, batch_size, config: dict):
                         torch.nn.utils.parametrize.register_parametrization(
                             graph.modules[node.target], register_name, parameterization
                         )
-                    if node_hooks["a_hook"] is not None:
+                    if node_hooks["a_hook"] is not None and isinstance(
+                        module, torch.nn.Conv2d
+                    ):
                         register_fn, hook_fn = node_hooks["a_hook"]
                         # apply activation pruning
                         getattr(graph.modules[node.target], register_fn)(hook_fn)
@@ -5,13 +5,18 @@
 # --------------------------------------------------------------------------------------
 # We assume that the sparsity isn't 0.0 as (1) the mask (all ones) is known beforehand
 # and (2) the criterion function may not generate a valid mask. The L1 ranking function
-# uses the quantile function, which, when the sparisty is 0, uses the lowest value as
-# the threshold. So, at least one value in the mask is always set to False.
+# uses the quantile threshold, which, when the sparisty is 0, is the lowest value. So, at
+# least one value in the mask is always set to False.
+
+import weakref
 
 import torch
 import torch.nn.utils.prune as prune
 import pdb
 
+from .nm_sparse import nm_mask
+from .selection import sparsity_threshold
+
 """
 These implemntations are for the pruning functional we assume info always have the following form:
     an info entry = {
@@ -30,20 +35,6 @@ def random(tensor: torch.Tensor, info: dict, sparsity: float) -> torch.Tensor:
     return mask
 
 
-def handle_large_input_data(flat_tensor: torch.Tensor, sparsity: float):
-    # print(f"the input tensor is {flat_tensor.shape} and is divided into small batches")
-    batch_unit = int(1e6)
-    num_batches = (flat_tensor.size(0) + batch_unit - 1) // batch_unit
-    quantiles = []
-    for i in range(num_batches - 1):
-        batch = flat_tensor[i * batch_unit : (i + 1) * batch_unit]
-        quantiles.append(torch.quantile(batch, sparsity))
-    batch = flat_tensor[(num_batches - 1) * batch_unit :]
-    quantiles.append(torch.quantile(batch, sparsity))
-    threshold = torch.mean(torch.tensor(quantiles))
-    return threshold
-
-
 # Default: local
 
 
@@ -51,10 +42,7 @@ def handle_large_input_data(flat_tensor: torch.Tensor, sparsity: float):
 ## 1.1: magnitude-based (element-wise / kernel-wise / channel-wise)
 def l1_weight(tensor: torch.Tensor, info: dict, sparsity: float) -> torch.Tensor:
     flat_tensor = tensor.abs().flatten()
-    try:
-        threshold = torch.quantile(flat_tensor, sparsity)
-    except RuntimeError as e:
-        threshold = handle_large_input_data(flat_tensor, sparsity)
+    threshold = sparsity_threshold(flat_tensor, sparsity)
     mask = (tensor.abs() > threshold).to(torch.bool).to(tensor.device)
     return mask
 
@@ -62,10 +50,7 @@ def l1_weight(tensor: torch.Tensor, info: dict, sparsity: float) -> torch.Tensor
 def l2_weight(tensor: torch.Tensor, info: dict, sparsity: float) -> torch.Tensor:
     l2_norms = tensor.pow(2).sqrt()
     flattened_l2_norms = l2_norms.flatten()
-    try:
-        threshold = torch.quantile(flattened_l2_norms, sparsity)
-    except RuntimeError as e:
-        threshold = handle_large_input_data(flattened_l2_norms, sparsity)
+    threshold = sparsity_threshold(flattened_l2_norms, sparsity)
     mask = (l2_norms > threshold).to(torch.bool).to(tensor.device)
     return mask
 
@@ -73,10 +58,7 @@ def l2_weight(tensor: torch.Tensor, info: dict, sparsity: float) -> torch.Tensor
 def kernel_l1_weight(tensor: torch.Tensor, info: dict, sparsity: float) -> torch.Tensor:
     l1_norms = tensor.abs().sum(dim=(2, 3))
     flattened_l1_norms = l1_norms.flatten()
-    try:
-        threshold = torch.quantile(flattened_l1_norms, sparsity)
-    except:
-        threshold = handle_large_input_data(flattened_l1_norms, sparsity)
+    threshold = sparsity_threshold(flattened_l1_norms, sparsity)
     mask = (l1_norms > threshold).to(torch.bool).to(tensor.device)
     return mask
 
@@ -84,10 +66,7 @@ def kernel_l1_weight(tensor: torch.Tensor, info: dict, sparsity: float) -> torch
 def kernel_l2_weight(tensor: torch.Tensor, info: dict, sparsity: float) -> torch.Tensor:
     l2_norms = torch.norm(tensor, p=2, dim=(2, 3))
     flattened_l2_norms = l2_norms.flatten()
-    try:
-        threshold = torch.quantile(flattened_l2_norms, sparsity)
-    except:
-        threshold = handle_large_input_data(flattened_l2_norms, sparsity)
+    threshold = sparsity_threshold(flattened_l2_norms, sparsity)
     mask = (l2_norms > threshold).to(torch.bool).to(tensor.device)
     return mask
 
@@ -105,15 +84,9 @@ def channel_l1_weight_multi_layer(
         final_flattened_l1_norms = (
             0.5 * flattened_l1_norms + 0.5 * flattened_next_l1_norms
         )
-        try:
-            threshold = torch.quantile(final_flattened_l1_norms, sparsity)
-        except:
-            threshold = handle_large_input_data(final_flattened_l1_norms, sparsity)
+        threshold = sparsity_threshold(final_flattened_l1_norms, sparsity)
     else:
-        try:
-            threshold = torch.quantile(flattened_l1_norms, sparsity)
-        except:
-            threshold = handle_large_input_data(flattened_l1_norms, sparsity)
+        threshold = sparsity_threshold(flattened_l1_norms, sparsity)
     mask = (l1_norms > threshold).to(torch.bool).to(tensor.device)
     return mask
 
@@ -131,15 +104,9 @@ def channel_l2_weight_multi_layer(
         final_flattened_l2_norms = (
             0.5 * flattened_l2_norms + 0.5 * flattened_next_l2_norms
         )
-        try:
-            threshold = torch.quantile(final_flattened_l2_norms, sparsity)
-        except:
-            threshold = handle_large_input_data(final_flattened_l2_norms, sparsity)
+        threshold = sparsity_threshold(final_flattened_l2_norms, sparsity)
     else:
-        try:
-            threshold = torch.quantile(flattened_l2_norms, sparsity)
-        except:
-            threshold = handle_large_input_data(flattened_l2_norms, sparsity)
+        threshold = sparsity_threshold(flattened_l2_norms, sparsity)
     mask = (l2_norms > threshold).to(torch.bool).to(tensor.device)
     return mask
 
@@ -155,15 +122,9 @@ def channel_l1_weight(
         next_l1_norms = next_tensor.abs().sum(dim=(0, 2, 3))
         flattened_next_l1_norms = next_l1_norms.flatten()
         final_flattened_l1_norms = flattened_l1_norms
-        try:
-            threshold = torch.quantile(final_flattened_l1_norms, sparsity)
-        except:
-            threshold = handle_large_input_data(final_flattened_l1_norms, sparsity)
+        threshold = sparsity_threshold(final_flattened_l1_norms, sparsity)
     else:
-        try:
-            threshold = torch.quantile(flattened_l1_norms, sparsity)
-        except:
-            threshold = handle_large_input_data(flattened_l1_norms, sparsity)
+        threshold = sparsity_threshold(flattened_l1_norms, sparsity)
     mask = (l1_norms > threshold).to(torch.bool).to(tensor.device)
     return mask
 
@@ -179,28 +140,31 @@ def channel_l2_weight(
         next_l2_norms = next_tensor.abs().sum(dim=(0, 2, 3))
         flattened_next_l2_norms = next_l2_norms.flatten()
         final_flattened_l2_norms = flattened_l2_norms
-        try:
-            threshold = torch.quantile(final_flattened_l2_norms, sparsity)
-        except:
-            threshold = handle_large_input_data(final_flattened_l2_norms, sparsity)
+        threshold = sparsity_threshold(final_flattened_l2_norms, sparsity)
     else:
-        try:
-            threshold = torch.quantile(flattened_l2_norms, sparsity)
-        except:
-            threshold = handle_large_input_data(flattened_l2_norms, sparsity)
+        threshold = sparsity_threshold(flattened_l2_norms, sparsity)
     mask = (l2_norms > threshold).to(torch.bool).to(tensor.device)
     return mask
 
 
+## 1.2: N:M semi-structured, the n largest weights of every m along the input dimension
+def nm_n(sparsity: float, m: int) -> int:
+    # the number of weights kept per group for a sparsity target
+    return round(m * (1 - sparsity))
+
+
+def nm_l1_weight(
+    tensor: torch.Tensor, info: dict, sparsity: float, m: int = 4
+) -> torch.Tensor:
+    return nm_mask(tensor.abs(), nm_n(sparsity, m), m).to(tensor.device)
+
+
 # 2. activation outputs
 ## 2.1: focus on neurons
 ### 2.1.1: magnitude-based
 def activation_l1(tensor: torch.Tensor, info: dict, sparsity: float) -> torch.Tensor:
     flat_tensor = tensor.abs().flatten()
-    try:
-        threshold = torch.quantile(flat_tensor, sparsity)
-    except RuntimeError as e:
-        threshold = handle_large_input_data(flat_tensor, sparsity)
+    threshold = sparsity_threshold(flat_tensor, sparsity)
     mask = (tensor.abs() > threshold).to(torch.bool).to(tensor.device)
     return mask
 
@@ -208,10 +172,7 @@ def activation_l1(tensor: torch.Tensor, info: dict, sparsity: float) -> torch.Te
 def activation_l2(tensor: torch.Tensor, info: dict, sparsity: float) -> torch.Tensor:
     l2_norms = tensor.pow(2).sqrt()
     flattened_l2_norms = l2_norms.flatten()
-    try:
-        threshold = torch.quantile(flattened_l2_norms, sparsity)
-    except RuntimeError as e:
-        threshold = handle_large_input_data(flattened_l2_norms, sparsity)
+    threshold = sparsity_threshold(flattened_l2_norms, sparsity)
     mask = (tensor.abs() > threshold).to(torch.bool).to(tensor.device)
     return mask
 
@@ -223,10 +184,7 @@ def activation_l1_feature_map(
 ) -> torch.Tensor:
     l1_norms = tensor.abs().sum(dim=(0, 2, 3))  # e.g: 3*(512*32*32)
     flattened_l1_norms = l1_norms.flatten()
-    try:
-        threshold = torch.quantile(flattened_l1_norms, sparsity)
-    except:
-        threshold = handle_large_input_data(flattened_l1_norms, sparsity)
+    threshold = sparsity_threshold(flattened_l1_norms, sparsity)
     mask = l1_norms > threshold
     mask = mask.view(1, tensor.shape[1], 1, 1)
     mask = mask.expand(tensor.shape[0], -1, tensor.shape[2], tensor.shape[3])
@@ -239,10 +197,7 @@ def activation_l2_feature_map(
 ) -> torch.Tensor:
     l2_norms = tensor.abs().sum(dim=(0, 2, 3))  # e.g: 3*(512*32*32)
     flattened_l2_norms = l2_norms.flatten()
-    try:
-        threshold = torch.quantile(flattened_l2_norms, sparsity)
-    except:
-        threshold = handle_large_input_data(flattened_l2_norms, sparsity)
+    threshold = sparsity_threshold(flattened_l2_norms, sparsity)
     mask = l2_norms > threshold
     mask = mask.view(1, tensor.shape[1], 1, 1)
     mask = mask.expand(tensor.shape[0], -1, tensor.shape[2], tensor.shape[3])
@@ -267,22 +222,17 @@ def channel_similarity_feature_map(
         cosine_similarity_matrix.size(0), cosine_similarity_matrix.size(1), offset=1
     )
     similarities = cosine_similarity_matrix[triu_indices[0], triu_indices[1]]
-    # Pair each similarity score with its index
-    pair_indices = list(zip(triu_indices[0].tolist(), triu_indices[1].tolist()))
-    indexed_similarities = list(zip(similarities.tolist(), pair_indices))
-    # Sort by similarity
-    indexed_similarities.sort(reverse=True)
+    # Rank the pairs by decreasing similarity, ties by decreasing (i, j) as when
+    # sorting (similarity, (i, j)) tuples: the pairs are listed in increasing (i, j)
+    # order, so a stable sort of the reversed list breaks ties the same way
+    order = torch.sort(similarities.flip(0), descending=True, stable=True).indices
     # Determine the number of pairs to remove based on sparsity
-    num_pairs_to_remove = int(sparsity * len(indexed_similarities))
-    # Select indices to remove
-    indices_to_remove = set()
-    for _, (i, j) in indexed_similarities[:num_pairs_to_remove]:
-        # Arbitrarily choose one of the pair to remove, here we choose the second
-        indices_to_remove.add(j)
-    indices_to_remove = sorted(indices_to_remove)
+    num_pairs_to_remove = int(sparsity * similarities.numel())
+    # Arbitrarily choose one of each pair to remove, here we choose the second
+    indices_to_remove = triu_indices[1].flip(0)[order[:num_pairs_to_remove].cpu()]
     # Create a mask
     mask = torch.ones(cosine_similarity_matrix.size(0), dtype=torch.bool)
-    mask[list(indices_to_remove)] = False
+    mask[indices_to_remove] = False
     mask = mask.view(1, tensor.shape[1], 1, 1)
     mask = mask.expand(tensor.shape[0], -1, tensor.shape[2], tensor.shape[3])
     mask = mask.to(tensor.device)
@@ -294,40 +244,52 @@ def channel_similarity_feature_map(
 ## It's relatively easy to change from each method in local to global.
 
 
+# The global criteria are called once per layer with the same info, the threshold is
+# computed once per set of layer tensors (identity and version) and sparsity. The
+# tensors are referenced weakly, so that the cache does not keep a model alive.
+_global_threshold_cache = {}
+
+
+def _global_threshold(criterion, tensors, sparsity, transform=None):
+    versions = tuple(t._version for t in tensors)
+    cached = _global_threshold_cache.get(criterion)
+    if cached is not None:
+        refs, cached_versions, cached_sparsity, threshold = cached
+        if (
+            cached_sparsity == sparsity
+            and cached_versions == versions
+            and len(refs) == len(tensors)
+            and all(ref() is t for ref, t in zip(refs, tensors))
+        ):
+            return threshold
+    threshold = sparsity_threshold(tensors, sparsity, transform=transform)
+    refs = tuple(weakref.ref(t) for t in tensors)
+    _global_threshold_cache[criterion] = (refs, versions, sparsity, threshold)
+    return threshold
+
+
 def global_weight_l1(tensor: torch.Tensor, info: dict, sparsity: float):
     tensors = [v["weight_value"] for _, v in info.items() if v is not None]
-    flattened_tensors = [tensor.abs().flatten() for tensor in tensors]
-    flattened_tensors = torch.cat(flattened_tensors)
-    try:
-        threshold = torch.quantile(flattened_tensors, sparsity)
-    except RuntimeError as e:
-        threshold = handle_large_input_data(flattened_tensors, sparsity)
+    # ranked layer by layer without concatenating the weights
+    threshold = _global_threshold("weight_l1", tensors, sparsity, torch.abs)
     mask = (tensor.abs() > threshold).to(torch.bool).to(tensor.device)
     return mask
 
 
-def global_weight_l1(tensor: torch.Tensor, info: dict, sparsity: float):
+def global_nm_l1_weight(
+    tensor: torch.Tensor, info: dict, sparsity: float, m: int = 4
+) -> torch.Tensor:
+    # the global ranking decides how many weights each layer keeps per group
     tensors = [v["weight_value"] for _, v in info.items() if v is not None]
-    flattened_tensors = [tensor.abs().flatten() for tensor in tensors]
-    flattened_tensors = torch.cat(flattened_tensors)
-    try:
-        threshold = torch.quantile(flattened_tensors, sparsity)
-    except RuntimeError as e:
-        threshold = handle_large_input_data(flattened_tensors, sparsity)
-    mask = (tensor.abs() > threshold).to(torch.bool).to(tensor.device)
-    return mask
+    threshold = _global_threshold("weight_l1", tensors, sparsity, torch.abs)
+    density = (tensor.abs() > threshold).float().mean().item()
+    return nm_mask(tensor.abs(), nm_n(1 - density, m), m).to(tensor.device)
 
 
 def global_activation_l1(tensor: torch.Tensor, info: dict, sparsity: float):
     tensors = [v["activation_value"] for _, v in info.items() if v is not None]
-    flattened_tensors = [
-        tensor.abs().sum(dim=(1, 2, 3)).flatten() for tensor in tensors
-    ]
-    flattened_tensors = torch.cat(flattened_tensors)
-    try:
-        threshold = torch.quantile(flattened_tensors, sparsity)
-    except RuntimeError as e:
-        threshold = handle_large_input_data(flattened_tensors, sparsity)
+    l1_norms = [tensor.abs().sum(dim=(1, 2, 3)).flatten() for tensor in tensors]
+    threshold = sparsity_threshold(l1_norms, sparsity)
     mask = (tensor.abs() > threshold).to(torch.bool).to(tensor.device)
     return mask
 
@@ -342,8 +304,13 @@ weight_criteria_map = {
             "l1-norm-single": channel_l1_weight,
             "l2-norm-single": channel_l2_weight,
         },
+        # the l1 and l2 norms of single weights rank them the same
+        "n:m": {"l1-norm": nm_l1_weight, "l2-norm": nm_l1_weight},
+    },
+    "global": {
+        "elementwise": {"l1-norm": global_weight_l1},
+        "n:m": {"l1-norm": global_nm_l1_weight},
     },
-    "global": {"elementwise": {"l1-norm": global_weight_l1}},
 }
 
 activation_criteria_map = {
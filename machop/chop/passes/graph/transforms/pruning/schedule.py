@@ -0,0 +1,183 @@
+# Gradual pruning during training
+# --------------------------------------------------------------------------------------
+# Instead of pruning once and retraining, the sparsity is raised from an initial to a
+# final value while training, following Zhu & Gupta, "To prune, or not to prune"
+# (2017): the masks are re-ranked every `frequency` steps with the sparsity
+#
+#   s_t = s_f + (s_i - s_f) * (1 - (t - t_0) / (t_1 - t_0)) ** 3
+#
+# so that most weights are removed early, when the network can still recover. The
+# callback updates the mask buffers installed by the prune pass in place: the graph is
+# neither retraced nor re-analysed, and the optimizer keeps its parameters.
+
+import logging
+from functools import partial
+
+import pytorch_lightning as pl
+import torch
+from torch.nn.utils import parametrize
+
+from .load import load_weight_prune_config
+from .pruning_methods import weight_criteria_map
+from .sparse_parameterization import FakeNMSparseWeight, FakeSparseWeight
+
+logger = logging.getLogger(__name__)
+
+
+def polynomial_sparsity(
+    step: int,
+    initial_sparsity: float,
+    final_sparsity: float,
+    begin_step: int,
+    end_step: int,
+    exponent: float = 3,
+) -> float:
+    """The sparsity at a training step, decaying polynomially to the final one."""
+    if step <= begin_step:
+        return initial_sparsity
+    if step >= end_step:
+        return final_sparsity
+    remaining = 1 - (step - begin_step) / (end_step - begin_step)
+    return final_sparsity + (initial_sparsity - final_sparsity) * remaining**exponent
+
+
+SPARSITY_SCHEDULES = {
+    "cubic": partial(polynomial_sparsity, exponent=3),
+    "linear": partial(polynomial_sparsity, exponent=1),
+}
+
+# the criteria of these granularities take a weight and return its mask
+SCHEDULED_GRANULARITIES = ["elementwise", "kernelwise", "n:m"]
+
+
+def _write_mask(parametrization, mask):
+    # the mask buffer may have been expanded to the shape of the weight, in which case
+    # its source is updated
+    target = parametrization._source_mask()
+    target.copy_(mask.reshape(target.shape))
+
+
+class GradualPruningCallback(pl.Callback):
+    """
+    Raise the weight sparsity of a model pruned by the prune pass on a schedule,
+    updating the pruning masks in place every `frequency` training steps.
+
+    :param w_config: the weight pruning config of the prune pass (method, scope,
+        granularity, m), its sparsity is the initial one unless initial_sparsity is
+        given
+    :type w_config: dict
+    :param final_sparsity: sparsity reached at end_step
+    :type final_sparsity: float
+    :param end_step: step at which the final sparsity is reached
+    :type end_step: int
+    :param begin_step: first step at which the masks are updated, defaults to 0
+    :type begin_step: int, optional
+    :param frequency: number of steps between mask updates, defaults to 100
+    :type frequency: int, optional
+    :param schedule: "cubic", "linear", or a function of (step, initial_sparsity,
+        final_sparsity, begin_step, end_step), defaults to "cubic"
+    :type schedule: str | Callable, optional
+    :param initial_sparsity: sparsity at begin_step, defaults to the one of w_config
+    :type initial_sparsity: float, optional
+    """
+
+    def __init__(
+        self,
+        w_config: dict,
+        final_sparsity: float,
+        end_step: int,
+        begin_step: int = 0,
+        frequency: int = 100,
+        schedule="cubic",
+        initial_sparsity: float = None,
+    ):
+        super().__init__()
+        w_config = load_weight_prune_config(w_config, None)
+        if w_config["granularity"] not in SCHEDULED_GRANULARITIES:
+            raise ValueError(
+                "Gradual pruning supports the {} granularities. Got {}".format(
+                    SCHEDULED_GRANULARITIES, w_config["granularity"]
+                )
+            )
+        if isinstance(schedule, str):
+            if schedule not in SPARSITY_SCHEDULES:
+                raise ValueError(
+                    "Unsupported sparsity schedule {}. Please choose from {}".format(
+                        schedule, list(SPARSITY_SCHEDULES)
+                    )
+                )
+            schedule = SPARSITY_SCHEDULES[schedule]
+        if initial_sparsity is None:
+            initial_sparsity = w_config["sparsity"]
+        if not 0 <= begin_step < end_step:
+            raise ValueError(
+                f"Expected 0 <= begin_step < end_step. Got {begin_step}, {end_step}"
+            )
+        if not isinstance(frequency, int) or frequency < 1:
+            raise ValueError(f"frequency must be a positive integer. Got {frequency}")
+
+        self.rank_fn = weight_criteria_map[w_config["scope"]][w_config["granularity"]][
+            w_config["method"]
+        ]
+        self.w_config = w_config
+        self.initial_sparsity = initial_sparsity
+        self.final_sparsity = final_sparsity
+        self.begin_step = begin_step
+        self.end_step = end_step
+        self.frequency = frequency
+        self.schedule = schedule
+        self.sparsity = None
+
+    @classmethod
+    def from_config(cls, w_config: dict, schedule_config: dict):
+        """Build the callback from the [passes.prune.weight] and
+        [passes.prune.schedule] sections of a config."""
+        return cls(w_config, **schedule_config)
+
+    def sparsity_at(self, step: int) -> float:
+        return self.schedule(
+            step,
+            self.initial_sparsity,
+            self.final_sparsity,
+            self.begin_step,
+            self.end_step,
+        )
+
+    @staticmethod
+    def pruned_modules(model):
+        """name -> module of the modules whose weight has a pruning mask."""
+        return {
+            name: module
+            for name, module in model.named_modules()
+            if parametrize.is_parametrized(module, "weight")
+            and isinstance(module.parametrizations.weight[0], FakeSparseWeight)
+        }
+
+    @torch.no_grad()
+    def update_masks(self, model, sparsity: float):
+        """Re-rank the weights of the pruned modules of a model at a sparsity."""
+        modules = self.pruned_modules(model)
+        # the masked weights, so that pruned weights stay pruned
+        weights = {name: module.weight.detach() for name, module in modules.items()}
+        info = {name: {"weight_value": weight} for name, weight in weights.items()}
+        kwargs = {}
+        if self.w_config["granularity"] == "n:m":
+            kwargs["m"] = self.w_config["m"]
+        for name, module in modules.items():
+            parametrization = module.parametrizations.weight[0]
+            if isinstance(parametrization, FakeNMSparseWeight):
+                kwargs["m"] = parametrization.m
+            mask = self.rank_fn(weights[name], info, sparsity, **kwargs)
+            _write_mask(parametrization, mask)
+        self.sparsity = sparsity
+        logger.debug(f"Updated {len(modules)} pruning masks to sparsity {sparsity:.3f}")
+
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx):
+        step = trainer.global_step
+        if step < self.begin_step or step > self.end_step:
+            return
+        if (step - self.begin_step) % self.frequency and step != self.end_step:
+            return
+        sparsity = self.sparsity_at(step)
+        if sparsity != self.sparsity:
+            self.update_masks(pl_module, sparsity)
@@ -0,0 +1,143 @@
+# Exact order statistics for pruning thresholds
+# --------------------------------------------------------------------------------------
+# torch.quantile refuses inputs above 2^24 elements and needs all values in a single
+# tensor. Pruning only compares scores against the threshold with ">", so the linearly
+# interpolated quantile and the order statistic below it produce the same mask; it is
+# enough to select the floor(sparsity * (n - 1))-th smallest value exactly.
+#
+# Values spread over several tensors (global pruning) are selected with a radix select
+# over the bit patterns of the floats: each pass streams over the tensors chunk by chunk
+# and counts 16-bit digits, so nothing is ever concatenated.
+
+import math
+
+import torch
+
+# elements per chunk, bounds the size of the temporaries of a pass
+CHUNK_SIZE = 2**24
+
+_DIGIT_BITS = 16
+_NUM_DIGITS = 2**_DIGIT_BITS
+# below this size torch.kthvalue is faster than a radix select
+_KTHVALUE_MAX_NUMEL = 2**20
+
+
+def _key_format(dtype):
+    # (integer dtype of the same width, number of bits)
+    if dtype == torch.float64:
+        return torch.int64, 64
+    return torch.int32, 32
+
+
+def _to_keys(values: torch.Tensor) -> torch.Tensor:
+    """Signed integer keys ordered like the float values."""
+    if values.dtype != torch.float64:
+        values = values.float()
+    int_dtype, num_bits = _key_format(values.dtype)
+    bits = values.contiguous().view(int_dtype)
+    # negative floats are ordered by decreasing magnitude: flip their non-sign bits
+    return bits ^ ((bits >> (num_bits - 1)) & (2 ** (num_bits - 1) - 1))
+
+
+def _from_key(key: int, dtype) -> torch.Tensor:
+    float_dtype = torch.float64 if dtype == torch.float64 else torch.float32
+    int_dtype, num_bits = _key_format(float_dtype)
+    key = torch.tensor(key, dtype=int_dtype)
+    bits = key ^ ((key >> (num_bits - 1)) & (2 ** (num_bits - 1) - 1))
+    return bits.view(float_dtype).to(dtype)
+
+
+def _chunks(tensors, transform, chunk_size):
+    for tensor in tensors:
+        flat = tensor.reshape(-1)
+        for start in range(0, flat.numel(), chunk_size):
+            chunk = flat[start : start + chunk_size]
+            yield chunk if transform is None else transform(chunk)
+
+
+def _as_list(values):
+    return [values] if isinstance(values, torch.Tensor) else list(values)
+
+
+def kth_value(
+    values, k: int, transform=None, chunk_size: int = CHUNK_SIZE
+) -> torch.Tensor:
+    """
+    The exact k-th smallest value (0-based) of a tensor or of several tensors taken
+    together.
+
+    :param values: a tensor, or a sequence of tensors selected from as one
+    :type values: torch.Tensor | Sequence[torch.Tensor]
+    :param k: rank of the value to select, 0 is the minimum
+    :type k: int
+    :param transform: elementwise function applied to the values chunk by chunk,
+        e.g. torch.abs, so transformed copies of large tensors are never kept
+    :type transform: Callable, optional
+    :param chunk_size: number of elements transformed and counted at once
+    :type chunk_size: int, optional
+    :return: a 0-dim tensor
+    :rtype: torch.Tensor
+    """
+    tensors = _as_list(values)
+    numel = sum(t.numel() for t in tensors)
+    if not 0 <= k < numel:
+        raise ValueError(f"k={k} is out of range for {numel} elements")
+
+    if len(tensors) == 1 and numel <= min(chunk_size, _KTHVALUE_MAX_NUMEL):
+        flat = tensors[0].reshape(-1)
+        if transform is not None:
+            flat = transform(flat)
+        return torch.kthvalue(flat, k + 1).values
+
+    device = tensors[0].device
+    dtype = tensors[0].dtype
+    if transform is not None:
+        dtype = transform(tensors[0].reshape(-1)[:1]).dtype
+    _, num_bits = _key_format(dtype)
+    # the digits selected so far, as a signed integer made of the top bits of the key
+    prefix = None
+    for shift in range(num_bits - _DIGIT_BITS, -1, -_DIGIT_BITS):
+        counts = torch.zeros(_NUM_DIGITS, dtype=torch.int64, device=device)
+        for chunk in _chunks(tensors, transform, chunk_size):
+            keys = _to_keys(chunk)
+            if prefix is not None:
+                keys = keys[(keys >> (shift + _DIGIT_BITS)) == prefix]
+            digits = (keys >> shift) & (_NUM_DIGITS - 1)
+            counts += torch.bincount(digits, minlength=_NUM_DIGITS)
+        if prefix is None:
+            # the top digit carries the sign, order it from negative to positive
+            counts = counts.roll(-_NUM_DIGITS // 2)
+        cumulative = counts.cumsum(0)
+        digit = int(torch.searchsorted(cumulative, k, right=True))
+        if digit > 0:
+            k -= int(cumulative[digit - 1])
+        if prefix is None:
+            prefix = digit - _NUM_DIGITS // 2
+        else:
+            prefix = (prefix << _DIGIT_BITS) | digit
+    return _from_key(prefix, dtype).to(device)
+
+
+def sparsity_threshold(
+    values, sparsity: float, transform=None, chunk_size: int = CHUNK_SIZE
+) -> torch.Tensor:
+    """
+    The threshold below which a `sparsity` fraction of the values lies: values
+    strictly greater than it are kept. The resulting mask is identical to the one
+    obtained with torch.quantile(values, sparsity), for inputs of any size.
+
+    :param values: a tensor, or a sequence of tensors whose values are ranked together
+    :type values: torch.Tensor | Sequence[torch.Tensor]
+    :param sparsity: fraction of the values to prune, in [0, 1]
+    :type sparsity: float
+    :param transform: elementwise function applied to the values before ranking
+    :type transform: Callable, optional
+    :return: a 0-dim tensor
+    :rtype: torch.Tensor
+    """
+    if not 0.0 <= sparsity <= 1.0:
+        raise ValueError(f"sparsity must be in [0, 1], got {sparsity}")
+    tensors = _as_list(values)
+    numel = sum(t.numel() for t in tensors)
+    k = math.floor(sparsity * (numel - 1))
+    return kth_value(tensors, k, transform=transform, chunk_size=chunk_size)
@@ -0,0 +1,529 @@
+# A pass to physically remove pruned channels from Conv2d/Linear layers
+# --------------------------------------------------------------------------------------
+# Channel pruning only masks the weights, so the model keeps its size and latency. This
+# pass follows the channels of every Conv2d/Linear output through the graph: layers
+# applied channel by channel (BatchNorm, activations, pooling, dropout) pass them on,
+# residual adds couple the channels of their inputs, and flattening feeds them to a
+# Linear layer as blocks of features. Flattening keeps the channels in blocks only for
+# Conv2d outputs and for Linear outputs known to be (N, C) from the node metadata: a
+# Linear output (N, L, C) is flattened feature by feature, so its channels are kept. Output channels whose weights are zero in every
+# producer of a coupled group are removed from the producers, from the BatchNorm layers
+# on the way, and from the input channels/features of the consuming layers.
+#
+# Channels that reach anything else (the model output, concatenation, grouped
+# convolutions, ...) are left untouched.
+#
+# A removed channel is not zero: its producers output their bias, which the layers on
+# the way to the consumers turn into another constant. This constant is folded into the
+# bias of each consumer, summed over the kernel for a Conv2d. Where the consumer input is
+# not constant over space (a Conv2d with zero padding, an AvgPool2d counting its padding,
+# dropout in training), channels with a nonzero constant are kept instead.
+
+import logging
+import operator
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.nn.utils import parametrize
+
+logger = logging.getLogger(__name__)
+
+# modules and functions that act on each channel independently
+CHANNELWISE_MODULES = (
+    nn.ReLU,
+    nn.ReLU6,
+    nn.LeakyReLU,
+    nn.SiLU,
+    nn.GELU,
+    nn.Hardswish,
+    nn.Hardsigmoid,
+    nn.Sigmoid,
+    nn.Tanh,
+    nn.Dropout,
+    nn.Identity,
+    nn.MaxPool2d,
+    nn.AvgPool2d,
+    nn.AdaptiveAvgPool2d,
+)
+CHANNELWISE_FUNCTIONS = (
+    torch.relu,
+    F.relu,
+    F.relu6,
+    torch.sigmoid,
+    torch.tanh,
+    F.dropout,
+    F.max_pool2d,
+    F.avg_pool2d,
+    F.adaptive_avg_pool2d,
+)
+CHANNELWISE_METHODS = ("relu", "sigmoid", "tanh", "contiguous")
+ADD_FUNCTIONS = (operator.add, operator.iadd, torch.add)
+
+
+class _ChannelGroups:
+    """Union-find over the channel spaces created by the producer layers."""
+
+    def __init__(self):
+        self.parent = {}
+        self.frozen = set()
+
+    def add(self, space):
+        self.parent[space] = space
+
+    def find(self, space):
+        while self.parent[space] != space:
+            self.parent[space] = self.parent[self.parent[space]]
+            space = self.parent[space]
+        return space
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[b] = a
+            if b in self.frozen:
+                self.frozen.add(a)
+
+    def freeze(self, space):
+        self.frozen.add(self.find(space))
+
+    def is_frozen(self, space):
+        return self.find(space) in self.frozen
+
+
+def _is_flatten(node):
+    # flattening (N, C, ...) into (N, C * ...)
+    if node.kwargs:
+        return False
+    if node.op == "call_function" and node.target is torch.flatten:
+        return node.args[1:] == (1,)
+    if node.op == "call_method" and node.target == "flatten":
+        return node.args[1:] == (1,)
+    if node.op == "call_method" and node.target in ("view", "reshape"):
+        if len(node.args) != 3:
+            return False
+        batch, features = node.args[1:]
+        if batch == -1:
+            # view(x, -1, C * H * W)
+            return isinstance(features, int) and features > 0
+        return isinstance(batch, (int, torch.fx.Node)) and features == -1
+    return False
+
+
+def _output_rank(node):
+    # the number of dimensions of the node output, if known from its metadata
+    meta = node.meta.get("mase", None)
+    if meta is None:
+        return None
+    result = meta.parameters["common"].get("results", {}).get("data_out_0", {})
+    shape = result.get("shape", None)
+    return None if shape is None else len(shape)
+
+
+def _flattens_channel_blocks(node, producer):
+    # whether flattening the output of node lays the channels out as blocks
+    if isinstance(producer, nn.Conv2d):
+        return True
+    return _output_rank(node) == 2
+
+
+def _trace_channels(graph):
+    """
+    Assign the channel space of every node output, union coupled spaces and record
+    the layers to resize. A space is named after the Conv2d/Linear node producing it.
+
+    :return: the channel groups, the producer nodes, the users of the spaces as
+        (kind, node, space) tuples and the (space, flattened) of each node
+    """
+    modules = graph.modules
+    groups = _ChannelGroups()
+    # node -> (space, flattened)
+    spaces = {}
+    producers = []
+    users = []
+    calls = {}
+    for node in graph.fx_graph.nodes:
+        if node.op == "call_module":
+            calls[node.target] = calls.get(node.target, 0) + 1
+
+    def freeze_inputs(node):
+        for arg in node.all_input_nodes:
+            if arg in spaces:
+                groups.freeze(spaces[arg][0])
+
+    for node in graph.fx_graph.nodes:
+        num_inputs = sum(arg in spaces for arg in node.all_input_nodes)
+        module = modules.get(node.target) if node.op == "call_module" else None
+        source = None
+        if node.args and isinstance(node.args[0], torch.fx.Node):
+            source = spaces.get(node.args[0], None)
+
+        if isinstance(module, (nn.Conv2d, nn.Linear)):
+            groups.add(node)
+            spaces[node] = (node, False)
+            producers.append(node)
+            shared = calls[node.target] > 1
+            grouped = isinstance(module, nn.Conv2d) and module.groups != 1
+            if shared or grouped:
+                groups.freeze(node)
+            if source is None or shared or num_inputs != 1:
+                freeze_inputs(node)
+                continue
+            in_space, flattened = source
+            in_module = modules[in_space.target]
+            if isinstance(module, nn.Linear) and flattened:
+                users.append(("flattened_input", node, in_space))
+            elif (
+                isinstance(module, nn.Conv2d) == isinstance(in_module, nn.Conv2d)
+                and not flattened
+                and not grouped
+            ):
+                users.append(("input", node, in_space))
+            else:
+                freeze_inputs(node)
+        elif isinstance(module, (nn.BatchNorm1d, nn.BatchNorm2d)):
+            if source is None or source[1] or calls[node.target] > 1:
+                freeze_inputs(node)
+            else:
+                users.append(("batchnorm", node, source[0]))
+                spaces[node] = source
+        elif (
+            isinstance(module, CHANNELWISE_MODULES)
+            or (node.op == "call_function" and node.target in CHANNELWISE_FUNCTIONS)
+            or (node.op == "call_method" and node.target in CHANNELWISE_METHODS)
+        ):
+            if source is not None and num_inputs == 1:
+                spaces[node] = source
+            else:
+                freeze_inputs(node)
+        elif node.op == "call_function" and node.target in ADD_FUNCTIONS:
+            sources = [
+                spaces.get(arg, None) if isinstance(arg, torch.fx.Node) else None
+                for arg in node.args
+            ]
+            if (
+                len(sources) == 2
+                and not node.kwargs
+                and all(s is not None and not s[1] for s in sources)
+            ):
+                groups.union(sources[0][0], sources[1][0])
+                spaces[node] = sources[0]
+            else:
+                freeze_inputs(node)
+        elif (
+            node.op == "call_method" and node.target == "size" and node.args[1:] == (0,)
+        ):
+            # the batch size, e.g. for x.view(x.size(0), -1)
+            pass
+        elif _is_flatten(node) and source is not None and not source[1]:
+            producer = modules[source[0].target]
+            if num_inputs == 1 and _flattens_channel_blocks(node.args[0], producer):
+                spaces[node] = (source[0], True)
+                users.append(("flatten", node, source[0]))
+            else:
+                freeze_inputs(node)
+        else:
+            # the model output and unsupported operators keep their channels
+            freeze_inputs(node)
+    return groups, producers, users, spaces
+
+
+def _arg(node, index, name, default):
+    if len(node.args) > index:
+        return node.args[index]
+    return node.kwargs.get(name, default)
+
+
+def _channelwise_constant(node, module, const):
+    """
+    The output of a channelwise layer for inputs constant over each channel, or None
+    if it is not constant over space.
+    """
+    if module is not None:
+        if isinstance(module, (nn.MaxPool2d, nn.AdaptiveAvgPool2d, nn.Identity)):
+            return const
+        if isinstance(module, nn.AvgPool2d):
+            padded = module.padding not in (0, (0, 0)) and module.count_include_pad
+            return None if padded or module.divisor_override else const
+        if isinstance(module, nn.Dropout):
+            return None if module.training else const
+        return module(const)
+    if node.op == "call_method":
+        return (
+            const if node.target == "contiguous" else getattr(torch, node.target)(const)
+        )
+    if node.target in (F.max_pool2d, F.adaptive_avg_pool2d):
+        return const
+    if node.target is F.avg_pool2d:
+        padded = _arg(node, 3, "padding", 0) not in (0, (0, 0)) and _arg(
+            node, 5, "count_include_pad", True
+        )
+        return None if padded or _arg(node, 6, "divisor_override", None) else const
+    if node.target is F.dropout:
+        return None if _arg(node, 2, "training", True) else const
+    return node.target(const, *node.args[1:], **node.kwargs)
+
+
+def _channel_constants(graph, spaces):
+    """
+    The output of each node of the channel spaces for channels whose weights are zero
+    in their producers, where every channel is constant. Returns node -> (const, inexact)
+    with inexact marking the channels that are not constant over space.
+    """
+    modules = graph.modules
+    constants = {}
+    for node in graph.fx_graph.nodes:
+        if node not in spaces:
+            continue
+        module = modules.get(node.target) if node.op == "call_module" else None
+        if spaces[node][0] is node:
+            num_channels = module.weight.shape[0]
+            if module.bias is None:
+                const = module.weight.new_zeros(num_channels)
+            else:
+                const = module.bias.detach().clone()
+            constants[node] = (const, torch.zeros(num_channels, dtype=torch.bool))
+            continue
+        inputs = [
+            constants[arg]
+            for arg in node.args
+            if isinstance(arg, torch.fx.Node) and arg in constants
+        ]
+        const = inputs[0][0]
+        inexact = inputs[0][1].clone()
+        if isinstance(module, (nn.BatchNorm1d, nn.BatchNorm2d)):
+            # a constant channel has zero batch variance
+            use_batch_stats = module.training or not module.track_running_stats
+            if use_batch_stats:
+                const = module.bias.detach().clone() if module.affine else const * 0
+            else:
+                const = F.batch_norm(
+                    const[None],
+                    module.running_mean,
+                    module.running_var,
+                    module.weight,
+                    module.bias,
+                    False,
+                    0.0,
+                    module.eps,
+                )[0].detach()
+        elif node.op == "call_function" and node.target in ADD_FUNCTIONS:
+            const = inputs[0][0] + inputs[1][0]
+            inexact |= inputs[1][1]
+        elif not _is_flatten(node):
+            output = _channelwise_constant(node, module, const.clone())
+            if output is None:
+                inexact |= const != 0
+            else:
+                const = output.detach()
+        constants[node] = (const, inexact)
+    return constants
+
+
+def _foldable_padding(module):
+    # whether a constant input stays constant after padding
+    if module.padding_mode != "zeros":
+        return True
+    if isinstance(module.padding, str):
+        return module.padding == "valid" or all(k == 1 for k in module.kernel_size)
+    return all(p == 0 for p in module.padding)
+
+
+def _kept_channels(modules, required):
+    kept = required.clone()
+    for module in modules:
+        # the masked weight when the module is pruned with a parametrization
+        weight = module.weight.detach()
+        kept |= weight.reshape(weight.shape[0], -1).ne(0).any(dim=1)
+    if not kept.any():
+        # keep the strongest channel so that the layers stay valid
+        norms = sum(
+            m.weight.detach().reshape(len(kept), -1).abs().sum(1) for m in modules
+        )
+        kept[norms.argmax()] = True
+    return kept
+
+
+def _replace_parameter(module, name, value):
+    old = getattr(module, name)
+    setattr(
+        module, name, nn.Parameter(value.contiguous(), requires_grad=old.requires_grad)
+    )
+
+
+def _bake_parametrizations(module):
+    # fold the pruning masks into the weights before slicing them
+    if parametrize.is_parametrized(module, "weight"):
+        parametrize.remove_parametrizations(module, "weight", leave_parametrized=True)
+
+
+def _shrink_outputs(module, keep):
+    _bake_parametrizations(module)
+    _replace_parameter(module, "weight", module.weight.data[keep])
+    if module.bias is not None:
+        _replace_parameter(module, "bias", module.bias.data[keep])
+    if isinstance(module, nn.Conv2d):
+        module.out_channels = len(keep)
+    else:
+        module.out_features = len(keep)
+
+
+def _fold_inputs(module, removed, const):
+    """
+    Add the contribution of the removed input channels/features, of constant value
+    const, to the bias of module.
+    """
+    _bake_parametrizations(module)
+    weight = module.weight.data[:, removed]
+    if isinstance(module, nn.Conv2d):
+        weight = weight.sum(dim=(2, 3))
+    folded = weight @ const.to(weight.dtype)
+    if module.bias is None:
+        module.bias = nn.Parameter(folded, requires_grad=module.weight.requires_grad)
+    else:
+        _replace_parameter(module, "bias", module.bias.data + folded)
+
+
+def _shrink_inputs(module, keep):
+    _bake_parametrizations(module)
+    _replace_parameter(module, "weight", module.weight.data[:, keep])
+    if isinstance(module, nn.Conv2d):
+        module.in_channels = len(keep)
+    else:
+        module.in_features = len(keep)
+
+
+def _shrink_batchnorm(module, keep):
+    if module.affine:
+        _replace_parameter(module, "weight", module.weight.data[keep])
+        _replace_parameter(module, "bias", module.bias.data[keep])
+    if module.track_running_stats:
+        module.running_mean = module.running_mean[keep].contiguous()
+        module.running_var = module.running_var[keep].contiguous()
+    module.num_features = len(keep)
+
+
+def shrink_graph_iterator(graph, pass_args: dict):
+    modules = graph.modules
+    groups, producers, users, spaces = _trace_channels(graph)
+    constants = _channel_constants(graph, spaces)
+
+    members = {}
+    for node in producers:
+        if not groups.is_frozen(node):
+            members.setdefault(groups.find(node), []).append(node)
+
+    # channels that cannot be folded into their consumers
+    required = {}
+    for kind, node, space in users:
+        if kind not in ("input", "flattened_input"):
+            continue
+        const, inexact = constants[node.args[0]]
+        module = modules[node.target]
+        if isinstance(module, nn.Conv2d) and not _foldable_padding(module):
+            inexact = inexact | (const != 0)
+        group = groups.find(space)
+        required[group] = required.get(group, inexact) | inexact
+
+    # producer node -> kept channels
+    keeps = {}
+    channels = {}
+    unfoldable = {}
+    for group, nodes in members.items():
+        layers = [modules[node.target] for node in nodes]
+        num_channels = layers[0].weight.shape[0]
+        group_required = required.get(
+            group, torch.zeros(num_channels, dtype=torch.bool)
+        )
+        keep = _kept_channels(layers, group_required).nonzero().flatten()
+        pruned = ~_kept_channels(layers, torch.zeros_like(group_required))
+        num_unfoldable = int((group_required & pruned).sum())
+        if num_unfoldable:
+            for node in nodes:
+                unfoldable[node.target] = num_unfoldable
+        if len(keep) == num_channels:
+            continue
+        for node, layer in zip(nodes, layers):
+            _shrink_outputs(layer, keep)
+            keeps[node] = keep
+            channels[node.target] = (num_channels, len(keep))
+
+    changed = list(keeps)
+    folded = {}
+    for kind, node, space in users:
+        if space not in keeps:
+            continue
+        keep = keeps[space]
+        num_channels = channels[space.target][0]
+        if kind in ("input", "flattened_input"):
+            removed = torch.ones(num_channels, dtype=torch.bool)
+            removed[keep] = False
+            removed = removed.nonzero().flatten()
+            const = constants[node.args[0]][0][removed]
+            if const.any():
+                folded[node.target] = int(const.ne(0).sum())
+        if kind == "batchnorm":
+            _shrink_batchnorm(modules[node.target], keep)
+        elif kind == "input":
+            module = modules[node.target]
+            if const.any():
+                _fold_inputs(module, removed, const)
+            _shrink_inputs(module, keep)
+        elif kind == "flattened_input":
+            # each channel is a block of consecutive features after flattening
+            module = modules[node.target]
+            block = module.in_features // num_channels
+            if const.any():
+                features = removed[:, None] * block + torch.arange(block)
+                _fold_inputs(module, features.flatten(), const.repeat_interleave(block))
+            features = keep[:, None] * block + torch.arange(block)
+            _shrink_inputs(module, features.flatten())
+        elif kind == "flatten" and node.target in ("view", "reshape"):
+            # view(x, -1, C * H * W): update the number of features
+            x, batch, features = node.args
+            if features != -1:
+                features = features // num_channels * len(keep)
+                node.args = (x, batch, features)
+        changed.append(node)
+
+    if changed:
+        graph.model.recompile()
+        graph.mark_dirty(changed)
+    for name, (before, after) in channels.items():
+        logger.debug(f"{name}: {before} -> {after} channels")
+    for name, count in folded.items():
+        logger.debug(f"{name}: constant of {count} removed inputs folded into the bias")
+    for name, count in unfoldable.items():
+        logger.info(
+            f"{name}: {count} pruned channels kept, their constant output cannot be "
+            "folded into the next layer"
+        )
+    return graph, channels, folded, unfoldable
+
+
+def prune_shrink_transform_pass(graph, pass_args: dict = {}):
+    """
+    Remove the pruned channels of Conv2d and Linear layers, so that the pruned model is
+    genuinely smaller and faster.
+
+    A channel is pruned when its weights are zero (after applying the pruning mask)
+    in every layer whose output is added to it. Its constant output, from the biases
+    and BatchNorm layers on the way, is folded into the biases of the next layers, so
+    the shrunk model computes the same function; channels whose output cannot be
+    folded are kept. The pruning parametrizations of the resized layers are folded
+    into their weights.
+
+    :param graph: The input graph to be shrunk.
+    :type graph: MaseGraph
+
+    :param pass_args: Optional arguments, unused.
+    :type pass_args: dict
+
+    :return: The shrunk graph and a dictionary with the number of output channels
+        (before, after) of the resized layers, the number of removed inputs folded into
+        the bias of each layer, and the number of pruned channels kept in each layer
+        because their output cannot be folded.
+    :rtype: tuple
+    """
+    graph, channels, folded, unfoldable = shrink_graph_iterator(graph, pass_args)
+    return graph, {"channels": channels, "folded": folded, "unfoldable": unfoldable}
@@ -0,0 +1,125 @@
+# A pass to run pruned layers with sparse kernels on CPU
+# --------------------------------------------------------------------------------------
+# Elementwise pruning leaves the weights dense in memory, so a pruned model is exactly
+# as slow as the original one. This pass replaces the Conv2d and Linear layers whose
+# weights are sparse enough by modules multiplying a CSR copy of the weights.
+#
+# Sparse kernels only win well below 100% density: a CSR matrix multiplication costs
+# about 1 / SPARSE_EFFICIENCY times more per kept weight than a dense one, and a
+# convolution also pays for lowering its input with im2col, a cost amortised over its
+# output channels. A layer is converted when the predicted speedup
+#
+#   1 / (density / sparse_efficiency + im2col_cost / out_channels)
+#
+# reaches min_speedup. The defaults were measured on a single CPU thread, see
+# scripts/bench-sparse-inference.py to calibrate them for another machine.
+
+import logging
+
+import torch.nn as nn
+
+from ...utils import get_parent_name
+from .sparse_modules import SparseConv2d, SparseLinear
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    # throughput of the sparse kernels relative to the dense ones, per weight
+    "sparse_efficiency": 0.175,
+    # cost of im2col relative to a dense convolution with one output channel
+    "im2col_cost": 100.0,
+    # layers predicted to run less than this many times faster stay dense
+    "min_speedup": 1.2,
+    # smaller layers are not worth the overhead of the sparse kernels
+    "min_weight_size": 2**14,
+}
+
+
+def _sparse_module_cls(module):
+    if isinstance(module, nn.Linear):
+        return SparseLinear
+    if (
+        isinstance(module, nn.Conv2d)
+        and module.groups == 1
+        and module.padding_mode == "zeros"
+        and not isinstance(module.padding, str)
+    ):
+        return SparseConv2d
+    return None
+
+
+def predicted_speedup(module, density: float, config: dict) -> float:
+    """The speedup of the sparse module over the dense one predicted by the cost
+    model above."""
+    cost = density / config["sparse_efficiency"]
+    if isinstance(module, nn.Conv2d):
+        cost += config["im2col_cost"] / module.out_channels
+    return 1.0 / cost if cost > 0 else float("inf")
+
+
+def sparse_inference_graph_iterator(graph, config: dict):
+    modules = graph.modules
+    changed = []
+    layers = {}
+    for node in graph.fx_graph.nodes:
+        if node.op != "call_module":
+            continue
+        module = modules[node.target]
+        cls = _sparse_module_cls(module)
+        if cls is None:
+            continue
+        # the masked weight when the module is pruned with a parametrization
+        weight = module.weight.detach()
+        density = weight.count_nonzero().item() / weight.numel()
+        speedup = predicted_speedup(module, density, config)
+        sparse = (
+            weight.numel() >= config["min_weight_size"]
+            and speedup >= config["min_speedup"]
+        )
+        layers[node.target] = {
+            "density": density,
+            "predicted_speedup": speedup,
+            "sparse": sparse,
+        }
+        logger.debug(
+            f"{node.target}: density {density:.3f}, predicted speedup {speedup:.2f}, "
+            + ("sparse" if sparse else "dense")
+        )
+        if not sparse:
+            continue
+        parent_name, name = get_parent_name(node.target)
+        setattr(modules[parent_name], name, cls.from_dense(module))
+        changed.append(node)
+
+    if changed:
+        graph.mark_dirty(changed)
+    return graph, layers
+
+
+def sparse_inference_transform_pass(graph, pass_args: dict = {}):
+    """
+    Replace the sparse enough Conv2d and Linear layers of a pruned graph by modules
+    computing with CSR weights, for faster inference on CPU.
+
+    The layers to convert are chosen with a cost model of the sparse kernels (see
+    DEFAULT_CONFIG), whose parameters can be overridden in pass_args. The sparse
+    modules are inference only: their weights are frozen buffers.
+
+    :param graph: The input graph, usually pruned.
+    :type graph: MaseGraph
+
+    :param pass_args: Optional overrides of DEFAULT_CONFIG, e.g.
+        {"min_speedup": 1.5, "sparse_efficiency": 0.2}.
+    :type pass_args: dict
+
+    :return: The transformed graph and a dictionary mapping the candidate layers to
+        their density, predicted speedup and whether they were made sparse.
+    :rtype: tuple
+    """
+    pass_args = {} if pass_args is None else pass_args
+    unknown = set(pass_args) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown sparse inference options: {sorted(unknown)}")
+    config = DEFAULT_CONFIG | pass_args
+    graph, layers = sparse_inference_graph_iterator(graph, config)
+    return graph, {"layers": layers}
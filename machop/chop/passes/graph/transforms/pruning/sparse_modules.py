@@ -0,0 +1,143 @@
+# Sparse execution modules for pruned layers
+# --------------------------------------------------------------------------------------
+# The pruned weight is stored once in CSR format and multiplied with the input, lowered
+# with im2col for convolutions, by a sparse-dense matrix multiplication whose cost is
+# proportional to the number of kept weights. These modules are for inference: the
+# weights are buffers and receive no gradient.
+
+import warnings
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+
+def _to_csr(weight: torch.Tensor) -> torch.Tensor:
+    with warnings.catch_warnings():
+        # CSR tensors are flagged as beta by PyTorch
+        warnings.simplefilter("ignore", UserWarning)
+        return weight.detach().to_sparse_csr()
+
+
+class SparseLinear(nn.Module):
+    """A Linear layer computing with a CSR copy of its (pruned) weight."""
+
+    def __init__(self, in_features: int, out_features: int, weight, bias=None):
+        super().__init__()
+        self.in_features = in_features
+        self.out_features = out_features
+        self.register_buffer("weight", _to_csr(weight.reshape(out_features, -1)))
+        self.register_buffer("bias", None if bias is None else bias.detach().clone())
+
+    @classmethod
+    def from_dense(cls, module: nn.Linear):
+        return cls(module.in_features, module.out_features, module.weight, module.bias)
+
+    @property
+    def density(self) -> float:
+        return self.weight.values().numel() / (self.out_features * self.in_features)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        shape = x.shape
+        # W @ x^T, then back to (..., out_features)
+        y = torch.sparse.mm(self.weight, x.reshape(-1, self.in_features).t()).t()
+        if self.bias is not None:
+            y = y + self.bias
+        return y.reshape(*shape[:-1], self.out_features)
+
+    def extra_repr(self) -> str:
+        return (
+            f"in_features={self.in_features}, out_features={self.out_features}, "
+            f"bias={self.bias is not None}, density={self.density:.3f}"
+        )
+
+
+class SparseConv2d(nn.Module):
+    """A Conv2d layer computing with im2col and a CSR copy of its (pruned) weight."""
+
+    def __init__(
+        self,
+        in_channels: int,
+        out_channels: int,
+        kernel_size,
+        weight,
+        bias=None,
+        stride=1,
+        padding=0,
+        dilation=1,
+    ):
+        super().__init__()
+        self.in_channels = in_channels
+        self.out_channels = out_channels
+        self.kernel_size = nn.modules.utils._pair(kernel_size)
+        self.stride = nn.modules.utils._pair(stride)
+        self.padding = nn.modules.utils._pair(padding)
+        self.dilation = nn.modules.utils._pair(dilation)
+        # (C_out, C_in * kH * kW), the column order of unfold
+        self.register_buffer("weight", _to_csr(weight.reshape(out_channels, -1)))
+        self.register_buffer("bias", None if bias is None else bias.detach().clone())
+
+    @classmethod
+    def from_dense(cls, module: nn.Conv2d):
+        if module.groups != 1 or module.padding_mode != "zeros":
+            raise ValueError(
+                "SparseConv2d only supports zero-padded convolutions without groups"
+            )
+        if isinstance(module.padding, str):
+            raise ValueError("SparseConv2d does not support string padding")
+        return cls(
+            module.in_channels,
+            module.out_channels,
+            module.kernel_size,
+            module.weight,
+            module.bias,
+            module.stride,
+            module.padding,
+            module.dilation,
+        )
+
+    @property
+    def density(self) -> float:
+        return self.weight.values().numel() / self.weight.shape.numel()
+
+    def _im2col(self, x):
+        # (N, C_in * kH * kW, H_out * W_out) from a strided view of the padded input,
+        # faster than F.unfold on CPU
+        x = F.pad(
+            x, (self.padding[1], self.padding[1], self.padding[0], self.padding[0])
+        )
+        batch_size, channels, height, width = x.shape
+        out_height = (
+            height - self.dilation[0] * (self.kernel_size[0] - 1) - 1
+        ) // self.stride[0] + 1
+        out_width = (
+            width - self.dilation[1] * (self.kernel_size[1] - 1) - 1
+        ) // self.stride[1] + 1
+        s_n, s_c, s_h, s_w = x.stride()
+        columns = x.as_strided(
+            (batch_size, channels, *self.kernel_size, out_height, out_width),
+            (
+                s_n,
+                s_c,
+                s_h * self.dilation[0],
+                s_w * self.dilation[1],
+                s_h * self.stride[0],
+                s_w * self.stride[1],
+            ),
+        )
+        columns = columns.reshape(batch_size, -1, out_height * out_width)
+        return columns, out_height, out_width
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        columns, out_height, out_width = self._im2col(x)
+        y = torch.stack([torch.sparse.mm(self.weight, c) for c in columns])
+        if self.bias is not None:
+            y = y + self.bias[:, None]
+        return y.reshape(len(columns), self.out_channels, out_height, out_width)
+
+    def extra_repr(self) -> str:
+        return (
+            f"{self.in_channels}, {self.out_channels}, kernel_size={self.kernel_size}, "
+            f"stride={self.stride}, padding={self.padding}, dilation={self.dilation}, "
+            f"bias={self.bias is not None}, density={self.density:.3f}"
+        )
@@ -1,8 +1,94 @@
 import torch
 
+from .nm_sparse import NMSparseTensor
+from .packed_mask import PackedMask, pack_mask
+
+
+class _MaskedWeight(torch.nn.Module):
+    r"""Base of the masking parametrizations.
+
+    In eval mode, when no gradient is needed, the masked weight is computed once and
+    reused until the weight or the mask is replaced, converted (module.to, .double,
+    ...) or updated in place (their version counters change). In training mode the mask is multiplied into the
+    weight at every call, converted once to the dtype of the weight.
+
+    The mask is saved bit-packed in state dicts, as "mask_packed", and unpacked when
+    loaded. A PackedMask or a bool tensor can also be given for "mask" when loading.
+
+    Subclasses register the "mask" buffer and define _mask_like(x), the mask
+    broadcastable to the weight x.
+    """
+
+    def __init__(self):
+        super().__init__()
+        # (weight, mask, key, masked weight, its version), where the key holds the
+        # versions of the weight and the mask and the dtype, device and storage of the
+        # weight, which module conversions replace without bumping its version
+        self._masked_cache = None
+        # (mask, mask version, dtype, device, mask in the dtype of the weight)
+        self._multiplier_cache = None
+
+    def _multiplier(self, x):
+        mask = self._mask_like(x)
+        key = (self.mask._version, x.dtype, x.device)
+        cache = self._multiplier_cache
+        if cache is None or cache[0] is not self.mask or cache[1:4] != key:
+            cache = (self.mask,) + key + (mask.to(dtype=x.dtype, device=x.device),)
+            self._multiplier_cache = cache
+        return cache[4]
+
+    def forward(self, x):
+        if self.training or (torch.is_grad_enabled() and x.requires_grad):
+            return self._multiplier(x) * x
+        cache = self._masked_cache
+        key = (x._version, x.dtype, x.device, x.data_ptr(), self.mask._version)
+        if (
+            cache is None
+            or cache[0] is not x
+            or cache[1] is not self.mask
+            or cache[2] != key
+            or cache[4] != cache[3]._version
+        ):
+            # _mask_like may replace the mask with a view expanded to the weight
+            masked = self._mask_like(x) * x
+            cache = (x, self.mask, key, masked, masked._version)
+            self._masked_cache = cache
+        return cache[3]
+
+    def train(self, mode: bool = True):
+        # keep only the cache used in the new mode
+        if mode:
+            self._masked_cache = None
+        else:
+            self._multiplier_cache = None
+        return super().train(mode)
+
+    def _source_mask(self):
+        # the mask may have been expanded to the shape of the weight
+        mask = self.mask
+        if mask._base is not None and 0 in mask.stride():
+            mask = mask._base
+        return mask
+
+    def _save_to_state_dict(self, destination, prefix, keep_vars):
+        # only the bit-packed mask, the weight is saved by the parametrized module
+        destination[prefix + "mask_packed"] = pack_mask(self._source_mask())
+
+    def _load_from_state_dict(self, state_dict, prefix, *args, **kwargs):
+        key = prefix + "mask"
+        # load into the mask buffer rather than into its expanded view
+        self._buffers["mask"] = self._source_mask()
+        packed = state_dict.pop(prefix + "mask_packed", None)
+        if packed is not None and key not in state_dict:
+            state_dict[key] = PackedMask(packed, self.mask.shape)
+        if isinstance(state_dict.get(key, None), PackedMask):
+            # unpacked when the module is loaded
+            state_dict[key] = state_dict[key].unpack()
+        super()._load_from_state_dict(state_dict, prefix, *args, **kwargs)
+
 
 # Parametrizations
-class FakeSparseWeight(torch.nn.Module):
+class FakeSparseWeight(_MaskedWeight):
     r"""Parametrization for the weights. Should be attached to the 'weight' orr
     any other parameter that requires a mask applied to it.
 
@@ -17,31 +103,34 @@ class FakeSparseWeight(torch.nn.Module):
         super().__init__()
         self.register_buffer("mask", mask)
 
-    def forward(self, x):
-        try:
-            self.mask = self.mask.expand(x.shape)
-        except:
-            if len(self.mask.shape) == 2:
-                self.mask = self.mask.view(
-                    self.mask.shape[0], self.mask.shape[1], 1, 1
-                ).expand(-1, -1, 3, 3)
-            if len(self.mask.shape) == 1:
-                self.mask = self.mask.view(self.mask.shape[0], 1, 1, 1).expand(
-                    -1, x.shape[1], 3, 3
-                )
+    def _mask_like(self, x):
+        if self.mask.shape != x.shape:
+            try:
+                self.mask = self.mask.expand(x.shape)
+            except RuntimeError:
+                # channel (1D) or kernel (2D) masks cover the remaining dimensions
+                shape = tuple(self.mask.shape) + (1,) * (x.dim() - self.mask.dim())
+                self.mask = self.mask.view(shape).expand(x.shape)
         assert self.mask.shape == x.shape
-        return self.mask * x
+        return self.mask
 
-    def state_dict(self, *args, **kwargs):
-        # This is a hack
-        # We don't want to let the parametrizations to save the mask.
-        # That way we make sure that the linear module doesn't store the masks
-        # alongside their parametrizations.
-        return {}
+
+class FakeNMSparseWeight(FakeSparseWeight):
+    r"""Parametrization for N:M sparse weights: at most n of every m consecutive
+    weights along the input dimension are kept by the mask.
+    """
+
+    def __init__(self, mask, m: int):
+        super().__init__(mask)
+        self.m = m
+
+    def compress(self, x) -> NMSparseTensor:
+        """The masked weight in the compact N:M format."""
+        return NMSparseTensor.from_dense(x, self.m, self._mask_like(x))
 
 
 # Structured Pruning Parameterizations
-class FakeStructuredSparseWeight(torch.nn.Module):
+class FakeStructuredSparseWeight(_MaskedWeight):
     r"""
     Parametrization for Structured Pruning. Like FakeSparsity, this should be attached to
     the  'weight' or any other parameter that requires a mask.
@@ -53,13 +142,9 @@ class FakeStructuredSparseWeight(torch.nn.Module):
         super().__init__()
         self.register_buffer("mask", mask)
 
-    def forward(self, x):
+    def _mask_like(self, x):
         assert isinstance(self.mask, torch.Tensor)
         assert self.mask.shape[0] == x.shape[0]
         shape = [1] * len(x.shape)
         shape[0] = -1
-        return self.mask.reshape(shape) * x
-
-    def state_dict(self, *args, **kwargs):
-        # avoid double saving masks
-        return {}
+        return self.mask.reshape(shape)
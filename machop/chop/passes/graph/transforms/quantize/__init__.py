@@ -1,4 +1,10 @@
 from .quantize import QUANTIZEABLE_OP, quantize_transform_pass
+from .integer_backend import integer_backend_transform_pass
+from .pack import (
+    load_packed_model,
+    pack_quantized_transform_pass,
+    save_packed_model,
+)
 from .quantized_funcs import quantized_func_map
 from .quantized_modules import quantized_module_map
 from .summary import summarize_quantization_analysis_pass
@@ -0,0 +1,276 @@
+# Integer arithmetic execution of integer quantized layers and functions
+# --------------------------------------------------------------------------------------
+# Integer quantization is simulated in floating point: inputs and weights are rounded
+# to fixed-point values, which are multiplied and accumulated in float. Here the
+# fixed-point values are kept as their integer codes,
+#
+#   x = x_code * 2**-frac_width,
+#
+# multiplied in int8 with int32 accumulation (int64 for codes wider than 8 bits), and
+# the accumulator is rescaled once: the bias is aligned to the fractional width of the
+# accumulator by a shift, and the sum is converted to float and multiplied by a power
+# of two, which is exact.
+#
+# The result is the exact value of the fixed-point computation. Float accumulation
+# computes it exactly too, in any order, while every partial sum fits the 24-bit
+# significand of fp32: the integer path then matches the fake quantization bit for
+# bit. exact_accumulation gives that bound for a layer, beyond it the fake-quantized
+# and integer results may differ in the last bits.
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from .quantized_funcs import add_integer, bmm_integer, matmul_integer, mult_integer
+
+# significand bits of fp32, with the implicit bit
+FP32_SIGNIFICAND = 24
+
+
+def integer_codes(x: torch.Tensor, width: int, frac_width: int) -> torch.Tensor:
+    """
+    The signed fixed-point codes of x, rounded and clamped as integer_quantizer does
+    (in place, without its straight-through gradient), as int8 up to 8 bits and int64
+    otherwise.
+    """
+    bound = 2 ** (width - 1)
+    codes = x.mul(2**frac_width).round_().clamp_(-bound, bound - 1)
+    return codes.to(torch.int8 if width <= 8 else torch.int64)
+
+
+def integer_matmul(a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+    """
+    a @ b for integer codes, with torch.matmul broadcasting: int8 codes are multiplied
+    with int32 accumulation, wider codes in int64.
+    """
+    # torch._int_mm misreads a right operand with a single row, whose strides are
+    # degenerate (1, 1)
+    if a.dtype != torch.int8 or b.dtype != torch.int8 or a.shape[-1] == 1:
+        return torch.matmul(a.long(), b.long())
+    # a vector operand is a matrix with a dim of 1, squeezed out of the result
+    if b.dim() == 1:
+        return integer_matmul(a, b.unsqueeze(-1)).squeeze(-1)
+    if a.dim() == 1:
+        return integer_matmul(a.unsqueeze(0), b).squeeze(-2)
+    if b.dim() == 2:
+        out = torch._int_mm(a.reshape(-1, a.shape[-1]).contiguous(), b)
+        return out.view(*a.shape[:-1], b.shape[-1])
+    batch = torch.broadcast_shapes(a.shape[:-2], b.shape[:-2])
+    a = a.expand(*batch, *a.shape[-2:]).reshape(-1, *a.shape[-2:])
+    b = b.expand(*batch, *b.shape[-2:]).reshape(-1, *b.shape[-2:])
+    out = torch.stack([torch._int_mm(a_i.contiguous(), b_i) for a_i, b_i in zip(a, b)])
+    return out.view(*batch, *out.shape[-2:])
+
+
+def exact_accumulation(
+    fan_in: int, x_width: int, w_width: int, b_width: int = None, b_shift: int = 0
+) -> bool:
+    """
+    Whether the fp32 accumulation of fan_in products of x_width and w_width-bit codes,
+    plus a b_width-bit bias code shifted left by b_shift bits, is exact: the largest
+    possible partial sum is below 2**24.
+    """
+    bound = fan_in * 2 ** (x_width - 1) * 2 ** (w_width - 1)
+    if b_width is not None:
+        bound += 2 ** (b_width - 1 + b_shift)
+    return bound < 2**FP32_SIGNIFICAND
+
+
+class _IntegerArithBase(nn.Module):
+    """
+    The integer codes of the weight and bias of an integer quantized layer, and the
+    fixed-point format of the accumulator: products have x_frac_width + w_frac_width
+    fractional bits, and the bias is shifted left to the same fractional width, or the
+    products to that of the bias if it has more.
+    """
+
+    def __init__(self, module: nn.Module):
+        super().__init__()
+        config = module.config
+        self.x_width = config["data_in_width"]
+        self.x_frac_width = config["data_in_frac_width"]
+        self.w_width = config["weight_width"]
+        w_frac_width = config["weight_frac_width"]
+        weight = module.weight.detach()
+        # (out_features, fan_in)
+        self.register_buffer(
+            "weight_codes",
+            integer_codes(weight, self.w_width, w_frac_width).reshape(
+                weight.shape[0], -1
+            ),
+        )
+        frac_width = self.x_frac_width + w_frac_width
+        self.b_width = None
+        self.bias_shift = 0
+        self.acc_shift = 0
+        self.register_buffer("bias_codes", None)
+        if module.bias is not None:
+            self.b_width = config["bias_width"]
+            b_frac_width = config["bias_frac_width"]
+            codes = integer_codes(module.bias.detach(), self.b_width, b_frac_width)
+            self.bias_shift = max(frac_width - b_frac_width, 0)
+            self.acc_shift = max(b_frac_width - frac_width, 0)
+            frac_width = max(frac_width, b_frac_width)
+            self.bias_codes = codes.long() << self.bias_shift
+        self.frac_width = frac_width
+
+    @property
+    def exact(self) -> bool:
+        """Whether the layer matches the fake-quantized one bit for bit."""
+        return exact_accumulation(
+            self.weight_codes.shape[1] << self.acc_shift,
+            self.x_width,
+            self.w_width,
+            self.b_width,
+            self.bias_shift,
+        )
+
+    def _rescale(self, acc: torch.Tensor, dtype) -> torch.Tensor:
+        if self.acc_shift:
+            acc = acc.long() << self.acc_shift
+        if self.bias_codes is not None:
+            acc = acc + self.bias_codes
+        return acc.to(dtype) * 2.0**-self.frac_width
+
+
+class LinearIntegerArith(_IntegerArithBase):
+    """A LinearInteger layer computed with integer arithmetic, for inference."""
+
+    def __init__(self, module: nn.Linear):
+        super().__init__(module)
+        self.in_features = module.in_features
+        self.out_features = module.out_features
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x_codes = integer_codes(x, self.x_width, self.x_frac_width)
+        acc = integer_matmul(x_codes, self.weight_codes.t())
+        return self._rescale(acc, x.dtype)
+
+    def extra_repr(self) -> str:
+        return (
+            f"in_features={self.in_features}, out_features={self.out_features}, "
+            f"bias={self.bias_codes is not None}, frac_width={self.frac_width}"
+        )
+
+
+class Conv2dIntegerArith(_IntegerArithBase):
+    """
+    A Conv2dInteger layer computed with integer arithmetic, for inference. The input
+    codes are lowered with im2col in channels-last order, copying one slice of the
+    padded input per kernel position.
+    """
+
+    def __init__(self, module: nn.Conv2d):
+        super().__init__(module)
+        self.out_channels = module.out_channels
+        self.kernel_size = module.kernel_size
+        self.stride = module.stride
+        self.padding = module.padding
+        self.dilation = module.dilation
+        # (out_channels, kernel height, kernel width, in_channels), as the columns
+        self.weight_codes = (
+            self.weight_codes.view(module.weight.shape)
+            .permute(0, 2, 3, 1)
+            .reshape(self.out_channels, -1)
+        )
+
+    def _im2col(self, x_codes: torch.Tensor):
+        (ph, pw), (dh, dw), (sh, sw) = self.padding, self.dilation, self.stride
+        kh, kw = self.kernel_size
+        x_codes = F.pad(x_codes, (0, 0, pw, pw, ph, ph))
+        height = (x_codes.shape[1] - dh * (kh - 1) - 1) // sh + 1
+        width = (x_codes.shape[2] - dw * (kw - 1) - 1) // sw + 1
+        columns = torch.cat(
+            [
+                x_codes[
+                    :,
+                    i * dh : i * dh + (height - 1) * sh + 1 : sh,
+                    j * dw : j * dw + (width - 1) * sw + 1 : sw,
+                ]
+                for i in range(kh)
+                for j in range(kw)
+            ],
+            dim=-1,
+        )
+        return columns.view(-1, columns.shape[-1]), height, width
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x_codes = integer_codes(x.permute(0, 2, 3, 1), self.x_width, self.x_frac_width)
+        columns, height, width = self._im2col(x_codes)
+        acc = integer_matmul(columns, self.weight_codes.t())
+        out = self._rescale(acc, x.dtype).view(x.shape[0], height, width, -1)
+        return out.permute(0, 3, 1, 2).contiguous()
+
+    def extra_repr(self) -> str:
+        return (
+            f"{self.weight_codes.shape[1]}, {self.out_channels}, "
+            f"kernel_size={self.kernel_size}, stride={self.stride}, "
+            f"padding={self.padding}, dilation={self.dilation}, "
+            f"frac_width={self.frac_width}"
+        )
+
+
+def _integer_args(x, y, config):
+    return (
+        isinstance(x, torch.Tensor)
+        and isinstance(y, torch.Tensor)
+        and not config.get("bypass", False)
+    )
+
+
+def generic_matmul_integer_arith(x, y, config, style="matmul"):
+    fake_quantized = matmul_integer if style == "matmul" else bmm_integer
+    if not _integer_args(x, y, config):
+        return fake_quantized(x, y, config)
+    x_width, x_frac_width = config["data_in_width"], config["data_in_frac_width"]
+    y_width, y_frac_width = config["weight_width"], config["weight_frac_width"]
+    if not exact_accumulation(x.shape[-1], x_width, y_width):
+        return fake_quantized(x, y, config)
+    acc = integer_matmul(
+        integer_codes(x, x_width, x_frac_width),
+        integer_codes(y, y_width, y_frac_width),
+    )
+    return acc.to(x.dtype) * 2.0 ** -(x_frac_width + y_frac_width)
+
+
+def matmul_integer_arith(x, y, config):
+    return generic_matmul_integer_arith(x, y, config, "matmul")
+
+
+def bmm_integer_arith(x, y, config):
+    return generic_matmul_integer_arith(x, y, config, "bmm")
+
+
+def add_integer_arith(x, y, config):
+    if not _integer_args(x, y, config):
+        return add_integer(x, y, config)
+    width, frac_width = config["data_in_width"], config["data_in_frac_width"]
+    if width + 1 > FP32_SIGNIFICAND:
+        return add_integer(x, y, config)
+    acc = (
+        integer_codes(x, width, frac_width).int()
+        + integer_codes(y, width, frac_width).int()
+    )
+    return acc.to(x.dtype) * 2.0**-frac_width
+
+
+def mult_integer_arith(x, y, config):
+    if not _integer_args(x, y, config):
+        return mult_integer(x, y, config)
+    width, frac_width = config["data_in_width"], config["data_in_frac_width"]
+    if 2 * (width - 1) >= FP32_SIGNIFICAND:
+        return mult_integer(x, y, config)
+    acc = (
+        integer_codes(x, width, frac_width).int()
+        * integer_codes(y, width, frac_width).int()
+    )
+    return acc.to(x.dtype) * 2.0 ** -(2 * frac_width)
+
+
+# the integer arithmetic version of each fake-quantized integer function
+INTEGER_ARITH_FUNCS = {
+    matmul_integer: matmul_integer_arith,
+    bmm_integer: bmm_integer_arith,
+    add_integer: add_integer_arith,
+    mult_integer: mult_integer_arith,
+}
@@ -0,0 +1,121 @@
+# A pass to run integer quantized graphs with integer arithmetic on CPU
+# --------------------------------------------------------------------------------------
+# Replaces the LinearInteger and Conv2dInteger layers of a quantized graph by modules
+# computing with int8 codes and int32 accumulators (see integer_arith.py), and the
+# integer matmul, bmm, add and mul functions by their integer arithmetic versions.
+#
+# The integer backend matches the fake quantization bit for bit: layers whose fp32
+# accumulation may round are left fake-quantized, and so are function calls, checked
+# on their actual inputs. Only layers with inputs and weights of at most 8 bits are
+# converted, and convolutions with zero padding and a single group.
+
+import logging
+
+import torch.nn as nn
+
+from ...utils import get_parent_name
+from .integer_arith import (
+    INTEGER_ARITH_FUNCS,
+    Conv2dIntegerArith,
+    LinearIntegerArith,
+)
+from .quantized_modules import Conv2dInteger, LinearInteger
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    # convert the integer matmul, bmm, add and mul function calls
+    "functions": True,
+}
+
+
+def _integer_arith_cls(module: nn.Module):
+    """The integer arithmetic class of a module and the reason if there is none."""
+    if type(module) not in (LinearInteger, Conv2dInteger):
+        return None, "not integer quantized"
+    if module.bypass:
+        return None, "bypass"
+    config = module.config
+    if config["data_in_width"] > 8 or config["weight_width"] > 8:
+        return None, "wider than 8 bits"
+    if isinstance(module, LinearInteger):
+        return LinearIntegerArith, None
+    if (
+        module.groups != 1
+        or module.padding_mode != "zeros"
+        or isinstance(module.padding, str)
+    ):
+        return None, "unsupported convolution"
+    return Conv2dIntegerArith, None
+
+
+def integer_backend_graph_iterator(graph, config: dict):
+    modules = graph.modules
+    changed = []
+    layers = {}
+    functions = {}
+    recompile = False
+    for node in graph.fx_graph.nodes:
+        if node.op == "call_function" and node.target in INTEGER_ARITH_FUNCS:
+            if config["functions"]:
+                node.target = INTEGER_ARITH_FUNCS[node.target]
+                changed.append(node)
+                recompile = True
+            functions[node.name] = {"integer": config["functions"]}
+            continue
+        if node.op != "call_module":
+            continue
+        module = modules[node.target]
+        cls, reason = _integer_arith_cls(module)
+        if cls is None:
+            if reason != "not integer quantized":
+                layers[node.target] = {"integer": False, "reason": reason}
+            continue
+        new_module = cls(module)
+        if not new_module.exact:
+            reason = "fp32 accumulation not exact"
+            layers[node.target] = {"integer": False, "reason": reason}
+            logger.debug(f"{node.target}: fake-quantized, {reason}")
+            continue
+        layers[node.target] = {"integer": True, "reason": None}
+        logger.debug(f"{node.target}: integer arithmetic")
+        parent_name, name = get_parent_name(node.target)
+        setattr(modules[parent_name], name, new_module)
+        changed.append(node)
+
+    if recompile:
+        graph.model.recompile()
+    if changed:
+        graph.mark_dirty(changed)
+    return graph, layers, functions
+
+
+def integer_backend_transform_pass(graph, pass_args: dict = {}):
+    """
+    Run the LinearInteger and Conv2dInteger layers and the integer matmul, bmm, add
+    and mul functions of a quantized graph with integer arithmetic, matching the fake
+    quantization bit for bit. The converted layers are for inference.
+
+    :param graph: The input graph, quantized with integer arithmetic.
+    :type graph: MaseGraph
+
+    :param pass_args: Optional overrides of DEFAULT_CONFIG, e.g. {"functions": False}
+        to only convert the layers.
+    :type pass_args: dict
+
+    :return: The transformed graph and a dictionary with, for each integer layer and
+        function call, whether it runs with integer arithmetic and else why not.
+    :rtype: tuple
+    """
+    pass_args = {} if pass_args is None else pass_args
+    unknown = set(pass_args) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown integer backend options: {sorted(unknown)}")
+    config = DEFAULT_CONFIG | pass_args
+    graph, layers, functions = integer_backend_graph_iterator(graph, config)
+    converted = sum(layer["integer"] for layer in layers.values())
+    logger.info(
+        f"Integer arithmetic for {converted} of {len(layers)} integer layers and "
+        f"{len(functions) if config['functions'] else 0} function calls"
+    )
+    return graph, {"layers": layers, "functions": functions}
@@ -0,0 +1,135 @@
+# A pass to deploy quantized layers with packed low-bit weights
+# --------------------------------------------------------------------------------------
+# Replaces the integer, binary and ternary Linear, Conv1d and Conv2d layers of a
+# quantized graph by modules storing their weights packed (see packed_modules.py):
+# int8 is 4x smaller than fp32, int4 8x, ternary 16x and binary 32x. The packed model
+# can be saved with save_packed_model and rebuilt from the file with load_packed_model,
+# without the full-precision weights.
+
+import logging
+
+import torch
+import torch.nn as nn
+
+from ...utils import get_module_by_name, get_parent_name
+from .packed_modules import (
+    PACKABLE_MODULES,
+    PACKED_MODULES,
+    _PackedBase,
+    packed_module_cls,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONFIG = {
+    # file to save the packed model to, not saved if None
+    "save_path": None,
+}
+
+
+def pack_quantized_graph_iterator(graph, config: dict):
+    modules = graph.modules
+    changed = []
+    layers = {}
+    for node in graph.fx_graph.nodes:
+        if node.op != "call_module":
+            continue
+        module = modules[node.target]
+        cls = packed_module_cls(module)
+        if cls is None:
+            continue
+        packed = cls.from_quantized(module)
+        dense = module.weight.numel() * module.weight.element_size()
+        if module.bias is not None:
+            dense += module.bias.numel() * module.bias.element_size()
+        layers[node.target] = {
+            "format": packed.spec["format"],
+            "scale": "tensor" if packed.spec["scale_size"] == 1 else "channel",
+            "dense": dense,
+            "packed": packed.nbytes,
+            "ratio": dense / packed.nbytes,
+        }
+        logger.debug(
+            f"{node.target}: {packed.spec['format']}, {dense} -> {packed.nbytes} "
+            f"bytes ({dense / packed.nbytes:.2f}x)"
+        )
+        parent_name, name = get_parent_name(node.target)
+        setattr(modules[parent_name], name, packed)
+        changed.append(node)
+
+    if changed:
+        graph.mark_dirty(changed)
+    return graph, layers
+
+
+def pack_quantized_transform_pass(graph, pass_args: dict = {}):
+    """
+    Replace the integer, binary and ternary layers of a quantized graph by modules
+    storing their quantized weights as packed low-bit codes with a scale per tensor or
+    per output channel, for inference.
+
+    :param graph: The input graph, quantized.
+    :type graph: MaseGraph
+
+    :param pass_args: Optional overrides of DEFAULT_CONFIG, e.g.
+        {"save_path": "packed_model.pt"} to also save the packed model.
+    :type pass_args: dict
+
+    :return: The transformed graph and a dictionary with the format, scale granularity
+        and size in bytes before and after packing of each packed layer, and the total
+        sizes.
+    :rtype: tuple
+    """
+    pass_args = {} if pass_args is None else pass_args
+    unknown = set(pass_args) - set(DEFAULT_CONFIG)
+    if unknown:
+        raise ValueError(f"Unknown pack quantized options: {sorted(unknown)}")
+    config = DEFAULT_CONFIG | pass_args
+    graph, layers = pack_quantized_graph_iterator(graph, config)
+    dense = sum(layer["dense"] for layer in layers.values())
+    packed = sum(layer["packed"] for layer in layers.values())
+    logger.info(
+        f"Packed {len(layers)} layers: {dense} -> {packed} bytes "
+        f"({dense / max(packed, 1):.2f}x)"
+    )
+    if config["save_path"] is not None:
+        save_packed_model(graph.model, config["save_path"])
+    return graph, {"layers": layers, "dense": dense, "packed": packed}
+
+
+def save_packed_model(model: nn.Module, path):
+    """Save a model with packed layers, with what load_packed_model needs to rebuild
+    the packed layers."""
+    layers = {}
+    for name, module in model.named_modules():
+        if isinstance(module, _PackedBase):
+            layers[name] = {
+                "module": type(module).__name__,
+                "spec": module.spec,
+                "source": module.source,
+            }
+    torch.save({"layers": layers, "state_dict": model.state_dict()}, path)
+
+
+def load_packed_model(model: nn.Module, path) -> nn.Module:
+    """
+    Load a model saved by save_packed_model into a model of the same architecture, its
+    layers quantized or not: the packed layers replace those of the model, and the
+    input quantizer of each is rebuilt from the config of the quantized layer it was
+    packed from.
+    """
+    checkpoint = torch.load(path, map_location="cpu")
+    for name, layer in checkpoint["layers"].items():
+        source = layer["source"]
+        # only the input quantizer is needed, the weights are not allocated
+        quantized = PACKABLE_MODULES[source["module"]](
+            **source["args"], config=source["config"], device="meta"
+        )
+        packed = PACKED_MODULES[layer["module"]](
+            **source["args"], spec=layer["spec"], x_quantizer=quantized.x_quantizer
+        )
+        packed.source = source
+        parent_name, attr = get_parent_name(name)
+        setattr(get_module_by_name(model, parent_name), attr, packed)
+    model.load_state_dict(checkpoint["state_dict"])
+    return model
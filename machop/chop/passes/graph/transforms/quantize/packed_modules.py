@@ -0,0 +1,297 @@
+# Packed low-bit weight storage for quantized modules
+# --------------------------------------------------------------------------------------
+# The quantized modules keep full-precision master weights and quantize them in each
+# forward pass, so a quantized model is as large as the original one. The modules here
+# hold the quantized weights as the integer codes of their format, with a scale per
+# tensor or per output channel:
+#
+#   weight = (code * step + offset) * scale
+#
+# Codes of 1, 2 and 4 bits are packed into bytes, LSB first; wider codes are stored as
+# int8 or int16. Integer weights have a power of two scale per tensor, binary and
+# ternary weights the scale of each output channel, which is 1 for the unscaled
+# variants. The weights are unpacked in each forward pass, so the model stays small in
+# memory. These modules are for inference: the weights are buffers.
+
+import math
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from .quantized_modules.conv1d import Conv1dBinary, Conv1dInteger, Conv1dTernary
+from .quantized_modules.conv2d import Conv2dBinary, Conv2dInteger, Conv2dTernary
+from .quantized_modules.linear import LinearBinary, LinearInteger, LinearTernary
+
+INTEGER_MODULES = (LinearInteger, Conv1dInteger, Conv2dInteger)
+# modules whose weights are binary or ternary, up to a scale per output channel
+SIGN_MODULES = (
+    LinearBinary,
+    Conv1dBinary,
+    Conv2dBinary,
+    LinearTernary,
+    Conv1dTernary,
+    Conv2dTernary,
+)
+PACKABLE_MODULES = {cls.__name__: cls for cls in INTEGER_MODULES + SIGN_MODULES}
+
+# storage width of codes of each width, codes narrower than a byte are packed
+_STORAGE_BITS = {1: 1, 2: 2, 3: 4, 4: 4} | {b: 8 for b in range(5, 9)}
+_STORAGE_DTYPES = {8: torch.int8, 16: torch.int16}
+
+
+def pack_codes(codes: torch.Tensor, bits: int) -> torch.Tensor:
+    """Pack non-negative integers below 2**bits, bits 1, 2 or 4, into uint8."""
+    per_byte = 8 // bits
+    codes = codes.reshape(-1).to(torch.uint8)
+    codes = torch.cat([codes, codes.new_zeros(-codes.numel() % per_byte)])
+    shifts = torch.arange(0, 8, bits, dtype=torch.uint8, device=codes.device)
+    # the shifted codes have no bits in common, their sum is their bitwise or
+    return (codes.view(-1, per_byte) << shifts).sum(dim=1, dtype=torch.uint8)
+
+
+def unpack_codes(packed: torch.Tensor, bits: int, count: int) -> torch.Tensor:
+    """The first count codes packed by pack_codes, as uint8."""
+    shifts = torch.arange(0, 8, bits, dtype=torch.uint8, device=packed.device)
+    codes = (packed[:, None] >> shifts) & (2**bits - 1)
+    return codes.view(-1)[:count]
+
+
+def _scale_view(scale: torch.Tensor, ndim: int) -> torch.Tensor:
+    return scale.view(-1, *[1] * (ndim - 1))
+
+
+@torch.no_grad()
+def encode_weight(module: nn.Module):
+    """
+    The quantized weight of a packable module as integer codes and their scale.
+
+    Returns the format of the codes, the codes as int64 and the scale, of size 1 for a
+    scale per tensor. Raises ValueError if the quantized weight is not exactly the
+    codes times the scale.
+    """
+    weight = module.w_quantizer(module.weight).detach().float()
+    if isinstance(module, INTEGER_MODULES):
+        bits = module.config["weight_width"]
+        frac_width = module.config["weight_frac_width"]
+        scale = torch.tensor([2.0**-frac_width])
+        codes = torch.round(weight * 2**frac_width)
+        name, step, low = f"int{bits}", 1, -(2 ** (bits - 1))
+    elif isinstance(module, SIGN_MODULES):
+        scale = weight.abs().flatten(1).amax(dim=1)
+        scale = torch.where(scale > 0, scale, torch.ones_like(scale))
+        codes = torch.round(weight / _scale_view(scale, weight.ndim))
+        if torch.all(scale == scale[0]):
+            scale = scale[:1]
+        if codes.min() >= 0:
+            name, bits, step, low = "binary", 1, 1, 0
+        elif torch.all(codes != 0):
+            name, bits, step, low = "binary", 1, 2, -1
+        else:
+            name, bits, step, low = "ternary", 2, 1, -1
+    else:
+        raise ValueError(f"Cannot pack the weights of {type(module).__name__}")
+    if not torch.equal(codes * _scale_view(scale, weight.ndim), weight):
+        raise ValueError(
+            f"The {name} weights of {type(module).__name__} are not exactly integer "
+            "codes times a scale"
+        )
+    if bits > 16:
+        raise ValueError(f"Cannot pack {bits}-bit weights, at most 16 bits")
+    storage = _STORAGE_BITS.get(bits, 16)
+    # packed codes are unsigned, the offset is added back when unpacking
+    offset = low if storage < 8 else 0
+    spec = {
+        "format": name,
+        "bits": bits,
+        "storage": storage,
+        "step": step if storage < 8 else 1,
+        "offset": offset,
+        "shape": list(weight.shape),
+        "scale_size": scale.numel(),
+    }
+    if storage < 8:
+        codes = (codes - low) / step
+    return spec, codes.long(), scale
+
+
+class _PackedBase(nn.Module):
+    """
+    The common storage of the packed modules: the packed weight codes, their scale and
+    the bias, quantized. spec is the format of the codes returned by encode_weight.
+    Subclasses define the classmethod init_args, the constructor arguments of the
+    packed module matching a quantized module.
+    """
+
+    def __init__(self, spec: dict, x_quantizer, bias: bool):
+        super().__init__()
+        self.spec = spec
+        self.x_quantizer = x_quantizer
+        # the quantized module the weight was packed from, to rebuild x_quantizer
+        self.source = None
+        count = math.prod(spec["shape"])
+        storage = spec["storage"]
+        if storage < 8:
+            packed = torch.zeros(-(-count * storage // 8), dtype=torch.uint8)
+        else:
+            packed = torch.zeros(count, dtype=_STORAGE_DTYPES[storage])
+        self.register_buffer("packed_weight", packed)
+        self.register_buffer("weight_scale", torch.ones(spec["scale_size"]))
+        self.register_buffer("bias", torch.zeros(spec["shape"][0]) if bias else None)
+
+    @classmethod
+    @torch.no_grad()
+    def from_quantized(cls, module: nn.Module):
+        """Pack the weight of a quantized module, which stays unchanged."""
+        spec, codes, scale = encode_weight(module)
+        args = cls.init_args(module)
+        packed = cls(**args, spec=spec, x_quantizer=module.x_quantizer)
+        if spec["storage"] < 8:
+            packed.packed_weight.copy_(pack_codes(codes, spec["storage"]))
+        else:
+            packed.packed_weight.copy_(codes.view(-1))
+        packed.weight_scale.copy_(scale)
+        if module.bias is not None:
+            packed.bias.copy_(module.b_quantizer(module.bias))
+        packed.source = {
+            "module": type(module).__name__,
+            "args": args,
+            "config": module.config,
+        }
+        return packed
+
+    @property
+    def nbytes(self) -> int:
+        return sum(b.numel() * b.element_size() for b in self.buffers())
+
+    def unpacked_weight(self) -> torch.Tensor:
+        """The quantized weight, in the dtype of the scale."""
+        spec = self.spec
+        shape = spec["shape"]
+        if spec["storage"] < 8:
+            codes = unpack_codes(self.packed_weight, spec["storage"], math.prod(shape))
+        else:
+            codes = self.packed_weight
+        weight = codes.to(self.weight_scale.dtype)
+        if spec["step"] != 1:
+            weight.mul_(spec["step"])
+        if spec["offset"] != 0:
+            weight.add_(spec["offset"])
+        return weight.view(shape) * _scale_view(self.weight_scale, len(shape))
+
+    def extra_repr(self) -> str:
+        scale = "tensor" if self.spec["scale_size"] == 1 else "channel"
+        return (
+            f"format={self.spec['format']}, scale={scale}, bias={self.bias is not None}"
+        )
+
+
+class PackedLinear(_PackedBase):
+    """A quantized Linear layer with a packed weight."""
+
+    def __init__(
+        self,
+        in_features: int,
+        out_features: int,
+        bias: bool,
+        spec: dict,
+        x_quantizer,
+    ):
+        super().__init__(spec, x_quantizer, bias)
+        self.in_features = in_features
+        self.out_features = out_features
+
+    @classmethod
+    def init_args(cls, module: nn.Linear) -> dict:
+        return {
+            "in_features": module.in_features,
+            "out_features": module.out_features,
+            "bias": module.bias is not None,
+        }
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return F.linear(self.x_quantizer(x), self.unpacked_weight(), self.bias)
+
+
+class _PackedConvNd(_PackedBase):
+    _conv = None
+
+    def __init__(
+        self,
+        in_channels: int,
+        out_channels: int,
+        kernel_size,
+        stride,
+        padding,
+        dilation,
+        groups: int,
+        bias: bool,
+        spec: dict,
+        x_quantizer,
+    ):
+        super().__init__(spec, x_quantizer, bias)
+        self.in_channels = in_channels
+        self.out_channels = out_channels
+        self.kernel_size = kernel_size
+        self.stride = stride
+        self.padding = padding
+        self.dilation = dilation
+        self.groups = groups
+
+    @classmethod
+    def init_args(cls, module: nn.Module) -> dict:
+        if module.padding_mode != "zeros":
+            raise ValueError(f"Cannot pack {module.padding_mode} padded convolutions")
+        return {
+            "in_channels": module.in_channels,
+            "out_channels": module.out_channels,
+            "kernel_size": module.kernel_size,
+            "stride": module.stride,
+            "padding": module.padding,
+            "dilation": module.dilation,
+            "groups": module.groups,
+            "bias": module.bias is not None,
+        }
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return type(self)._conv(
+            self.x_quantizer(x),
+            self.unpacked_weight(),
+            self.bias,
+            self.stride,
+            self.padding,
+            self.dilation,
+            self.groups,
+        )
+
+
+class PackedConv1d(_PackedConvNd):
+    """A quantized Conv1d layer with a packed weight."""
+
+    _conv = F.conv1d
+
+
+class PackedConv2d(_PackedConvNd):
+    """A quantized Conv2d layer with a packed weight."""
+
+    _conv = F.conv2d
+
+
+def packed_module_cls(module: nn.Module):
+    """The packed module class for a quantized module, None if it cannot be packed."""
+    if type(module).__name__ not in PACKABLE_MODULES or module.bypass:
+        return None
+    if isinstance(module, nn.Linear):
+        return PackedLinear
+    if getattr(module, "padding_mode", None) != "zeros":
+        return None
+    if isinstance(module, nn.Conv1d):
+        return PackedConv1d
+    if isinstance(module, nn.Conv2d):
+        return PackedConv2d
+    return None
+
+
+PACKED_MODULES = {
+    cls.__name__: cls for cls in (PackedLinear, PackedConv1d, PackedConv2d)
+}
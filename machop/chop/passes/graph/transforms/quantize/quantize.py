@@ -57,6 +57,7 @@ def graph_iterator_quantize_by_type(graph, config: dict):
         )
     else:
         bl_graph = None
+    changed_nodes = []
     for node in graph.fx_graph.nodes:
         if get_mase_op(node) not in QUANTIZEABLE_OP:
             continue
@@ -84,6 +85,7 @@ def graph_iterator_quantize_by_type(graph, config: dict):
             setattr(graph.modules[parent_name], name, new_module)
             # update precision and type in meta.parameters["common"]
             update_quant_meta_param(node, node_config, get_mase_op(node))
+            changed_nodes.append(node)
         elif get_mase_type(node) in [
             "builtin_func",
             "module_related_func",
@@ -98,10 +100,13 @@ def graph_iterator_quantize_by_type(graph, config: dict):
                 update_quant_meta_param(new_node, node_config, get_mase_op(node))
                 node.replace_all_uses_with(new_node)
             graph.fx_graph.erase_node(node)
+            changed_nodes.append(new_node)
+    graph.mark_dirty(changed_nodes)
     return graph
 
 
 def graph_iterator_quantize_by_name(graph, config: dict):
+    changed_nodes = []
     for node in graph.fx_graph.nodes:
         if get_mase_op(node) not in QUANTIZEABLE_OP:
             continue
@@ -130,6 +135,7 @@ def graph_iterator_quantize_by_name(graph, config: dict):
             parent_name, name = get_parent_name(node.target)
             setattr(graph.modules[parent_name], name, new_module)
             update_quant_meta_param(node, node_config, get_mase_op(node))
+            changed_nodes.append(node)
             logger.debug(f"Quantized module: {node.target} with config: {node_config}")
         elif get_mase_type(node) in [
             "builtin_func",
@@ -144,6 +150,7 @@ def graph_iterator_quantize_by_name(graph, config: dict):
                 update_quant_meta_param(new_node, node_config, get_mase_op(node))
                 node.replace_all_uses_with(new_node)
             graph.fx_graph.erase_node(node)
+            changed_nodes.append(new_node)
             logger.debug(
                 f"Quantized function: {node.target} with config: {node_config}"
             )
@@ -151,11 +158,13 @@ def graph_iterator_quantize_by_name(graph, config: dict):
             raise ValueError(
                 "Unsupported node type for quantisation: {}".format(get_mase_type(node))
             )
+    graph.mark_dirty(changed_nodes)
     return graph
 
 
 def graph_iterator_quantize_by_regex_name(graph, config: dict):
     patterns = list(config.keys())
+    changed_nodes = []
     for node in graph.fx_graph.nodes:
         if get_mase_op(node) not in QUANTIZEABLE_OP:
             continue
@@ -176,6 +185,7 @@ def graph_iterator_quantize_by_regex_name(graph, config: dict):
             parent_name, name = get_parent_name(node.target)
             setattr(graph.modules[parent_name], name, new_module)
             update_quant_meta_param(node, node_config, get_mase_op(node))
+            changed_nodes.append(node)
         elif get_mase_type(node) in [
             "builtin_func",
             "module_related_func",
@@ -189,10 +199,12 @@ def graph_iterator_quantize_by_regex_name(graph, config: dict):
                 update_quant_meta_param(new_node, node_config, get_mase_op(node))
                 node.replace_all_uses_with(new_node)
             graph.fx_graph.erase_node(node)
+            changed_nodes.append(new_node)
         else:
             raise ValueError(
                 "Unsupported node type for quantisation:{}".format(get_mase_type(node))
             )
+    graph.mark_dirty(changed_nodes)
     return graph
 
 
@@ -226,6 +238,11 @@ def quantize_transform_pass(graph, pass_args=None):
         case _:
             raise ValueError(f'Unsupported quantize "by": {by}')
 
-    # link the model with graph
-    graph.model = torch.fx.GraphModule(graph.model, graph.fx_graph)
+    # link the model with graph, keeping the patched node info recorded at tracing
+    # so that the metadata passes can be re-run on the quantized graph
+    model = torch.fx.GraphModule(graph.model, graph.fx_graph)
+    for attr in ["patched_op_names", "patched_custom_layers", "additional_inputs"]:
+        if hasattr(graph.model, attr):
+            setattr(model, attr, getattr(graph.model, attr))
+    graph.model = model
     return graph, {}
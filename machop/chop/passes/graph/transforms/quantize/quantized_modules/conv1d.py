@@ -16,7 +16,7 @@ from ..quantizers import (
     binary_quantizer,
     ternary_quantizer,
 )
-from .utils import get_stats
+from .utils import cached_quantize, get_stats
 
 
 class _Conv1dBase(torch.nn.Conv1d):
@@ -57,8 +57,8 @@ class _Conv1dBase(torch.nn.Conv1d):
         if self.bypass:
             return self._conv_forward(x, self.weight, self.bias)
         x = self.x_quantizer(x)
-        w = self.w_quantizer(self.weight)
-        bias = self.b_quantizer(self.bias) if self.bias is not None else None
+        w = cached_quantize(self, "weight", self.w_quantizer, self.weight)
+        bias = cached_quantize(self, "bias", self.b_quantizer, self.bias)
         # WARNING: this may have been simplified, we are assuming here the accumulation is lossless!
         # The addition size is in_channels * K * K
         return self._conv_forward(x, w, bias)
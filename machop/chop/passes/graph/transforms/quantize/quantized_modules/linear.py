@@ -3,7 +3,7 @@ from functools import partial
 import torch
 from torch import Tensor
 from torch.nn import functional as F
-from .utils import get_stats, quantiser_passthrough
+from .utils import cached_quantize, get_stats, quantiser_passthrough
 
 from ..quantizers import (
     residual_sign_quantizer,
@@ -61,8 +61,8 @@ class _LinearBase(torch.nn.Linear):
             return F.linear(x, self.weight, self.bias)
         else:
             x = self.x_quantizer(x)
-            w = self.w_quantizer(self.weight)
-            bias = self.b_quantizer(self.bias) if self.bias is not None else None
+            w = cached_quantize(self, "weight", self.w_quantizer, self.weight)
+            bias = cached_quantize(self, "bias", self.b_quantizer, self.bias)
             return F.linear(x, w, bias)
 
     # TODO: implement these as passes
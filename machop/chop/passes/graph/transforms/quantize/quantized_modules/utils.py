@@ -1,5 +1,12 @@
+import weakref
+from functools import partial
+
+import torch
 from torch import Tensor
 
+# quantized parameters of each module in eval mode, see cached_quantize
+_quantized_cache = weakref.WeakKeyDictionary()
+
 
 def extract_required_config(self, config: dict):
     r_config = {}
@@ -38,3 +45,38 @@ def get_stats(config: dict, stat_name: str) -> float | None:
 
 def quantiser_passthrough(x: Tensor):
     return x
+
+
+def _quantizer_key(quantizer):
+    if isinstance(quantizer, partial):
+        return quantizer.func, quantizer.args, quantizer.keywords
+    return quantizer
+
+
+def cached_quantize(module: torch.nn.Module, name: str, quantizer, tensor: Tensor):
+    """
+    quantizer(tensor), memoized for the parameter name of module in eval mode with
+    autograd disabled, when parameters are frozen. The quantized parameter is reused
+    until the parameter is updated in place or replaced, or the quantizer changes:
+    updates through .data are not tracked by the version counter and not seen.
+
+    Tensors computed in forward, e.g. pruned weights, and stochastic quantizers are
+    never memoized.
+    """
+    if tensor is None:
+        return None
+    if (
+        module.training
+        or torch.is_grad_enabled()
+        or not isinstance(tensor, torch.nn.Parameter)
+        or getattr(quantizer, "keywords", {}).get("stochastic", False)
+    ):
+        return quantizer(tensor)
+    key = (tensor._version, tensor.data_ptr(), tensor.dtype, _quantizer_key(quantizer))
+    cache = _quantized_cache.setdefault(module, {})
+    cached = cache.get(name)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    quantized = quantizer(tensor)
+    cache[name] = (key, quantized)
+    return quantized
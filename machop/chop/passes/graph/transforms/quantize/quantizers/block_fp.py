@@ -1,7 +1,7 @@
 import torch
 from torch import Tensor
 
-from .utils import block, my_clamp, my_round, unblock
+from .utils import block_strided, my_clamp, unblock_strided
 
 
 def _block_fp_quantize(
@@ -28,14 +28,36 @@ def _block_fp_quantize(
     - `block_size`: a list of integers where each integer is the block size on that dimension. See function `block`.
 
     """
-    if isinstance(block_size, int):
-        block_size = [block_size]
     # separate x into blocks
-    x_shape_before_blocking = [i for i in x.shape]
-    blocked_x, per_block_max, padded_x_shape, block_shape = block(
+    blocked_x, per_block_max, x_shape_before_blocking = block_strided(
         x, block_shape=block_size, skip_first_dim=skip_first_dim
     )
+    per_block_msfp = _block_fp_quantize_blocks(
+        blocked_x,
+        per_block_max,
+        width=width,
+        exponent_width=exponent_width,
+        exponent_bias=exponent_bias,
+    )
+    msfp_x = unblock_strided(per_block_msfp, x_shape_before_blocking)
+
+    # this `is_close_to_0` helps the grad keeps 1 if input x is 0, or the zero-initialized value will be trapped in 0
+    is_close_to_0 = torch.isclose(
+        x, torch.tensor([0.0], dtype=x.dtype, device=x.device)
+    )
+    return torch.where(is_close_to_0, x, msfp_x)
 
+
+def _block_fp_quantize_blocks(
+    blocked_x: Tensor,
+    per_block_max: Tensor,
+    width: int,
+    exponent_width: int,
+    exponent_bias: int = None,
+):
+    """
+    MSFP quantization of blocked x, per_block_max broadcasting over each block.
+    """
     # fill zeros to avoid log2(0) = -inf
     if torch.all(per_block_max == 0):
         # all elements in zero-initialized bias can be 0 thus per_block_max is 0
@@ -51,35 +73,24 @@ def _block_fp_quantize(
     exponent_min = -exponent_bias
 
     mantissa_integer_max = 2**mantissa_bits - 1
-    # sign
-    per_block_sign = torch.sign(blocked_x + 1e-9)
     # exponent
-    per_block_value = torch.abs(blocked_x) + 1e-9
     per_block_exponent = torch.ceil(torch.log2(per_block_max))
     per_block_exponent = my_clamp(per_block_exponent, exponent_min, exponent_max)
-    # mantissa
-    per_block_mantissa = per_block_value / 2**per_block_exponent
+    per_block_scale = 2**per_block_exponent
+    # mantissa, in place on a single copy of blocked_x
     shift = 2**mantissa_bits
-    per_block_mantissa_integer = my_clamp(
-        my_round(per_block_mantissa * shift), 0, mantissa_integer_max
-    )
-    per_block_mantissa = per_block_mantissa_integer / shift
-
-    per_block_msfp = per_block_sign * (2**per_block_exponent) * per_block_mantissa
-    msfp_x = unblock(
-        per_block_msfp,
-        x_shape_before_blocking=x_shape_before_blocking,
-        padded_x_shape=padded_x_shape,
-        block_shape=block_shape,
-        skipped_first_dim_when_blocking=skip_first_dim,
+    per_block_mantissa = (
+        torch.abs(blocked_x)
+        .add_(1e-9)
+        .div_(per_block_scale)
+        .mul_(shift)
+        .round_()
+        .clamp_(0, mantissa_integer_max)
+        .div_(shift)
     )
-
-    # fmt: off
-    # this `is_close_to_0` helps the grad keeps 1 if input x is 0, or the zero-initialized value will be trapped in 0
-    is_close_to_0 = torch.isclose(x, torch.tensor([0.0], dtype=x.dtype, device=x.device))
-    msfp_x = (~is_close_to_0) * msfp_x + (is_close_to_0) * x
-    # fmt: on
-    return msfp_x
+    # sign
+    per_block_sign = torch.sign(blocked_x + 1e-9)
+    return per_block_sign.mul_(per_block_scale).mul_(per_block_mantissa)
 
 
 class BlockFPQuantize(torch.autograd.Function):
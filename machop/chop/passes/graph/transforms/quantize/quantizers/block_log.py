@@ -3,7 +3,7 @@ from numpy import ndarray
 from torch import Tensor
 from .log import _log_quantize
 
-from .utils import block, my_clamp, unblock
+from .utils import block_strided, my_clamp, unblock_strided
 
 
 def _block_log_quantize(
@@ -26,12 +26,29 @@ def _block_log_quantize(
     - `block_size`: a list of integers where each integer is the block size along the corresponding dim
 
     """
-    exponent_bits = width - 1
-    x_shape_before_blocking = [i for i in x.shape]
-    blocked_x, per_block_max, padded_x_shape, block_shape = block(
+    blocked_x, per_block_max, x_shape_before_blocking = block_strided(
         x, block_shape=block_size, skip_first_dim=skip_first_dim
     )
+    per_block_lq_x = _block_log_quantize_blocks(
+        blocked_x,
+        per_block_max,
+        width=width,
+        exponent_bias_width=exponent_bias_width,
+    )
+    return unblock_strided(per_block_lq_x, x_shape_before_blocking)
+
 
+def _block_log_quantize_blocks(
+    blocked_x: Tensor,
+    per_block_max: Tensor,
+    width: int,
+    exponent_bias_width: int = None,
+):
+    """
+    Block base-2 log quantization of blocked x, per_block_max broadcasting over each
+    block.
+    """
+    exponent_bits = width - 1
     # fill zeros to avoid log2(0) = -inf
     if torch.all(per_block_max == 0):
         per_block_max = torch.ones_like(per_block_max)
@@ -43,16 +60,7 @@ def _block_log_quantize(
         2**exponent_bits - 1 - per_block_max_exponent, 0, 2**exponent_bias_width - 1
     )
 
-    per_block_lq_x = _log_quantize(blocked_x, width=width, exponent_bias=per_block_bias)
-    lq_x = unblock(
-        per_block_lq_x,
-        x_shape_before_blocking=x_shape_before_blocking,
-        padded_x_shape=padded_x_shape,
-        block_shape=block_shape,
-        skipped_first_dim_when_blocking=skip_first_dim,
-    )
-
-    return lq_x
+    return _log_quantize(blocked_x, width=width, exponent_bias=per_block_bias)
 
 
 class BlockLogQuantize(torch.autograd.Function):
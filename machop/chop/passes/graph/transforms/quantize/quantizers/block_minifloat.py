@@ -1,7 +1,7 @@
 import torch
 from torch import Tensor
 
-from .utils import block, my_clamp, unblock
+from .utils import block_strided, my_clamp, unblock_strided
 from .minifloat import _minifloat_ieee_quantize
 
 
@@ -29,11 +29,30 @@ def _block_minifloat_quantize(
     - `block_size`: a list of integers where each integer is the block size on that dimension. See function `block`.
 
     """
-    x_shape_before_blocking = [i for i in x.shape]
-    blocked_x, per_block_max, padded_x_shape, block_shape = block(
+    blocked_x, per_block_max, x_shape_before_blocking = block_strided(
         x, block_shape=block_size, skip_first_dim=skip_first_dim
     )
+    per_block_bm_x = _block_minifloat_quantize_blocks(
+        blocked_x,
+        per_block_max,
+        width=width,
+        exponent_width=exponent_width,
+        exponent_bias_width=exponent_bias_width,
+    )
+    return unblock_strided(per_block_bm_x, x_shape_before_blocking)
+
 
+def _block_minifloat_quantize_blocks(
+    blocked_x: Tensor,
+    per_block_max: Tensor,
+    width: int,
+    exponent_width: int,
+    exponent_bias_width: int,
+):
+    """
+    Block minifloat quantization of blocked x, per_block_max broadcasting over each
+    block.
+    """
     # fill zeros to avoid log2(0) = -inf
     if torch.all(per_block_max == 0):
         per_block_max = torch.ones_like(per_block_max)
@@ -43,22 +62,13 @@ def _block_minifloat_quantize(
     per_block_exponent_bias = my_clamp(
         torch.floor(torch.log2(per_block_max)), 0, 2**exponent_bias_width - 1
     )
-    per_block_bm_x = _minifloat_ieee_quantize(
+    return _minifloat_ieee_quantize(
         blocked_x,
         width=width,
         exponent_width=exponent_width,
         exponent_bias=per_block_exponent_bias,
     )
 
-    bm_x = unblock(
-        per_block_bm_x,
-        x_shape_before_blocking=x_shape_before_blocking,
-        padded_x_shape=padded_x_shape,
-        block_shape=block_shape,
-        skipped_first_dim_when_blocking=skip_first_dim,
-    )
-    return bm_x
-
 
 class BlockMinifloatQuantize(torch.autograd.Function):
     @staticmethod
@@ -81,15 +91,7 @@ class BlockMinifloatQuantize(torch.autograd.Function):
         )
 
     @staticmethod
-    def backward(
-        ctx,
-        grad_output: Tensor,
-        width: int,
-        exponent_width: int,
-        exponent_bias_width: int,
-        block_size: list[int] | int = [16],
-        skip_first_dim: bool = False,
-    ):
+    def backward(ctx, grad_output: Tensor):
         return grad_output, None, None, None, None, None
 
 
@@ -616,6 +616,74 @@ def unblock(
         )
 
 
+def _infer_strided_block_shape(
+    x_shape: List[int], block_shape: List[int] | int, skip_first_dim: bool
+):
+    """
+    The block size on every dim of x, as `block` infers it.
+    """
+    if isinstance(block_shape, int):
+        block_shape = [block_shape]
+    if len(x_shape) == 1:
+        assert (
+            skip_first_dim is False
+        ), "skip_first_dim must be False for bias to be blocked"
+        return _infer_block_shape(x_shape, block_shape)
+    elif len(x_shape) in (2, 3):
+        if skip_first_dim:
+            return _infer_block_shape([1, *x_shape[1:]], block_shape)
+        elif len(x_shape) == 2:
+            return _infer_block_shape(x_shape, block_shape)
+        else:
+            raise NotImplementedError("block 3d weight is not supported.")
+    else:
+        raise RuntimeError(f"Unsupported x.ndim = {len(x_shape)}")
+
+
+def block_strided(
+    x: Tensor, block_shape: List[int] | int, skip_first_dim: bool = False
+):
+    """
+    Split x into the blocks of `block` without copying it: x is viewed as
+    [num_blocks_0, block_size_0, num_blocks_1, block_size_1, ...], so that per-block
+    values broadcast over the elements of each block. x is padded with zeros, in a
+    single copy, only if a dim is not divisible by its block size.
+
+    - skip_first_dim (bool): If True, block_shape[0] will always take 1.
+
+    ---
+    Return (blocked_x, per_block_max, x_shape), per_block_max of shape
+    [num_blocks_0, 1, num_blocks_1, 1, ...]
+    """
+    x_shape = [i for i in x.shape]
+    block_shape = _infer_strided_block_shape(x_shape, block_shape, skip_first_dim)
+    blocked_shape = []
+    for x_shape_dim_i, block_shape_dim_i in zip(x_shape, block_shape):
+        blocked_shape += [ceil(x_shape_dim_i / block_shape_dim_i), block_shape_dim_i]
+    if any(i % j for i, j in zip(x_shape, block_shape)):
+        x = F.pad(x, _infer_padding_shape(x_shape, block_shape))
+    blocked_x = x.reshape(blocked_shape)
+    per_block_max = blocked_x.abs().amax(
+        dim=tuple(range(1, blocked_x.ndim, 2)), keepdim=True
+    )
+    return blocked_x, per_block_max, x_shape
+
+
+def unblock_strided(blocked_x: Tensor, x_shape_before_blocking: List[int]):
+    """
+    [num_blocks_0, block_size_0, num_blocks_1, block_size_1, ...] -> x_shape_before_blocking
+
+    The inverse of `block_strided`, a view unless blocked_x is not contiguous.
+    """
+    padded_x_shape = [
+        blocked_x.shape[i] * blocked_x.shape[i + 1] for i in range(0, blocked_x.ndim, 2)
+    ]
+    x = blocked_x.reshape(padded_x_shape)
+    if padded_x_shape != x_shape_before_blocking:
+        x = x[tuple(slice(None, i) for i in x_shape_before_blocking)]
+    return x
+
+
 def _block_multi_dim_weight(x: Tensor, block_shape: List[int]):
     """
     [weight_shape_1, weight_shape_2, ..., weight_shape_n] -> [block_size_1 * block_size_2 * ... * block_size_n, num_blocks]
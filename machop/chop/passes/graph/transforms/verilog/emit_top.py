@@ -1,4 +1,5 @@
 import logging
+from collections.abc import Mapping
 from typing import Tuple, Dict
 import math
 import os
@@ -161,7 +162,7 @@ class VerilogSignalEmitter:
         node_name = vf(node.name)
         # Input signals
         for arg, arg_info in node.meta["mase"].parameters["common"]["args"].items():
-            if not isinstance(arg_info, dict):
+            if not isinstance(arg_info, Mapping):
                 continue
 
             # Skip off-chip parameters as they will be directly connected to the top level
@@ -185,7 +186,7 @@ logic                             {node_name}_{arg}_ready;"""
         for result, result_info in (
             node.meta["mase"].parameters["common"]["results"].items()
         ):
-            if not isinstance(result_info, dict):
+            if not isinstance(result_info, Mapping):
                 continue
 
             # Skip off-chip parameters as they will be directly connected to the top level
@@ -367,7 +368,7 @@ class VerilogInternalComponentEmitter:
         for arg, arg_info in node.meta["mase"].parameters["common"]["args"].items():
             if "data_in" in arg:
                 continue
-            if not isinstance(arg_info, dict):
+            if not isinstance(arg_info, Mapping):
                 continue
 
             components += self._emit_module_parameters_top_internal(
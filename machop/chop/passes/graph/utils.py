@@ -39,10 +39,15 @@ def get_parent_name(target: str) -> Tuple[str, str]:
 
 
 def get_module_by_name(model, request_name):
-    for name, layer in model.named_modules():
-        if name == request_name:
-            return layer
-    return None
+    if hasattr(model, "get_module_by_name"):
+        # MaseGraph, use the maintained index
+        return model.get_module_by_name(request_name)
+    module = model
+    for atom in request_name.split(".") if request_name else []:
+        module = module._modules.get(atom)
+        if module is None:
+            return None
+    return module
 
 
 def get_module_by_target(model, target):
@@ -58,6 +63,9 @@ def get_module_by_target(model, target):
 
 
 def get_node_by_name(graph, request_name):
+    if hasattr(graph, "get_node_by_name"):
+        # MaseGraph, use the maintained index
+        return graph.get_node_by_name(request_name)
     for node in graph.nodes:
         if node.name == request_name:
             return node
@@ -121,25 +129,31 @@ def get_similar_node_actual_target(graph, node):
     """
     if graph is None:
         return None
-    for bl_node in graph.fx_graph.nodes:
-        if bl_node.name == node.name:
-            return get_node_actual_target(bl_node)
+    try:
+        bl_node = graph.get_node_by_name(node.name)
+    except RuntimeError:
+        return None
+    return get_node_actual_target(bl_node)
 
 
 def get_node_target_by_name(graph, request_name):
     if graph is None:
         return None
-    for node in graph.fx_graph.nodes:
-        if node.name == request_name:
-            return get_node_actual_target(node)
-    raise RuntimeError(f"No node named {request_name} found in graph")
+    return get_node_actual_target(graph.get_node_by_name(request_name))
 
 
 def deepcopy_mase_graph(mase_graph):
+    """
+    Deep copy a mase graph including its weights, see MaseGraph.clone for a copy
+    that shares the weights
+    """
     new_graph = deepcopy(mase_graph)
     for new_n, n in zip(new_graph.fx_graph.nodes, mase_graph.fx_graph.nodes):
         # new_n.meta = deepcopy(n.meta)
-        new_n.meta = n.meta
+        new_n.meta = copy.copy(n.meta)
+        if "mase" in n.meta:
+            # copy-on-write, so that metadata changes do not leak between copies
+            new_n.meta["mase"] = n.meta["mase"].fork(new_n, new_graph.model)
     return new_graph
 
 
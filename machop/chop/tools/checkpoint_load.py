@@ -33,6 +33,9 @@ def load_unwrapped_ckpt(
 ):
     """
     Load a PyTorch state dict or checkpoint containing state dict to a PyTorch model.
+
+    The pruning masks in `mask` can be bool tensors or bit-packed PackedMask objects,
+    which are unpacked one at a time as their module is loaded.
     """
     print("has_quantized? : ", end="")
     print(is_quantize)
@@ -120,6 +123,15 @@ def load_graph_module_ckpt(checkpoint: str):
     return model
 
 
+def load_compressed_ckpt(checkpoint: str, model: torch.nn.Module):
+    """
+    Load a deep-compression checkpoint to a PyTorch model, decoding one tensor at a time.
+    """
+    from chop.passes.graph.transforms.huffman.container import CompressedCheckpoint
+
+    return CompressedCheckpoint(checkpoint).load_into(model)
+
+
 def load_model(
     model_short_name,
     mask,
@@ -133,8 +145,8 @@ def load_model(
 
     Args:
         load_name (str): path to the checkpoint
-        load_type (str, optional): checkpoint type, must be one of ['pt', 'pl', 'mz'],
-        representing pytorch/lightning/mase. Defaults to "auto" inferred from the extension.
+        load_type (str, optional): checkpoint type, must be one of ['pt', 'pl', 'mz', 'mzc'],
+        representing pytorch/lightning/mase/mase deep-compression. Defaults to "auto" inferred from the extension.
         model (torch.nn.Module, optional): Model candidate to load checkpoint.
         Note that 'ms' checkpoint loads the model as well as state dict, thus does not need this arg. Defaults to None.
 
@@ -148,7 +160,7 @@ def load_model(
         raise RuntimeError(
             "HuggingFace checkpoint should be loaded using model_inst_fn."
         )
-    elif load_type not in ["pt", "pl", "mz"]:
+    elif load_type not in ["pt", "pl", "mz", "mzc"]:
         raise ValueError(f"Unknown extension for 'load_type': {load_type}")
 
     if load_type == "pt":
@@ -165,6 +177,9 @@ def load_model(
             checkpoint=load_name, model=model
         )
         logger.info(f"Loaded pytorch lightning checkpoint from {load_name}")
+    elif load_type == "mzc":
+        model = load_compressed_ckpt(checkpoint=load_name, model=model)
+        logger.info(f"Loaded mase deep-compression checkpoint from {load_name}")
     else:
         assert load_name.endswith(
             ".mz"
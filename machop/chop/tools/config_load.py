@@ -1,3 +1,5 @@
+from collections.abc import MutableMapping
+
 import toml
 from tabulate import tabulate
 from textwrap import wrap
@@ -7,7 +9,7 @@ def convert_str_na_to_none(d):
     """
     Since toml does not support None, we use "NA" to represent None.
     """
-    if isinstance(d, dict):
+    if isinstance(d, MutableMapping):
         for k, v in d.items():
             d[k] = convert_str_na_to_none(v)
     elif isinstance(d, list):
@@ -27,7 +29,7 @@ def convert_none_to_str_na(d):
     Since toml does not support None, we use "NA" to represent None.
     Otherwise the none-value key will be missing in the toml file.
     """
-    if isinstance(d, dict):
+    if isinstance(d, MutableMapping):
         for k, v in d.items():
             d[k] = convert_none_to_str_na(v)
     elif isinstance(d, list):
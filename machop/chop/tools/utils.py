@@ -13,6 +13,7 @@ import logging
 
 # LUTNet
 import itertools
+from collections.abc import MutableMapping
 
 use_cuda = torch.cuda.is_available()
 torch_cuda = torch.cuda if use_cuda else torch
@@ -237,7 +238,7 @@ def init_Conv2dLUT_weight(
 def nested_dict_replacer(compound_dict, fn):
     def _finditem(obj):
         for k, v in obj.items():
-            if isinstance(v, dict):
+            if isinstance(v, MutableMapping):
                 _finditem(v)  # added return statement
             else:
                 obj[k] = fn(v)
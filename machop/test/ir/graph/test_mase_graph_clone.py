@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# Checks that MaseGraph.clone shares the weights with the original graph while
+# transforms and metadata changes on the clone do not leak into the original.
+
+import logging
+import os
+import sys
+from copy import deepcopy
+
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.models.toys.toy import ToyConvNet
+from chop.passes.graph.analysis import (
+    add_common_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+)
+from chop.passes.graph.transforms import quantize_transform_pass
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+quan_args = {
+    "by": "type",
+    "default": {"config": {"name": None}},
+    "linear": {
+        "config": {
+            "name": "integer",
+            "data_in_width": 8,
+            "data_in_frac_width": 4,
+            "weight_width": 8,
+            "weight_frac_width": 4,
+            "bias_width": 8,
+            "bias_frac_width": 4,
+        }
+    },
+}
+
+
+def _storage_bytes(model, exclude=()):
+    storages = {}
+    for t in list(model.parameters()) + list(model.buffers()):
+        storage = t.untyped_storage()
+        storages[storage.data_ptr()] = storage.nbytes()
+    return sum(v for k, v in storages.items() if k not in exclude)
+
+
+def test_mase_graph_clone():
+    x = torch.randn(2, 3, 32, 32)
+    mg = MaseGraph(model=ToyConvNet(num_classes=10))
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": x}, "add_value": False}
+    )
+    mg.model.eval()
+    y = mg.model(x)
+    common = {
+        n.name: deepcopy(n.meta["mase"].parameters["common"]) for n in mg.fx_graph.nodes
+    }
+
+    cloned = mg.clone()
+    assert torch.equal(cloned.model(x), y)
+    assert cloned.fx_graph is not mg.fx_graph
+    assert (
+        dict(cloned.model.named_modules()).keys()
+        == dict(mg.model.named_modules()).keys()
+    )
+    for (name, p), cloned_p in zip(
+        mg.model.named_parameters(), cloned.model.parameters()
+    ):
+        assert p is not cloned_p
+        assert p.data_ptr() == cloned_p.data_ptr()
+    for node in cloned.fx_graph.nodes:
+        assert node.meta["mase"].node is node
+        assert node.meta["mase"].model is cloned.model
+
+    # only the buffers are materialised, the weights are shared
+    ptrs = {t.untyped_storage().data_ptr() for t in mg.model.parameters()}
+    assert _storage_bytes(cloned.model, exclude=ptrs) < 0.05 * _storage_bytes(mg.model)
+
+    # transforms and metadata changes on the clone leave the original untouched
+    cloned, _ = quantize_transform_pass(cloned, deepcopy(quan_args))
+    node = next(iter(cloned.fx_graph.nodes))
+    node.meta["mase"].parameters["common"]["mase_op"] = "changed"
+    assert type(cloned.modules["linear"]) is not type(mg.modules["linear"])
+    assert type(mg.modules["linear"]) is torch.nn.Linear
+    assert torch.equal(mg.model(x), y)
+    for node in mg.fx_graph.nodes:
+        assert node.meta["mase"].parameters["common"] == common[node.name]
+
+    # updating the weights of the clone (e.g. finetuning) leaves the original untouched
+    cloned = mg.clone()
+    cloned.modules["linear"].weight = torch.nn.Parameter(
+        torch.zeros_like(cloned.modules["linear"].weight)
+    )
+    assert torch.equal(mg.model(x), y)
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_mase_graph_clone()
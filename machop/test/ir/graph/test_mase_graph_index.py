@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# Checks that the name -> node and name -> module indices of MaseGraph stay
+# consistent with the underlying fx graph and module tree after mutations.
+
+import logging
+import os
+import sys
+
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.models.toys.toy import ToyNet
+from chop.passes.graph.utils import get_module_by_name, get_node_by_name
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+def test_mase_graph_index():
+    mlp = ToyNet(image_size=(1, 28, 28), num_classes=10)
+    mg = MaseGraph(model=mlp)
+
+    # module index matches named_modules()
+    assert dict(mg.modules) == dict(mg.model.named_modules())
+    assert get_module_by_name(mg.model, "seq_blocks.0") is mg.modules["seq_blocks.0"]
+    assert get_module_by_name(mg.model, "seq_blocks.9") is None
+
+    # replacing a submodule updates the index incrementally
+    new_linear = torch.nn.Linear(784, 8)
+    setattr(mg.modules["seq_blocks"], "0", new_linear)
+    assert mg.modules["seq_blocks.0"] is new_linear
+    new_block = torch.nn.Sequential(torch.nn.ReLU(), torch.nn.ReLU())
+    setattr(mg.modules["seq_blocks"], "1", new_block)
+    assert mg.modules["seq_blocks.1.0"] is new_block[0]
+    assert dict(mg.modules) == dict(mg.model.named_modules())
+
+    # node index follows insertions, erasures and renames in the fx graph
+    node = next(n for n in mg.fx_graph.nodes if n.op == "call_module")
+    assert get_node_by_name(mg, node.name) is node
+    with mg.fx_graph.inserting_before(node):
+        new_node = mg.fx_graph.call_module(node.target, node.args, node.kwargs)
+    node.replace_all_uses_with(new_node)
+    old_name = node.name
+    mg.fx_graph.erase_node(node)
+    new_node.name = old_name
+    assert mg.get_node_by_name(old_name) is new_node
+
+    # reassigning the model rebuilds both indices
+    mg.model = torch.fx.GraphModule(mg.model, mg.fx_graph)
+    assert dict(mg.modules) == dict(mg.model.named_modules())
+    assert mg.get_node_by_name(old_name).graph is mg.fx_graph
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_mase_graph_index()
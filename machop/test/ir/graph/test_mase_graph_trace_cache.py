@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# Checks that MaseGraph reuses the symbolic trace of models with the same
+# architecture, binds it to the new instance and retraces when the
+# architecture or the concrete args differ.
+
+import logging
+import os
+import sys
+
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.ir.graph.mase_graph import MaseTracer, clear_trace_cache
+from chop.models.toys.toy import ToyNet
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+class Config:
+    # an unhashable configuration object
+    __hash__ = None
+
+    def __init__(self, double):
+        self.double = double
+
+
+class ConfiguredNet(torch.nn.Module):
+    def __init__(self, config):
+        super().__init__()
+        self.config = config
+        self.fc = torch.nn.Linear(4, 4)
+
+    def forward(self, x):
+        x = self.fc(x)
+        if self.config.double:
+            x = x * 2
+        return x
+
+
+class CountingTrace:
+    def __init__(self):
+        self.count = 0
+        self.trace = MaseTracer.trace
+
+    def __enter__(self):
+        counter = self
+
+        def trace(tracer, *args, **kwargs):
+            counter.count += 1
+            return counter.trace(tracer, *args, **kwargs)
+
+        MaseTracer.trace = trace
+        return self
+
+    def __exit__(self, *args):
+        MaseTracer.trace = self.trace
+
+
+def test_mase_graph_trace_cache():
+    clear_trace_cache()
+    x = torch.randn(2, 1, 28, 28)
+    with CountingTrace() as counter:
+        model_a = ToyNet(image_size=(1, 28, 28), num_classes=10)
+        model_b = ToyNet(image_size=(1, 28, 28), num_classes=10)
+        mg_a = MaseGraph(model=model_a)
+        mg_b = MaseGraph(model=model_b)
+        assert counter.count == 1
+
+        # the cached trace is bound to the new instance, and not shared
+        assert mg_b.fx_graph is not mg_a.fx_graph
+        assert mg_b.modules["seq_blocks.0"] is model_b.seq_blocks[0]
+        assert torch.equal(mg_b.model(x), model_b(x))
+        assert [n.name for n in mg_a.fx_graph.nodes] == [
+            n.name for n in mg_b.fx_graph.nodes
+        ]
+        mg_a.fx_graph.erase_node(
+            next(n for n in mg_a.fx_graph.nodes if n.op == "output")
+        )
+        mg_c = MaseGraph(model=ToyNet(image_size=(1, 28, 28), num_classes=10))
+        assert counter.count == 1
+        assert len(mg_c.fx_graph.nodes) == len(mg_b.fx_graph.nodes)
+
+        # a different architecture or training mode is traced again
+        MaseGraph(model=ToyNet(image_size=(1, 28, 28), num_classes=5))
+        assert counter.count == 2
+        MaseGraph(model=ToyNet(image_size=(1, 28, 28), num_classes=10).eval())
+        assert counter.count == 3
+
+        MaseGraph(
+            model=ToyNet(image_size=(1, 28, 28), num_classes=10), trace_cache=False
+        )
+        assert counter.count == 4
+
+        # models whose configs cannot be keyed are always traced
+        x = torch.randn(2, 4)
+        single = ConfiguredNet(Config(double=False))
+        double = ConfiguredNet(Config(double=True))
+        double.load_state_dict(single.state_dict())
+        mg_single = MaseGraph(model=single)
+        mg_double = MaseGraph(model=double)
+        assert counter.count == 6
+        assert torch.equal(mg_single.model(x), single(x))
+        assert torch.equal(mg_double.model(x), double(x))
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_mase_graph_trace_cache()
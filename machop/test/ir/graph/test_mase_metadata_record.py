@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# Checks that the slot-based TensorMetadata records produced by the common
+# metadata pass behave as the dicts they replace, including (un)pickling.
+
+import logging
+import os
+import pickle
+import sys
+from copy import deepcopy
+
+import pytest
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph, TensorMetadata
+from chop.models.toys.toy import ToyNet
+from chop.passes.graph.analysis import (
+    add_common_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+def test_mase_metadata_record():
+    record = TensorMetadata(shape=[2, 3], type="float", precision=[32])
+    as_dict = {"shape": [2, 3], "type": "float", "precision": [32]}
+    assert record == as_dict and as_dict == record
+    assert "value" not in record and record.get("value") is None
+    with pytest.raises(KeyError):
+        record["value"]
+
+    record["from"] = None
+    record["stat"] = {"range_min_max": {"min": 0, "max": 1}}
+    assert record["from"] is None
+    assert set(record) == {"shape", "type", "precision", "from", "stat"}
+    del record["from"]
+    assert "from" not in record and len(record) == 4
+    assert dict(record | {"type": "fixed"})["type"] == "fixed"
+    assert record["type"] == "float"
+
+    for copied in [pickle.loads(pickle.dumps(record)), deepcopy(record)]:
+        assert isinstance(copied, TensorMetadata)
+        assert copied == record
+        assert "from" not in copied
+
+    mg = MaseGraph(model=ToyNet(image_size=(1, 28, 28), num_classes=10))
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": torch.randn(2, 1, 28, 28)}, "add_value": False}
+    )
+    for node in mg.fx_graph.nodes:
+        meta = node.meta["mase"]
+        assert not hasattr(meta, "__dict__")
+        for name, arg in meta.parameters["common"]["args"].items():
+            if name.startswith("data_in"):
+                assert isinstance(arg, TensorMetadata)
+        loaded = pickle.loads(pickle.dumps(meta.parameters))
+        assert loaded == meta.parameters
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_mase_metadata_record()
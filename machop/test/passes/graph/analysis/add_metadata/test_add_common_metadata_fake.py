@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Checks that propagating common metadata with FakeTensors gives the same shapes,
+# dtypes and precisions as the eager path, without touching the model weights
+
+import logging
+import os
+from copy import deepcopy
+import sys
+
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.tools.logger import set_logging_verbosity
+from chop.ir.graph import MaseGraph
+from chop.models.toys.toy_custom_fn import ToyCustomFnNet
+from chop.models.toys.toy import ToyConvNet
+from chop.passes.graph.analysis import (
+    add_common_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+)
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+def _strip_values(meta):
+    if isinstance(meta, dict):
+        return {k: _strip_values(v) for k, v in meta.items() if k != "value"}
+    return meta
+
+
+def _common_metadata(model, dummy_in, use_fake_tensors):
+    # tracing registers tensor constants on the traced model, trace a copy
+    mg = MaseGraph(model=deepcopy(model))
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg,
+        {
+            "dummy_in": dummy_in,
+            "add_value": False,
+            "use_fake_tensors": use_fake_tensors,
+        },
+    )
+    return {
+        node.name: _strip_values(node.meta["mase"].parameters["common"])
+        for node in mg.fx_graph.nodes
+    }
+
+
+def test_add_common_metadata_fake():
+    models = [
+        (
+            ToyCustomFnNet(image_size=(1, 28, 28), num_classes=10),
+            torch.randn(8, 28, 28),
+        ),
+        (ToyConvNet(num_classes=10), torch.randn(8, 3, 32, 32)),
+    ]
+    for model, x in models:
+        fake_meta = _common_metadata(model, {"x": x}, use_fake_tensors=True)
+        eager_meta = _common_metadata(model, {"x": x}, use_fake_tensors=False)
+        assert fake_meta == eager_meta
+
+    # the fake path leaves weights as real tensors with their original values
+    model = ToyConvNet(num_classes=10)
+    weights = {k: v.clone() for k, v in model.state_dict().items()}
+    mg = MaseGraph(model=model)
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": torch.randn(8, 3, 32, 32)}, "use_fake_tensors": True}
+    )
+    for k, v in mg.model.state_dict().items():
+        assert not isinstance(v, torch._subclasses.FakeTensor)
+        assert torch.equal(v, weights[k])
+    linear = next(n for n in mg.fx_graph.nodes if n.name == "linear")
+    assert linear.meta["mase"].parameters["common"]["args"]["weight"]["value"] is (
+        mg.modules["linear"].weight
+    )
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_add_common_metadata_fake()
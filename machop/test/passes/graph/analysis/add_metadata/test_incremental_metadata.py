@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# Checks that re-running the metadata passes incrementally after a quantize
+# transform matches a full recompute, and only touches the dirty nodes
+
+import logging
+import os
+import sys
+from copy import deepcopy
+
+import torch
+import torch.nn as nn
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.tools.logger import set_logging_verbosity
+from chop.ir.graph import MaseGraph
+from chop.passes.graph.analysis import (
+    add_common_metadata_analysis_pass,
+    add_software_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+)
+from chop.passes.graph.transforms import quantize_transform_pass
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+class MLP(torch.nn.Module):
+    def __init__(self) -> None:
+        super().__init__()
+        self.fc1 = nn.Linear(28 * 28, 64)
+        self.fc2 = nn.Linear(64, 10)
+
+    def forward(self, x):
+        x = torch.flatten(x, start_dim=1, end_dim=-1)
+        x = torch.nn.functional.relu(self.fc1(x))
+        x = self.fc2(x)
+        return x
+
+
+quan_args = {
+    "by": "name",
+    "default": {"config": {"name": None}},
+    "fc2": {
+        "config": {
+            "name": "integer",
+            "data_in_width": 8,
+            "data_in_frac_width": 4,
+            "weight_width": 8,
+            "weight_frac_width": 4,
+            "bias_width": 8,
+            "bias_frac_width": 4,
+        }
+    },
+}
+
+
+def _strip_values(meta):
+    if isinstance(meta, dict):
+        return {k: _strip_values(v) for k, v in meta.items() if k != "value"}
+    return meta
+
+
+def _common_metadata(mg):
+    return {
+        node.name: _strip_values(node.meta["mase"].parameters["common"])
+        for node in mg.fx_graph.nodes
+    }
+
+
+def _analyse(mg, dummy_in, incremental):
+    mg, _ = init_metadata_analysis_pass(mg, {"incremental": incremental})
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": dummy_in, "add_value": False, "incremental": incremental}
+    )
+    return mg
+
+
+def test_incremental_metadata():
+    torch.manual_seed(0)
+    dummy_in = {"x": torch.randn((2, 28, 28))}
+
+    mg = _analyse(MaseGraph(model=MLP()), dummy_in, incremental=False)
+    assert mg.dirty_nodes("common") == []
+    upstream = {
+        node.name: node.meta["mase"]
+        for node in mg.fx_graph.nodes
+        if node.name in ["x", "flatten", "fc1", "relu"]
+    }
+
+    mg, _ = quantize_transform_pass(mg, deepcopy(quan_args))
+    assert [node.name for node in mg.dirty_nodes("common")] == ["fc2", "output"]
+
+    mg = _analyse(mg, dummy_in, incremental=True)
+    assert mg.dirty_nodes("common") == []
+    # nodes upstream of the quantized layer keep their metadata
+    for node in mg.fx_graph.nodes:
+        if node.name in upstream:
+            assert node.meta["mase"] is upstream[node.name]
+
+    incremental_meta = _common_metadata(mg)
+    mg = _analyse(mg, dummy_in, incremental=False)
+    assert incremental_meta == _common_metadata(mg)
+
+    # as in the transform action: quantize keeps the common metadata up to date,
+    # the software metadata of the quantized layer is re-analysed
+    mg = _analyse(MaseGraph(model=MLP()), dummy_in, incremental=False)
+    mg, _ = add_software_metadata_analysis_pass(mg, None)
+    fc1_software = mg.get_node_by_name("fc1").meta["mase"].parameters["software"]
+    mg, _ = quantize_transform_pass(mg, deepcopy(quan_args))
+    assert [node.name for node in mg.dirty_nodes("software")] == ["fc2", "output"]
+    mg, _ = add_software_metadata_analysis_pass(mg, {"incremental": True})
+    assert mg.dirty_nodes("software") == []
+    assert mg.get_node_by_name("fc1").meta["mase"].parameters["software"] is (
+        fc1_software
+    )
+    assert "args" in mg.get_node_by_name("fc2").meta["mase"].parameters["software"]
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_incremental_metadata()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Checks the per-layer pruning sensitivity analysis: the same sweep in worker processes
+# as in the main process, FLOP counts and a recommendation within the FLOP budget.
+
+import logging
+import os
+import sys
+
+import torch
+import torch.nn as nn
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.passes.graph import (
+    add_common_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+    prune_sensitivity_analysis_pass,
+)
+from chop.passes.graph.analysis.pruning.sensitivity import recommend_sparsities
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+class ConvNet(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(3, 8, 3)
+        self.fc = nn.Linear(8 * 4 * 4, 4)
+
+    def forward(self, x):
+        return self.fc(torch.flatten(torch.relu(self.conv(x)), 1))
+
+
+class SharedNet(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.fc1 = nn.Linear(4, 4)
+        self.fc2 = nn.Linear(4, 2)
+
+    def forward(self, x):
+        return self.fc2(torch.relu(self.fc1(torch.relu(self.fc1(x)))))
+
+
+def test_prune_sensitivity():
+    torch.manual_seed(0)
+    model = ConvNet()
+    x = torch.randn(256, 3, 6, 6)
+    y = x.mean(dim=(2, 3)).argmax(dim=1)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-2)
+    for _ in range(100):
+        optimizer.zero_grad()
+        nn.functional.cross_entropy(model(x), y).backward()
+        optimizer.step()
+    weights = [p.detach().clone() for p in model.parameters()]
+
+    mg = MaseGraph(model)
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": x[:2]}, "add_value": True}
+    )
+    batches = [(x[:128], y[:128]), (x[128:], y[128:])]
+    args = {"eval_batches": batches, "flop_budget": 0.4}
+    _, serial = prune_sensitivity_analysis_pass(mg, args | {"num_workers": 0})
+    _, parallel = prune_sensitivity_analysis_pass(mg, args | {"num_workers": 2})
+
+    assert serial == parallel
+    assert serial["baseline"] > 0.8
+    assert serial["flops"] == {"conv": 2 * 8 * 3 * 9 * 16, "fc": 2 * 4 * 128}
+    for drops in serial["accuracy_drop"].values():
+        assert list(drops) == [0.25, 0.5, 0.75, 0.9]
+    assert serial["flop_ratio"] <= 0.4
+    ratio = sum(
+        serial["flops"][t] * (1 - s) for t, s in serial["recommendation"].items()
+    ) / sum(serial["flops"].values())
+    assert abs(ratio - serial["flop_ratio"]) < 1e-9
+    # the workers only read the shared weights
+    assert all(torch.equal(p, w) for p, w in zip(mg.model.parameters(), weights))
+    logger.info(f"Recommended sparsities: {serial['recommendation']}")
+
+    # a layer called twice is analysed once, with the FLOPs of both calls
+    x = torch.randn(64, 4)
+    batches = [(x, x.argmax(dim=1) % 2)]
+    mg = MaseGraph(SharedNet())
+    _, info = prune_sensitivity_analysis_pass(
+        mg, {"eval_batches": batches, "flop_budget": 0.5}
+    )
+    assert info["flops"] == {"fc1": 2 * 2 * 16, "fc2": 2 * 8}
+    assert list(info["accuracy_drop"]) == ["fc1", "fc2"]
+
+    # layers without FLOPs are not candidates
+    drops = {"a": {0.5: 0.1}, "b": {0.5: 0.0}}
+    recommendation = recommend_sparsities(drops, {"a": 100, "b": 0}, [0.5], 0.6)
+    assert recommendation == {"a": 0.5, "b": 0.0}
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_prune_sensitivity()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Checks that the pass manager runs prerequisites once, reuses valid analyses
+# and re-runs them after a pass invalidates them.
+
+import logging
+import os
+import sys
+from collections import Counter
+from copy import deepcopy
+
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.models.toys.toy import ToyNet
+from chop.passes.graph import PASSES, PassManager
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+quan_args = {
+    "by": "type",
+    "default": {"config": {"name": None}},
+    "linear": {
+        "config": {
+            "name": "integer",
+            "data_in_width": 8,
+            "data_in_frac_width": 4,
+            "weight_width": 8,
+            "weight_frac_width": 4,
+            "bias_width": 8,
+            "bias_frac_width": 4,
+        }
+    },
+}
+
+
+def test_pass_manager():
+    calls = Counter()
+
+    def counted(name):
+        def run(graph, *args, **kwargs):
+            calls[name] += 1
+            return PASSES[name](graph, *args, **kwargs)
+
+        return run
+
+    passes = {name: counted(name) for name in PASSES}
+    dummy_in = {"x": torch.randn(2, 1, 28, 28)}
+    mg = MaseGraph(model=ToyNet(image_size=(1, 28, 28), num_classes=10))
+    pm = PassManager(
+        mg,
+        pass_args={"add_common_metadata": {"dummy_in": dummy_in, "add_value": False}},
+        passes=passes,
+    )
+
+    # prerequisites run first, valid analyses are not run again
+    pm.run("report_node_type")
+    pm.run("report_node_shape")
+    pm.run("add_software_metadata")
+    pm.run("add_software_metadata")
+    assert calls == Counter(
+        init_metadata=1,
+        add_common_metadata=1,
+        add_software_metadata=1,
+        report_node_type=1,
+        report_node_shape=1,
+    )
+    assert pm.records[-1].cached
+    # different arguments are a different analysis
+    pm.run("add_common_metadata", pass_args={"dummy_in": dummy_in})
+    assert calls["add_common_metadata"] == 2
+
+    # transforms invalidate what they declare, and what depends on it
+    graph, _ = pm.run("quantize", pass_args=deepcopy(quan_args))
+    assert graph is pm.graph
+    assert "add_common_metadata" in pm.valid
+    pm.invalidate(["init_metadata"])
+    assert "add_software_metadata" not in pm.valid
+    pm.run("add_software_metadata")
+    assert calls["init_metadata"] == 2 and calls["add_common_metadata"] == 3
+
+    report = pm.report()
+    for name in ["init_metadata", "quantize", "cached", "total"]:
+        assert name in report
+    assert all(r.seconds >= 0 for r in pm.records)
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_pass_manager()
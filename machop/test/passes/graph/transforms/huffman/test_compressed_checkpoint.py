@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# Checks the deep-compression checkpoint container: encodings chosen per tensor, lazy
+# decoding into models, load_model and the size report.
+
+import logging
+import os
+import sys
+import tempfile
+
+import torch
+import torch.nn as nn
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.passes.graph.transforms.huffman import (
+    CompressedCheckpoint,
+    save_compressed_checkpoint,
+)
+from chop.tools.checkpoint_load import load_model
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+def _model():
+    return nn.Sequential(nn.Conv2d(16, 32, 3), nn.BatchNorm2d(32), nn.Linear(64, 64))
+
+
+def test_compressed_checkpoint():
+    torch.manual_seed(0)
+    model = _model()
+    with torch.no_grad():
+        # pruned and quantized, quantized, left in fp32
+        conv = model[0].weight
+        conv.copy_(torch.round(conv * 64) / 64)
+        conv[torch.rand_like(conv) < 0.9] = 0
+        model[2].weight.copy_(torch.round(model[2].weight * 16) / 16)
+    state_dict = model.state_dict()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.mzc")
+        report = save_compressed_checkpoint(state_dict, path)
+        encodings = {name: t["encoding"] for name, t in report["tensors"].items()}
+        assert encodings["0.weight"] == "sparse_huffman"
+        assert encodings["2.weight"] == "huffman"
+        assert encodings["2.bias"] == "raw"
+        assert report["file"] == os.path.getsize(path)
+        assert report["dense"] == sum(
+            t.numel() * t.element_size() for t in state_dict.values()
+        )
+        assert report["ratio"] > 3
+
+        # decoded straight into the tensors of the model
+        checkpoint = CompressedCheckpoint(path)
+        other = _model()
+        weight = other[0].weight
+        checkpoint.load_into(other)
+        assert other[0].weight is weight
+        for name, tensor in other.state_dict().items():
+            assert torch.equal(tensor, state_dict[name]), name
+        # into another dtype, or through load_state_dict
+        other = _model().half()
+        checkpoint.load_into(other)
+        assert torch.equal(other[0].weight, state_dict["0.weight"].half())
+        other = _model()
+        other.load_state_dict(checkpoint)
+        assert torch.equal(other[2].weight, state_dict["2.weight"])
+
+        other = load_model(None, None, False, path, load_type="mzc", model=_model())
+        assert torch.equal(other[0].weight, state_dict["0.weight"])
+
+        # only the named tensors are entropy coded
+        report = save_compressed_checkpoint(state_dict, path, encode=["2.weight"])
+        assert report["tensors"]["0.weight"]["encoding"] == "raw"
+        assert report["tensors"]["2.weight"]["encoding"] == "huffman"
+    logger.info(f"Deep-compression checkpoint: {report['ratio']:.2f}x smaller")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_compressed_checkpoint()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# Checks the canonical Huffman coding of quantized weights: round trips, canonical
+# and length-limited codes, and the size of the packed bitstream.
+
+import logging
+import os
+import pickle
+import sys
+
+import numpy as np
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.passes.graph.transforms.huffman.canonical import (
+    MAX_CODE_LENGTH,
+    HuffmanEncoded,
+    canonical_codes,
+    code_lengths,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+def test_huffman():
+    # lengths of a complete code, assigned in (length, symbol) order
+    lengths = code_lengths(np.array([10, 1, 1, 2, 5]))
+    assert lengths.tolist() == [1, 4, 4, 3, 2]
+    assert canonical_codes(lengths).tolist() == [0b0, 0b1110, 0b1111, 0b110, 0b10]
+
+    rng = np.random.default_rng(0)
+    # weights quantized to 1/16 steps
+    weights = (np.round(rng.standard_normal((32, 16, 3, 3)) * 8) / 16).astype(
+        np.float32
+    )
+    encoded = HuffmanEncoded.encode(weights)
+    assert np.array_equal(encoded.decode(), weights)
+    assert encoded.decode().dtype == np.float32
+    counts = np.unique(weights, return_counts=True)[1]
+    assert encoded.num_bits == int((counts * encoded.lengths).sum())
+    assert len(encoded.data) == -(-encoded.num_bits // 8)
+    assert encoded.nbytes < weights.nbytes / 4
+    assert len(pickle.dumps(encoded)) < weights.nbytes / 4
+
+    for values in [
+        np.zeros(5, dtype=np.float32),
+        np.array([1.0, -1.0]),
+        rng.integers(-3, 3, 3000).astype(np.int8),
+    ]:
+        assert np.array_equal(HuffmanEncoded.encode(values).decode(), values)
+
+    # skewed counts are coded within the longest code length
+    counts = np.array([int(1.6**i) + 1 for i in range(40)])
+    lengths = code_lengths(counts)
+    assert lengths.max() == MAX_CODE_LENGTH
+    assert (2.0 ** -lengths.astype(float)).sum() == 1.0
+    values = np.repeat(np.arange(40), np.minimum(counts, 10**5))
+    rng.shuffle(values)
+    assert np.array_equal(HuffmanEncoded.encode(values).decode(), values)
+    logger.info(f"Huffman coded {weights.nbytes} bytes into {encoded.nbytes}")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_huffman()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# Checks that the Huffman pass codes the quantized weights of all Conv2d, Linear and
+# Embedding layers, in worker processes as in the main process.
+
+import logging
+import os
+import sys
+import tempfile
+
+import torch
+import torch.nn as nn
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.passes.graph import (
+    add_common_metadata_analysis_pass,
+    huffman_transform_pass,
+    init_metadata_analysis_pass,
+    quantize_transform_pass,
+)
+from chop.passes.graph.transforms.huffman import CompressedCheckpoint
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+class Embedder(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.embedding = nn.Embedding(100, 32)
+        self.fc = nn.Linear(32, 10)
+
+    def forward(self, x):
+        return self.fc(self.embedding(x))
+
+
+def test_huffman_pass():
+    torch.manual_seed(0)
+    mg = MaseGraph(nn.Sequential(nn.Linear(64, 256), nn.ReLU(), nn.Linear(256, 10)))
+    x = torch.randn(2, 64)
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"input_1": x}, "add_value": False}
+    )
+    config = {
+        "name": "integer",
+        "data_in_width": 8,
+        "data_in_frac_width": 4,
+        "weight_width": 4,
+        "weight_frac_width": 3,
+        "bias_width": 8,
+        "bias_frac_width": 4,
+    }
+    quan_args = {
+        "by": "type",
+        "default": {"config": {"name": None}},
+        "linear": {"config": config},
+    }
+    mg, _ = quantize_transform_pass(mg, quan_args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.mzc")
+        _, serial = huffman_transform_pass(mg, {"save_path": path, "num_workers": 0})
+        _, report = huffman_transform_pass(mg, {"save_path": path, "num_workers": 2})
+        # the weights are stored quantized
+        checkpoint = CompressedCheckpoint(path)
+        for name in ["0", "2"]:
+            module = mg.modules[name]
+            weight = module.w_quantizer(module.weight)
+            assert torch.equal(checkpoint[f"{name}.weight"], weight)
+            layer = report["tensors"][f"{name}.weight"]
+            assert layer["encoding"] == "huffman" and layer["ratio"] > 4
+            assert layer["stored"] == serial["tensors"][f"{name}.weight"]["stored"]
+            assert layer["encode_time"] > 0
+        assert report["tensors"]["0.bias"]["encoding"] == "raw"
+        assert report["file"] == serial["file"]
+        assert report["encode_time"] > 0
+
+        # embeddings too
+        model = Embedder()
+        with torch.no_grad():
+            for module in [model.embedding, model.fc]:
+                module.weight.copy_(torch.round(module.weight * 8) / 8)
+        _, report = huffman_transform_pass(
+            MaseGraph(model), {"save_path": path, "num_workers": 2}
+        )
+        for name in ["embedding.weight", "fc.weight"]:
+            assert report["tensors"][name]["encoding"] == "huffman"
+    logger.info(f"Huffman coded all layers, {report['ratio']:.2f}x smaller")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_huffman_pass()
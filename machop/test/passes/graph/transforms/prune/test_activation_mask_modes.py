@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Checks the static (calibrated once) and dynamic (re-ranked every k batches)
+# activation mask modes of the activation pruning hooks.
+
+import logging
+import os
+import sys
+
+import pytest
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.passes.graph.transforms.pruning.load import load_activation_prune_config
+from chop.passes.graph.transforms.pruning.prune import get_activation_hook
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+def _hooked_conv(**config):
+    a_config = load_activation_prune_config(
+        {"sparsity": 0.5, "method": "l1-norm", **config}, None
+    )
+    conv = torch.nn.Conv2d(4, 4, 3)
+    _, hook = get_activation_hook(
+        "conv", {}, {"activation_sparsity": 0.5}, None, a_config
+    )
+    conv.register_forward_pre_hook(hook)
+    return conv
+
+
+def test_activation_mask_modes():
+    torch.manual_seed(0)
+    batches = [torch.randn(8, 4, 6, 6) for _ in range(5)]
+
+    # static: ranked once on the mean magnitude of the calibration batches
+    conv = _hooked_conv(mode="static", calibration_batches=3)
+    for x in batches[:3]:
+        conv(x)
+    magnitude = sum(x.abs().mean(dim=0, keepdim=True) for x in batches[:3]) / 3
+    mask = magnitude > magnitude.flatten().kthvalue(4 * 6 * 6 // 2).values
+    assert torch.equal(conv.activation_mask, mask)
+    assert "activation_mask" in dict(conv.named_buffers())
+    assert "activation_mask" not in conv.state_dict()
+    static_mask = conv.activation_mask
+    x = batches[3]
+    assert torch.equal(conv(x), conv._conv_forward(x * mask, conv.weight, conv.bias))
+    # the mask is not recomputed
+    assert conv.activation_mask is static_mask
+
+    # dynamic: re-ranked every update_interval batches
+    conv = _hooked_conv(mode="dynamic", update_interval=2)
+    masks = []
+    for x in batches[:3]:
+        conv(x)
+        masks.append(conv.activation_mask)
+    assert masks[0] is masks[1] and masks[1] is not masks[2]
+    assert torch.equal(masks[2], batches[2].abs() > batches[2].abs().median())
+
+    with pytest.raises(ValueError):
+        load_activation_prune_config({"mode": "cached"}, None)
+    with pytest.raises(ValueError):
+        load_activation_prune_config({"update_interval": 0}, None)
+    logger.info("Activation masks are calibrated or re-ranked as configured")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_activation_mask_modes()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# Checks that the vectorized channel-similarity criterion removes the same channels
+# as ranking the (similarity, (i, j)) pairs in Python.
+
+import logging
+import os
+import sys
+
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.passes.graph.transforms.pruning.pruning_methods import (
+    channel_similarity_feature_map,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+def reference_channel_similarity(tensor, sparsity):
+    flat_tensor = tensor.reshape(tensor.shape[1], -1)
+    normalized_tensor = flat_tensor / torch.norm(flat_tensor, dim=1, keepdim=True)
+    similarity = torch.mm(normalized_tensor, normalized_tensor.t())
+    i, j = torch.triu_indices(similarity.size(0), similarity.size(1), offset=1)
+    pairs = list(zip(similarity[i, j].tolist(), zip(i.tolist(), j.tolist())))
+    pairs.sort(reverse=True)
+    removed = {j for _, (_, j) in pairs[: int(sparsity * len(pairs))]}
+    mask = torch.ones(similarity.size(0), dtype=torch.bool)
+    mask[sorted(removed)] = False
+    return mask.view(1, -1, 1, 1).expand(
+        tensor.shape[0], -1, tensor.shape[2], tensor.shape[3]
+    )
+
+
+def test_channel_similarity():
+    torch.manual_seed(0)
+    for shape in [(4, 16, 8, 8), (2, 64, 4, 4), (1, 3, 5, 5)]:
+        tensor = torch.randn(shape)
+        # repeated values give tied similarities
+        tensor[:, : shape[1] // 2] = tensor[:, shape[1] - shape[1] // 2 :]
+        for sparsity in [0.05, 0.3, 0.5, 0.9]:
+            assert torch.equal(
+                channel_similarity_feature_map(tensor, {}, sparsity),
+                reference_channel_similarity(tensor, sparsity),
+            )
+    logger.info("Channel-similarity masks match the reference ranking")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_channel_similarity()
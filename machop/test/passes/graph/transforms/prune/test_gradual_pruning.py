@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# Checks that the gradual pruning callback raises the sparsity of the pruning masks
+# on the cubic schedule while training, updating the mask buffers in place.
+
+import logging
+import os
+import sys
+
+import pytorch_lightning as pl
+import torch
+import torch.nn as nn
+from torch.nn.utils import parametrize
+from torch.utils.data import DataLoader, TensorDataset
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.passes.graph.transforms.pruning.pruning_methods import l1_weight
+from chop.passes.graph.transforms.pruning.schedule import (
+    GradualPruningCallback,
+    polynomial_sparsity,
+)
+from chop.passes.graph.transforms.pruning.sparse_parameterization import (
+    FakeSparseWeight,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+class Classifier(pl.LightningModule):
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def training_step(self, batch, batch_idx):
+        x, y = batch
+        return nn.functional.cross_entropy(self.model(x), y)
+
+    def configure_optimizers(self):
+        return torch.optim.Adam(self.parameters(), lr=1e-3)
+
+
+class SparsityLog(pl.Callback):
+    def __init__(self, module):
+        self.module = module
+        self.sparsities = []
+
+    def on_train_batch_end(self, trainer, pl_module, outputs, batch, batch_idx):
+        mask = self.module.parametrizations.weight[0].mask
+        self.sparsities.append(1 - mask.float().mean().item())
+
+
+def test_gradual_pruning():
+    torch.manual_seed(0)
+    model = nn.Sequential(
+        nn.Conv2d(3, 16, 3), nn.ReLU(), nn.Flatten(), nn.Linear(16 * 6 * 6, 4)
+    )
+    w_config = {"sparsity": 0.2, "granularity": "elementwise", "method": "l1-norm"}
+    # masks installed as by the prune pass
+    for module in [model[0], model[3]]:
+        mask = l1_weight(module.weight.detach(), {}, 0.2)
+        parametrize.register_parametrization(module, "weight", FakeSparseWeight(mask))
+    mask_buffer = model[0].parametrizations.weight[0].mask
+
+    callback = GradualPruningCallback(
+        w_config, final_sparsity=0.9, begin_step=2, end_step=10, frequency=2
+    )
+    log = SparsityLog(model[0])
+    data = TensorDataset(torch.randn(64, 3, 8, 8), torch.randint(0, 4, (64,)))
+    pl_model = Classifier(model)
+    trainer = pl.Trainer(
+        max_steps=12,
+        accelerator="cpu",
+        callbacks=[callback, log],
+        logger=False,
+        enable_checkpointing=False,
+        enable_progress_bar=False,
+    )
+    trainer.fit(pl_model, DataLoader(data, batch_size=4))
+
+    # the callback runs first, after the optimizer step of global step (i + 1)
+    for i, sparsity in enumerate(log.sparsities):
+        step = i + 1
+        # the last update, every 2 steps from step 2 to 10
+        updated = min(step - step % 2, 10)
+        expected = polynomial_sparsity(updated, 0.2, 0.9, 2, 10)
+        assert abs(sparsity - expected) < 0.01, (step, sparsity, expected)
+    assert abs(log.sparsities[-1] - 0.9) < 0.01
+    # updated in place, the parametrization is unchanged
+    assert model[0].parametrizations.weight[0].mask is mask_buffer
+    # pruned weights stay pruned
+    assert torch.all(model[0].weight[~mask_buffer] == 0)
+    logger.info("Gradual pruning follows the cubic schedule")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_gradual_pruning()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# Checks the bit-packed storage of pruning masks: round trips, checkpoints, masks
+# injected into state dicts and the pruning metadata.
+
+import io
+import logging
+import os
+import sys
+
+import torch
+import torch.nn as nn
+from torch.nn.utils import parametrize
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.passes.graph import (
+    add_common_metadata_analysis_pass,
+    add_software_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+    prune_transform_pass,
+)
+from chop.passes.graph.analysis.pruning.calculate_sparsity import (
+    add_pruning_metadata_analysis_pass,
+)
+from chop.passes.graph.transforms.pruning.packed_mask import (
+    PackedMask,
+    pack_mask,
+    unpack_mask,
+)
+from chop.passes.graph.transforms.pruning.sparse_parameterization import (
+    FakeSparseWeight,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+def _pruned_conv(mask):
+    conv = nn.Conv2d(8, 16, 3)
+    parametrize.register_parametrization(conv, "weight", FakeSparseWeight(mask))
+    return conv
+
+
+def test_packed_mask():
+    torch.manual_seed(0)
+    for shape in [(1,), (7,), (16, 8, 3, 3), (5, 13)]:
+        mask = torch.rand(shape) > 0.5
+        packed = pack_mask(mask)
+        assert packed.dtype == torch.uint8 and packed.numel() == -(-mask.numel() // 8)
+        assert torch.equal(unpack_mask(packed, shape), mask)
+
+    # checkpoints hold the packed mask, unpacked into the mask buffer on load
+    mask = torch.rand(16, 8, 3, 3) > 0.5
+    conv = _pruned_conv(mask)
+    state_dict = conv.state_dict()
+    assert "parametrizations.weight.0.mask" not in state_dict
+    assert state_dict["parametrizations.weight.0.mask_packed"].numel() == 16 * 8 * 9 / 8
+    buffer = io.BytesIO()
+    torch.save(state_dict, buffer)
+    buffer.seek(0)
+    other = _pruned_conv(torch.ones_like(mask))
+    other.load_state_dict(torch.load(buffer, weights_only=True))
+    assert torch.equal(other.parametrizations.weight[0].mask, mask)
+    assert torch.equal(other.weight, conv.weight)
+
+    # packed masks injected into a state dict are unpacked on load
+    other = _pruned_conv(torch.ones_like(mask))
+    state_dict = conv.state_dict()
+    state_dict["parametrizations.weight.0.mask"] = PackedMask.pack(mask)
+    other.load_state_dict(state_dict)
+    assert torch.equal(other.parametrizations.weight[0].mask, mask)
+    assert torch.equal(other.weight, conv.weight)
+
+    # the pruning metadata holds packed masks by default
+    mg = MaseGraph(nn.Sequential(nn.Conv2d(8, 16, 3), nn.ReLU()))
+    x = torch.randn(2, 8, 6, 6)
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"input_1": x}, "add_value": True}
+    )
+    mg, _ = add_software_metadata_analysis_pass(mg, None)
+    config = {
+        "weight": {"sparsity": 0.5, "method": "l1-norm"},
+        "activation": {"sparsity": 0.5, "method": "l1-norm"},
+    }
+    mg, _ = prune_transform_pass(mg, 2, config)
+    mg, _, weight_masks, _ = add_pruning_metadata_analysis_pass(
+        mg, {"dummy_in": {"input_1": x}, "add_value": True}
+    )
+    node = next(n for n in mg.fx_graph.nodes if n.op == "call_module")
+    value = node.meta["mase"].parameters["software"]["args"]["weight"]["mask_value"]
+    assert isinstance(value, PackedMask)
+    assert torch.equal(value.unpack(), weight_masks[0])
+    logger.info("Pruning masks are bit-packed")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_packed_mask()
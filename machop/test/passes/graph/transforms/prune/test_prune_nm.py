@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# Checks N:M weight pruning of Conv2d and Linear layers with local and global scopes,
+# and the compact N:M storage used to report the weight memory.
+
+import logging
+import os
+import sys
+
+import pytest
+import torch
+import torch.nn as nn
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.passes.graph import (
+    add_common_metadata_analysis_pass,
+    add_software_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+    prune_transform_pass,
+)
+from chop.passes.graph.analysis.pruning.calculate_sparsity import (
+    add_pruning_metadata_analysis_pass,
+)
+from chop.passes.graph.transforms.pruning.load import load_weight_prune_config
+from chop.passes.graph.transforms.pruning.nm_sparse import NMSparseTensor, nm_mask
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+class Net(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv1 = nn.Conv2d(8, 16, 3, padding=1)
+        self.conv2 = nn.Conv2d(16, 16, 3, padding=1)
+        self.fc = nn.Linear(16 * 4 * 4, 10)
+
+    def forward(self, x):
+        x = torch.relu(self.conv1(x))
+        x = torch.relu(self.conv2(x))
+        return self.fc(torch.flatten(x, 1))
+
+
+def _groups(weight, m):
+    # (..., m) groups along the input dimension
+    return weight.movedim(1, -1).reshape(-1, m)
+
+
+def _prune(scope, sparsity, m):
+    torch.manual_seed(0)
+    mg = MaseGraph(Net())
+    x = torch.randn(2, 8, 4, 4)
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": x}, "add_value": True}
+    )
+    mg, _ = add_software_metadata_analysis_pass(mg, None)
+    config = {
+        "weight": {
+            "sparsity": sparsity,
+            "scope": scope,
+            "granularity": "n:m",
+            "method": "l1-norm",
+            "m": m,
+        },
+        "activation": {"sparsity": 0.0, "method": "l1-norm"},
+    }
+    mg, _ = prune_transform_pass(mg, 2, config)
+    return mg, x
+
+
+def test_prune_nm():
+    # local: 2 of every 4 input weights in every layer, Linear layers included
+    mg, x = _prune("local", 0.5, 4)
+    for name in ["conv1", "conv2", "fc"]:
+        module = mg.modules[name]
+        counts = _groups(module.weight, 4).ne(0).sum(dim=1)
+        assert torch.all(counts <= 2) and counts.sum() == module.weight.numel() // 2
+        original = module.parametrizations.weight.original
+        expected = nm_mask(original.abs(), 2, 4)
+        assert torch.equal(module.parametrizations.weight[0].mask, expected)
+
+    # the memory is reported from the N:M format: fp32 values and 2-bit indices
+    mg, info, _, _ = add_pruning_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": x}, "add_value": False}
+    )
+    memory = info["fc"]["weight_memory"]
+    assert memory["dense"] == 10 * 256 * 4
+    assert memory["compressed"] == 10 * 256 // 2 * 4 + 10 * 256 // 2 * 2 // 8
+    # half the values, plus 2 bits for each kept value: 17 / 32 of the dense size
+    assert memory["compressed"] / memory["dense"] == 0.53125
+    assert abs(info["conv1"]["weight_sparsity"] - 0.5) < 1e-6
+
+    # global: the number kept per group follows the global magnitude ranking
+    mg, _ = _prune("global", 0.7, 8)
+    weights = [mg.modules[name].weight for name in ["conv1", "conv2", "fc"]]
+    for weight in weights:
+        counts = _groups(weight, 8).ne(0).sum(dim=1)
+        assert counts.max() == counts.min()
+    kept = sum(w.ne(0).sum() for w in weights) / sum(w.numel() for w in weights)
+    assert abs(kept - 0.3) < 0.1
+
+    # an input dimension not a multiple of m: the last group of 2 input channels,
+    # padded to 4, keeps both, so 2:4 keeps 4 of 6 input channels
+    weight = torch.randn(8, 6, 3, 3)
+    mask = nm_mask(weight.abs(), 2, 4)
+    assert torch.all(mask[:, :4].sum(dim=1) == 2)
+    assert torch.all(mask[:, 4:])
+    assert mask.sum() == 8 * 4 * 3 * 3
+    compressed = NMSparseTensor.from_dense(weight, 4, mask)
+    assert compressed.n == 2 and torch.equal(compressed.to_dense(), weight * mask)
+
+    # compact storage round trip, with an input dimension not a multiple of m
+    weight = torch.randn(6, 10, 3, 3)
+    mask = nm_mask(weight.abs(), 1, 4)
+    compressed = NMSparseTensor.from_dense(weight, 4, mask)
+    assert compressed.n == 1 and compressed.values.shape == (6, 3, 3, 3, 1)
+    assert torch.equal(compressed.to_dense(), weight * mask)
+
+    with pytest.raises(ValueError):
+        # 3 / 8 kept is not a whole number of weights out of 4
+        load_weight_prune_config({"sparsity": 0.625, "granularity": "n:m"}, None)
+    logger.info("N:M pruning keeps n of every m input weights")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_prune_nm()
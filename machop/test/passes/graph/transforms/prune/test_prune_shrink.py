@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# Checks that removing pruned channels gives a smaller model computing the same
+# outputs, through BatchNorm, residual adds and flattening into a Linear layer, with the
+# constant outputs of the removed channels folded into the next biases.
+
+import logging
+import os
+import sys
+
+import torch
+import torch.nn as nn
+from torch.nn.utils import parametrize
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.passes.graph import (
+    add_common_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+    prune_shrink_transform_pass,
+)
+from chop.passes.graph.transforms.pruning.sparse_parameterization import (
+    FakeSparseWeight,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+class ResidualNet(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv1 = nn.Conv2d(3, 16, 3, padding=1, bias=False)
+        self.bn1 = nn.BatchNorm2d(16)
+        self.conv2 = nn.Conv2d(16, 16, 3, padding=1, bias=False)
+        self.bn2 = nn.BatchNorm2d(16)
+        self.conv3 = nn.Conv2d(16, 8, 3)
+        self.relu = nn.ReLU()
+        self.pool = nn.MaxPool2d(2)
+        self.fc1 = nn.Linear(8 * 3 * 3, 32)
+        self.fc2 = nn.Linear(32, 10)
+
+    def forward(self, x):
+        x = self.relu(self.bn1(self.conv1(x)))
+        x = self.relu(self.bn2(self.conv2(x)) + x)
+        x = self.pool(self.pool(self.relu(self.conv3(x))))
+        x = x.view(-1, 8 * 3 * 3)
+        return self.fc2(self.relu(self.fc1(x)))
+
+
+class SequenceNet(nn.Module):
+    def __init__(self, length):
+        super().__init__()
+        self.a = nn.Linear(8, 6)
+        self.b = nn.Linear(length * 6, 3)
+
+    def forward(self, x):
+        return self.b(torch.flatten(torch.relu(self.a(x)), 1))
+
+
+def _prune_channels(module, channels):
+    # channel pruning as done by the prune pass: the biases are left as they are
+    mask = torch.ones_like(module.weight, dtype=torch.bool)
+    mask[channels] = False
+    parametrize.register_parametrization(module, "weight", FakeSparseWeight(mask))
+
+
+def test_prune_shrink():
+    torch.manual_seed(0)
+    model = ResidualNet()
+    for bn in [model.bn1, model.bn2]:
+        bn.running_mean.normal_()
+        bn.running_var.uniform_(0.5, 2)
+        bn.bias.data.normal_()
+    # channels 0-3 are pruned in both inputs of the residual add, 4 only in one
+    for conv in [model.conv1, model.conv2]:
+        _prune_channels(conv, [0, 1, 2, 3] + ([4] if conv is model.conv1 else []))
+    # the removed channels output constants through BatchNorm and ReLU: those of
+    # channels 2 and 3 reach conv2, which pads them with zeros, so they are kept
+    model.bn1.bias.data[:4] = torch.tensor([-5.0, -5.0, 5.0, 5.0])
+    model.bn2.bias.data[:2] = 2.0
+    model.conv3.bias.data[[1, 5]] = 0.5
+    model.fc1.bias.data[:3] = 0.3
+    _prune_channels(model.conv3, [1, 5])
+    _prune_channels(model.fc1, [0, 1, 2])
+    # the output features are not removed
+    _prune_channels(model.fc2, [9])
+    model.eval()
+
+    x = torch.randn(4, 3, 16, 16)
+    mg = MaseGraph(model=model)
+    y = mg.model(x)
+    mg, info = prune_shrink_transform_pass(mg)
+
+    assert info["channels"] == {
+        "conv1": (16, 14),
+        "conv2": (16, 14),
+        "conv3": (8, 6),
+        "fc1": (32, 29),
+    }
+    assert info["folded"] == {"conv3": 2, "fc1": 2, "fc2": 3}
+    assert info["unfoldable"] == {"conv1": 2, "conv2": 2}
+    modules = mg.modules
+    assert modules["conv2"].weight.shape == (14, 14, 3, 3)
+    assert modules["bn2"].running_mean.shape == (14,)
+    assert modules["conv3"].weight.shape == (6, 14, 3, 3)
+    assert modules["fc1"].weight.shape == (29, 6 * 3 * 3)
+    assert modules["fc2"].weight.shape == (10, 29)
+    assert not parametrize.is_parametrized(modules["conv1"])
+    assert torch.allclose(mg.model(x), y, atol=1e-5)
+
+    # the metadata of the resized graph can be recomputed
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": x}, "add_value": False}
+    )
+    view = [n for n in mg.fx_graph.nodes if n.target == "view"][0]
+    assert view.meta["mase"].parameters["common"]["results"]["data_out_0"]["shape"] == [
+        4,
+        6 * 3 * 3,
+    ]
+
+    # flattening a Linear output (N, L, C) interleaves the channels, they are kept
+    for shape in [(4, 4, 8), (4, 8)]:
+        model = SequenceNet(length=shape[1] if len(shape) == 3 else 1)
+        model.a.bias.data[[1, 4]] = 0.2
+        _prune_channels(model.a, [1, 4])
+        x = torch.randn(shape)
+        y = model(x)
+        mg = MaseGraph(model=model)
+        mg, _ = init_metadata_analysis_pass(mg, None)
+        mg, _ = add_common_metadata_analysis_pass(
+            mg, {"dummy_in": {"x": x}, "add_value": False}
+        )
+        mg, info = prune_shrink_transform_pass(mg)
+        if len(shape) == 3:
+            assert info["channels"] == {} and info["folded"] == {}
+        else:
+            # a Linear output (N, C) is flattened as is
+            assert info["channels"] == {"a": (6, 4)} and info["folded"] == {"b": 2}
+        assert torch.allclose(mg.model(x), y, atol=1e-6)
+    logger.info("Pruned channels are removed from the graph")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_prune_shrink()
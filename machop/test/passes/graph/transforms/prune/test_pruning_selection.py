@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Checks that the exact k-th value selection used for pruning thresholds matches a
+# full sort, and that the pruning masks match the ones obtained with torch.quantile.
+
+import logging
+import os
+import sys
+import weakref
+
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.passes.graph.transforms.pruning.pruning_methods import (
+    global_weight_l1,
+    kernel_l1_weight,
+    l1_weight,
+)
+from chop.passes.graph.transforms.pruning.selection import (
+    kth_value,
+    sparsity_threshold,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+def test_pruning_selection():
+    torch.manual_seed(0)
+    for dtype in [torch.float16, torch.float32, torch.float64]:
+        tensors = [
+            torch.randn(40, 25, dtype=dtype),
+            torch.randn(37, dtype=dtype) * 5,
+            -torch.rand(500, dtype=dtype),
+            torch.zeros(10, dtype=dtype),
+        ]
+        values = torch.cat([t.flatten() for t in tensors])
+        ordered = values.sort().values
+        ordered_abs = values.abs().sort().values
+        for k in [0, 1, 100, 777, values.numel() - 1]:
+            # small chunks to go through the streaming radix select
+            assert kth_value(tensors, k, chunk_size=64) == ordered[k]
+            assert kth_value(tensors, k, torch.abs, chunk_size=64) == ordered_abs[k]
+            assert kth_value(values, k) == ordered[k]
+
+    # same masks as torch.quantile
+    weight = torch.randn(64, 32, 3, 3)
+    for sparsity in [0.0, 0.1, 0.5, 0.9, 1.0]:
+        threshold = torch.quantile(weight.abs().flatten(), sparsity)
+        assert torch.equal(l1_weight(weight, {}, sparsity), weight.abs() > threshold)
+        norms = weight.abs().sum(dim=(2, 3))
+        threshold = torch.quantile(norms.flatten(), sparsity)
+        assert torch.equal(kernel_l1_weight(weight, {}, sparsity), norms > threshold)
+
+    # global ranking without concatenating the layers
+    info = {
+        "a": {"weight_value": torch.randn(16, 8, 3, 3)},
+        "b": None,
+        "c": {"weight_value": torch.randn(32, 16, 3, 3) * 0.1},
+    }
+    values = torch.cat(
+        [v["weight_value"].abs().flatten() for v in [info["a"], info["c"]]]
+    )
+    threshold = torch.quantile(values, 0.7)
+    for v in [info["a"], info["c"]]:
+        mask = global_weight_l1(v["weight_value"], info, 0.7)
+        assert torch.equal(mask, v["weight_value"].abs() > threshold)
+    # an in-place update of a layer changes the global threshold
+    info["c"]["weight_value"].mul_(100)
+    values = torch.cat(
+        [v["weight_value"].abs().flatten() for v in [info["a"], info["c"]]]
+    )
+    threshold = torch.quantile(values, 0.7)
+    mask = global_weight_l1(info["a"]["weight_value"], info, 0.7)
+    assert torch.equal(mask, info["a"]["weight_value"].abs() > threshold)
+    # the cached threshold does not keep the layers alive
+    layer = weakref.ref(info["a"]["weight_value"])
+    del info, v
+    assert layer() is None
+
+    # inputs too large for torch.quantile
+    large = torch.randn(2**24 + 1)
+    threshold = sparsity_threshold(large, 0.5, torch.abs)
+    assert (large.abs() <= threshold).sum() == 2**23 + 1
+    logger.info("Pruning thresholds match the exact order statistics")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_pruning_selection()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# Checks that the sparse inference pass replaces the sparse enough layers of a pruned
+# model by CSR modules computing the same outputs, and leaves the others dense.
+
+import logging
+import os
+import sys
+
+import torch
+import torch.nn as nn
+from torch.nn.utils import parametrize
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.passes.graph import (
+    add_common_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+    sparse_inference_transform_pass,
+)
+from chop.passes.graph.transforms.pruning.sparse_modules import (
+    SparseConv2d,
+    SparseLinear,
+)
+from chop.passes.graph.transforms.pruning.sparse_parameterization import (
+    FakeSparseWeight,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+class ConvNet(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv1 = nn.Conv2d(3, 256, 3, padding=1)
+        self.conv2 = nn.Conv2d(256, 256, 3, stride=2, padding=1, dilation=1)
+        self.conv3 = nn.Conv2d(256, 256, 3, padding=2, dilation=2, bias=False)
+        self.relu = nn.ReLU()
+        self.fc1 = nn.Linear(256 * 4 * 4, 512)
+        self.fc2 = nn.Linear(512, 10)
+
+    def forward(self, x):
+        x = self.relu(self.conv1(x))
+        x = self.relu(self.conv2(x))
+        x = self.relu(self.conv3(x))
+        x = torch.flatten(x, 1)
+        return self.fc2(self.relu(self.fc1(x)))
+
+
+def _prune(module, sparsity):
+    # elementwise magnitude pruning, as done by the prune pass
+    scores = module.weight.detach().abs()
+    threshold = torch.quantile(scores.flatten(), sparsity)
+    mask = scores > threshold
+    parametrize.register_parametrization(module, "weight", FakeSparseWeight(mask))
+
+
+def test_sparse_inference():
+    torch.manual_seed(0)
+    model = ConvNet().eval()
+    _prune(model.conv2, 0.95)
+    _prune(model.conv3, 0.95)
+    _prune(model.fc1, 0.95)
+    # too dense to gain anything
+    _prune(model.fc2, 0.3)
+
+    mg = MaseGraph(model)
+    x = torch.randn(2, 3, 8, 8)
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": x}, "add_value": False}
+    )
+    with torch.no_grad():
+        expected = mg.model(x)
+
+    mg, info = sparse_inference_transform_pass(mg, {})
+    layers = info["layers"]
+    # conv1 is dense, fc2 is too dense and small
+    assert not layers["conv1"]["sparse"] and not layers["fc2"]["sparse"]
+    assert layers["conv2"]["sparse"] and layers["fc1"]["sparse"]
+    assert abs(layers["conv3"]["density"] - 0.05) < 0.01
+    assert isinstance(mg.modules["conv2"], SparseConv2d)
+    assert isinstance(mg.modules["conv3"], SparseConv2d)
+    assert isinstance(mg.modules["fc1"], SparseLinear)
+    assert isinstance(mg.modules["conv1"], nn.Conv2d)
+    assert isinstance(mg.modules["fc2"], nn.Linear)
+
+    with torch.no_grad():
+        output = mg.model(x)
+    assert torch.allclose(output, expected, atol=1e-5, rtol=1e-4)
+
+    # a stricter cost model keeps every layer dense
+    model = ConvNet().eval()
+    _prune(model.conv2, 0.95)
+    mg = MaseGraph(model)
+    mg, info = sparse_inference_transform_pass(mg, {"min_speedup": 100.0})
+    assert not any(v["sparse"] for v in info["layers"].values())
+    logger.info("Sparse inference matches the dense pruned model")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_sparse_inference()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# Checks that the masking parametrizations cache the masked weight in eval mode and
+# recompute it after the weight or the mask changes.
+
+import logging
+import os
+import sys
+
+import torch
+from torch.nn.utils import parametrize
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.passes.graph.transforms.pruning.sparse_parameterization import (
+    FakeSparseWeight,
+    FakeStructuredSparseWeight,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+def test_sparse_parameterization():
+    torch.manual_seed(0)
+    conv = torch.nn.Conv2d(4, 8, 5)
+    # a channel mask covers the whole kernel
+    mask = torch.rand(8) > 0.5
+    parametrize.register_parametrization(conv, "weight", FakeSparseWeight(mask))
+    original = conv.parametrizations.weight.original
+    expected = mask.view(8, 1, 1, 1) * original.detach()
+
+    # training: a fresh masked weight with a gradient
+    conv.train()
+    weight = conv.weight
+    assert torch.equal(weight, expected)
+    weight.sum().backward()
+    assert torch.equal(original.grad, mask.view(8, 1, 1, 1).expand(8, 4, 5, 5).float())
+
+    # eval: the masked weight is computed once
+    conv.eval()
+    with torch.no_grad():
+        weight = conv.weight
+        assert conv.weight is weight
+        assert torch.equal(weight, expected)
+        # an in-place weight update is noticed
+        original.mul_(2)
+        assert conv.weight is not weight
+        assert torch.equal(conv.weight, 2 * expected)
+        # and so is an in-place mask update
+        weight = conv.weight
+        conv.parametrizations.weight[0].mask.zero_()
+        assert conv.weight is not weight
+        assert not conv.weight.any()
+    # the eval cache does not bypass autograd when gradients are needed
+    assert conv.weight.requires_grad
+
+    # converting the module replaces the weight data without bumping its version
+    conv = torch.nn.Conv2d(4, 8, 3)
+    mask = torch.rand(8, 4, 3, 3) > 0.5
+    parametrize.register_parametrization(conv, "weight", FakeSparseWeight(mask))
+    conv.eval()
+    x = torch.randn(2, 4, 6, 6)
+    with torch.no_grad():
+        y = conv(x)
+        conv.double()
+        assert conv.weight.dtype == torch.float64
+        assert torch.allclose(conv(x.double()), y.double(), atol=1e-6)
+        # and so does a device move
+        conv.float()
+        assert torch.equal(conv(x), y)
+        conv.to("meta")
+        assert conv.weight.device.type == "meta"
+
+    linear = torch.nn.Linear(6, 3)
+    mask = torch.tensor([True, False, True])
+    parametrize.register_parametrization(
+        linear, "weight", FakeStructuredSparseWeight(mask)
+    )
+    linear.eval()
+    with torch.no_grad():
+        weight = linear.weight
+        assert linear.weight is weight
+        assert torch.equal(weight[1], torch.zeros(6))
+    logger.info("Masked weights are cached in eval mode")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_sparse_parameterization()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# Checks that the block quantizers, which view tensors as blocks with block_strided,
+# match quantizing the blocks of block and unblock, and pass gradients straight through.
+
+import logging
+import os
+import sys
+
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.passes.graph.transforms.quantize.quantizers import (
+    block_fp_quantizer,
+    block_log_quantizer,
+    block_minifloat_quantizer,
+)
+from chop.passes.graph.transforms.quantize.quantizers.block_fp import (
+    _block_fp_quantize_blocks,
+)
+from chop.passes.graph.transforms.quantize.quantizers.block_log import (
+    _block_log_quantize_blocks,
+)
+from chop.passes.graph.transforms.quantize.quantizers.block_minifloat import (
+    _block_minifloat_quantize_blocks,
+)
+from chop.passes.graph.transforms.quantize.quantizers.utils import (
+    block,
+    block_strided,
+    unblock,
+    unblock_strided,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+# shape, block_size, skip_first_dim
+CASES = [
+    ([37], [16], False),
+    ([64], [16], False),
+    ([64, 48], [8, 8], False),
+    ([60, 50], [16, 16], False),
+    ([16, 16], [-1, 4], False),
+    ([64, 96], [16], True),
+    ([5, 70], [1, 16], True),
+    ([4, 33, 70], [1, 16], True),
+    ([2, 30, 64], [4, 8], True),
+]
+
+
+def _blocked_reference(x, quantize_blocks, block_size, skip_first_dim, *args):
+    blocked_x, per_block_max, padded_x_shape, block_shape = block(
+        x, block_shape=block_size, skip_first_dim=skip_first_dim
+    )
+    return unblock(
+        quantize_blocks(blocked_x, per_block_max, *args),
+        x_shape_before_blocking=list(x.shape),
+        padded_x_shape=padded_x_shape,
+        block_shape=block_shape,
+        skipped_first_dim_when_blocking=skip_first_dim,
+    )
+
+
+def test_block_quantizers():
+    torch.manual_seed(0)
+    for shape, block_size, skip_first_dim in CASES:
+        x = torch.randn(shape) * 3
+        # a zero block, and zeros within blocks
+        x[..., :3] = 0
+        if len(shape) > 1:
+            x[0] = 0
+
+        blocked_x, per_block_max, x_shape = block_strided(x, block_size, skip_first_dim)
+        if blocked_x.numel() == x.numel():
+            assert blocked_x.data_ptr() == x.data_ptr()
+        assert torch.equal(unblock_strided(blocked_x, x_shape), x)
+        reference_max = block(x, block_size, skip_first_dim)[1]
+        assert torch.equal(
+            per_block_max.flatten().sort()[0], reference_max.flatten().sort()[0]
+        )
+
+        expected = _blocked_reference(
+            x, _block_fp_quantize_blocks, block_size, skip_first_dim, 8, 8, None
+        )
+        is_close_to_0 = torch.isclose(x, torch.tensor([0.0]))
+        expected = (~is_close_to_0) * expected + is_close_to_0 * x
+        assert torch.equal(
+            block_fp_quantizer(x, 8, 8, None, block_size, skip_first_dim), expected
+        )
+        expected = _blocked_reference(
+            x, _block_minifloat_quantize_blocks, block_size, skip_first_dim, 8, 4, 8
+        )
+        assert torch.equal(
+            block_minifloat_quantizer(x, 8, 4, 8, block_size, skip_first_dim),
+            expected,
+        )
+        expected = _blocked_reference(
+            x, _block_log_quantize_blocks, block_size, skip_first_dim, 6, 4
+        )
+        assert torch.equal(
+            block_log_quantizer(x, 6, 4, block_size, skip_first_dim), expected
+        )
+
+    # straight-through estimator
+    x = torch.randn(4, 30, 64, requires_grad=True)
+    for quantizer in [
+        lambda x: block_fp_quantizer(x, 8, 8, None, [1, 16], True),
+        lambda x: block_minifloat_quantizer(x, 8, 4, 8, [1, 16], True),
+        lambda x: block_log_quantizer(x, 6, 4, [1, 16], True),
+    ]:
+        x.grad = None
+        quantizer(x).sum().backward()
+        assert torch.equal(x.grad, torch.ones_like(x))
+    logger.info("Block quantizers match the blocked reference")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_block_quantizers()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Checks that quantized layers memoize their quantized weights and biases in eval mode
+# without autograd, and quantize them again when they or the quantizer change.
+
+import logging
+import os
+import sys
+from functools import partial
+
+import torch
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.passes.graph.transforms.quantize.quantizers import integer_quantizer
+from chop.passes.graph.transforms.quantize.quantized_modules import (
+    Conv2dInteger,
+    LinearInteger,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+CONFIG = {
+    "data_in_width": 8,
+    "data_in_frac_width": 4,
+    "weight_width": 4,
+    "weight_frac_width": 3,
+    "bias_width": 8,
+    "bias_frac_width": 4,
+}
+
+
+def _counted(x, quantizer, calls):
+    calls.append(x.shape)
+    return quantizer(x)
+
+
+def _count_calls(module):
+    calls = []
+    module.w_quantizer = partial(_counted, quantizer=module.w_quantizer, calls=calls)
+    module.b_quantizer = partial(_counted, quantizer=module.b_quantizer, calls=calls)
+    return calls
+
+
+def test_cached_quantize():
+    torch.manual_seed(0)
+    for module, x in [
+        (LinearInteger(16, 8, config=CONFIG), torch.randn(4, 16)),
+        (Conv2dInteger(3, 8, 3, config=CONFIG), torch.randn(2, 3, 8, 8)),
+    ]:
+        calls = _count_calls(module)
+        # training: quantized every time
+        module(x)
+        module(x)
+        assert len(calls) == 4
+        module.eval()
+        # eval with autograd: the weights can still receive gradients
+        expected = module(x)
+        assert len(calls) == 6
+        with torch.no_grad():
+            assert torch.equal(module(x), expected)
+            assert torch.equal(module(x), expected)
+            assert len(calls) == 8
+
+            # the weight updated in place: quantized again, the bias is memoized
+            module.weight.add_(0.5)
+            updated = module(x)
+            assert len(calls) == 9
+            assert not torch.equal(updated, expected)
+            module(x)
+            assert len(calls) == 9
+
+            # another quantizer
+            module.w_quantizer = partial(
+                _counted,
+                quantizer=partial(integer_quantizer, width=4, frac_width=2),
+                calls=calls,
+            )
+            module(x)
+            assert len(calls) == 10
+        module.train()
+        with torch.no_grad():
+            module(x)
+        assert len(calls) == 12
+    logger.info("Quantized parameters are memoized in eval mode")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_cached_quantize()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# Checks that the integer backend pass runs integer quantized layers with integer
+# arithmetic, bit-exactly matching the fake-quantized layers, and that the integer
+# arithmetic functions match the fake-quantized functions.
+
+import logging
+import os
+import sys
+
+import torch
+import torch.nn as nn
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.passes.graph import (
+    add_common_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+    integer_backend_transform_pass,
+    quantize_transform_pass,
+)
+from chop.passes.graph.transforms.quantize.integer_arith import (
+    INTEGER_ARITH_FUNCS,
+    Conv2dIntegerArith,
+    LinearIntegerArith,
+)
+from chop.passes.graph.transforms.quantize.quantized_funcs import (
+    add_integer,
+    bmm_integer,
+    matmul_integer,
+    mult_integer,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+class ConvNet(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv1 = nn.Conv2d(3, 16, 3, padding=1)
+        self.conv2 = nn.Conv2d(16, 32, 3, stride=2, padding=2, dilation=2)
+        self.conv3 = nn.Conv2d(32, 32, 3, padding=1, groups=2)
+        self.relu = nn.ReLU()
+        self.fc1 = nn.Linear(32 * 3 * 3, 64)
+        self.fc2 = nn.Linear(64, 10)
+        self.fc3 = nn.Linear(10, 10)
+
+    def forward(self, x):
+        x = self.relu(self.conv1(x))
+        x = self.relu(self.conv2(x))
+        x = self.relu(self.conv3(x))
+        x = torch.flatten(x, 1)
+        return self.fc3(self.fc2(self.relu(self.fc1(x))))
+
+
+class FanInOneNet(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv = nn.Conv2d(1, 8, 1)
+        self.fc = nn.Linear(1, 8)
+
+    def forward(self, x, y):
+        return self.conv(x), self.fc(y)
+
+
+class Attention(nn.Module):
+    def forward(self, q, k):
+        return torch.matmul(q, k.transpose(-2, -1))
+
+
+def _integer(x_frac_width, w_frac_width, b_frac_width, width=8):
+    return {
+        "config": {
+            "name": "integer",
+            "data_in_width": width,
+            "data_in_frac_width": x_frac_width,
+            "weight_width": width,
+            "weight_frac_width": w_frac_width,
+            "bias_width": 8,
+            "bias_frac_width": b_frac_width,
+        }
+    }
+
+
+def test_integer_backend():
+    torch.manual_seed(0)
+    mg = MaseGraph(ConvNet().eval())
+    x = torch.randn(4, 3, 6, 6) * 2
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": x}, "add_value": False}
+    )
+    quan_args = {
+        "by": "name",
+        "default": {"config": {"name": None}},
+        "conv1": _integer(4, 6, 4),
+        "conv2": _integer(3, 7, 7),
+        "conv3": _integer(3, 7, 7),
+        # the bias has more fractional bits than the products
+        "fc1": _integer(2, 3, 6),
+        "fc2": _integer(4, 4, 4, width=12),
+        "fc3": _integer(4, 4, 4),
+    }
+    mg, _ = quantize_transform_pass(mg, quan_args)
+    with torch.no_grad():
+        expected = mg.model(x)
+
+    mg, info = integer_backend_transform_pass(mg, {})
+    layers = info["layers"]
+    assert layers["conv1"]["integer"] and layers["conv2"]["integer"]
+    assert layers["fc1"]["integer"] and layers["fc3"]["integer"]
+    assert layers["conv3"]["reason"] == "unsupported convolution"
+    assert layers["fc2"]["reason"] == "wider than 8 bits"
+    assert isinstance(mg.modules["conv2"], Conv2dIntegerArith)
+    assert isinstance(mg.modules["fc1"], LinearIntegerArith)
+    assert mg.modules["fc1"].weight_codes.dtype == torch.int8
+
+    with torch.no_grad():
+        output = mg.model(x)
+    assert torch.equal(output, expected)
+
+    # layers with a single input feature
+    mg = MaseGraph(FanInOneNet().eval())
+    x, y = torch.randn(4, 1, 5, 5), torch.randn(4, 5, 1)
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": x, "y": y}, "add_value": False}
+    )
+    mg, _ = quantize_transform_pass(
+        mg, {"by": "name", "conv": _integer(4, 6, 4), "fc": _integer(4, 6, 4)}
+    )
+    with torch.no_grad():
+        expected = mg.model(x, y)
+    mg, info = integer_backend_transform_pass(mg, {})
+    assert info["layers"]["conv"]["integer"] and info["layers"]["fc"]["integer"]
+    with torch.no_grad():
+        output = mg.model(x, y)
+    assert all(torch.equal(o, e) for o, e in zip(output, expected))
+
+    # functions, on codes spanning the whole range
+    config = _integer(4, 5, 0)["config"]
+    a = torch.randn(2, 3, 5, 64) * 8
+    b = torch.randn(2, 3, 64, 7) * 4
+    w = torch.randn(64, 7) * 4
+    for fake_quantized, args in [
+        (matmul_integer, (a, b)),
+        (matmul_integer, (a, w)),
+        # vector operands
+        (matmul_integer, (a[0, 0], w[:, 0])),
+        (matmul_integer, (w[:, 0], b)),
+        (matmul_integer, (w[:, 0], w[:, 1])),
+        (matmul_integer, (a[..., :1], w[:1])),
+        (bmm_integer, (a[0], b[0])),
+        (add_integer, (a, a.flip(-1))),
+        (mult_integer, (a, a.flip(-1))),
+    ]:
+        integer = INTEGER_ARITH_FUNCS[fake_quantized]
+        assert torch.equal(integer(*args, config), fake_quantized(*args, config))
+    assert torch.equal(
+        add_integer(a, 1, config), INTEGER_ARITH_FUNCS[add_integer](a, 1, config)
+    )
+
+    # a graph with a fake-quantized matmul
+    mg = MaseGraph(Attention())
+    for node in mg.fx_graph.nodes:
+        if node.target == torch.matmul:
+            node.target = matmul_integer
+            node.kwargs = {"config": config}
+    mg.model.recompile()
+    expected = mg.model(a, a)
+    mg, info = integer_backend_transform_pass(mg, {})
+    assert info["functions"] == {"matmul": {"integer": True}}
+    assert "matmul_integer_arith" in mg.model.code
+    assert torch.equal(mg.model(a, a), expected)
+    logger.info("The integer backend matches the fake-quantized graph")
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_integer_backend()
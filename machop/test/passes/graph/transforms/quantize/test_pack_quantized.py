@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# Checks that the pack quantized pass stores the weights of integer, binary and ternary
+# layers packed, computes the same outputs as the quantized layers, and that the packed
+# model is rebuilt from its saved file.
+
+import logging
+import os
+import sys
+import tempfile
+
+import torch
+import torch.nn as nn
+
+sys.path.append(
+    os.path.join(
+        os.path.dirname(os.path.realpath(__file__)),
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "..",
+        "machop",
+    )
+)
+
+from chop.ir.graph import MaseGraph
+from chop.passes.graph import (
+    add_common_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+    pack_quantized_transform_pass,
+    quantize_transform_pass,
+)
+from chop.passes.graph.transforms.quantize import load_packed_model
+from chop.passes.graph.transforms.quantize.packed_modules import (
+    PackedConv2d,
+    PackedLinear,
+    pack_codes,
+    unpack_codes,
+)
+from chop.passes.graph.transforms.quantize.quantized_modules import (
+    Conv2dBinary,
+    Conv2dTernary,
+)
+from chop.tools.logger import set_logging_verbosity
+
+logger = logging.getLogger("chop.test")
+set_logging_verbosity("debug")
+
+
+class ConvNet(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.conv1 = nn.Conv2d(3, 16, 3, padding=1)
+        self.conv2 = nn.Conv2d(16, 32, 3, stride=2, padding=1)
+        self.conv3 = nn.Conv2d(32, 32, 3, padding=1, bias=False)
+        self.conv4 = nn.Conv2d(32, 32, 3, padding=1, bias=False)
+        self.relu = nn.ReLU()
+        self.fc1 = nn.Linear(32 * 4 * 4, 64)
+        self.fc2 = nn.Linear(64, 10)
+
+    def forward(self, x):
+        x = self.relu(self.conv1(x))
+        x = self.relu(self.conv2(x))
+        x = self.relu(self.conv3(x))
+        x = self.relu(self.conv4(x))
+        x = torch.flatten(x, 1)
+        return self.fc2(self.relu(self.fc1(x)))
+
+
+def _integer(width, frac_width):
+    return {
+        "config": {
+            "name": "integer",
+            "data_in_width": 8,
+            "data_in_frac_width": 4,
+            "weight_width": width,
+            "weight_frac_width": frac_width,
+            "bias_width": 8,
+            "bias_frac_width": 4,
+        }
+    }
+
+
+def _sign_layer(cls, conv, config):
+    module = cls(
+        conv.in_channels,
+        conv.out_channels,
+        conv.kernel_size,
+        padding=conv.padding,
+        bias=False,
+        config=config,
+    )
+    module.weight.data.copy_(conv.weight.data)
+    return module
+
+
+def test_pack_quantized():
+    codes = torch.randint(0, 16, (1001,))
+    for bits in [1, 2, 4]:
+        values = codes % 2**bits
+        packed = pack_codes(values, bits)
+        assert packed.numel() == -(-1001 * bits // 8)
+        assert torch.equal(unpack_codes(packed, bits, 1001).long(), values)
+
+    torch.manual_seed(0)
+    mg = MaseGraph(ConvNet().eval())
+    x = torch.randn(2, 3, 8, 8)
+    mg, _ = init_metadata_analysis_pass(mg, None)
+    mg, _ = add_common_metadata_analysis_pass(
+        mg, {"dummy_in": {"x": x}, "add_value": False}
+    )
+    quan_args = {
+        "by": "name",
+        "default": {"config": {"name": None}},
+        "conv1": _integer(8, 6),
+        "conv2": _integer(4, 3),
+        "fc1": _integer(2, 3),
+        "fc2": _integer(3, 2),
+    }
+    mg, _ = quantize_transform_pass(mg, quan_args)
+    # scaled ternary and bipolar binary weights
+    mg.model.conv3 = _sign_layer(
+        Conv2dTernary,
+        mg.modules["conv3"],
+        {
+            "weight_scaling_factor": True,
+            "weight_mean": 0.1,
+            "weight_median": 0.1,
+            "weight_max": 1.0,
+        },
+    )
+    mg.model.conv4 = _sign_layer(
+        Conv2dBinary,
+        mg.modules["conv4"],
+        {
+            "data_in_stochastic": False,
+            "bias_stochastic": False,
+            "weight_stochastic": False,
+            "data_in_bipolar": True,
+            "bias_bipolar": False,
+            "weight_bipolar": True,
+        },
+    )
+    with torch.no_grad():
+        expected = mg.model(x)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "packed_model.pt")
+        mg, info = pack_quantized_transform_pass(mg, {"save_path": path})
+        layers = info["layers"]
+        formats = {name: layer["format"] for name, layer in layers.items()}
+        assert formats == {
+            "conv1": "int8",
+            "conv2": "int4",
+            "conv3": "ternary",
+            "conv4": "binary",
+            "fc1": "int2",
+            "fc2": "int3",
+        }
+        assert layers["conv3"]["scale"] == "channel"
+        assert layers["conv4"]["scale"] == "tensor"
+        assert isinstance(mg.modules["conv2"], PackedConv2d)
+        assert isinstance(mg.modules["fc1"], PackedLinear)
+        # the weights alone: 8x smaller at 4 bits, 16x with ternary codes
+        assert mg.modules["conv2"].packed_weight.numel() == 32 * 16 * 9 // 2
+        assert layers["conv3"]["ratio"] > 14 and layers["conv4"]["ratio"] > 28
+        assert info["dense"] / info["packed"] > 4
+        assert not any(
+            p.dtype == torch.float32 and p.numel() > 64
+            for p in mg.model.state_dict().values()
+        )
+
+        with torch.no_grad():
+            output = mg.model(x)
+        assert torch.allclose(output, expected, atol=1e-5, rtol=1e-5)
+
+        # rebuilt into a float model of the same architecture
+        model = load_packed_model(ConvNet().eval(), path)
+        assert isinstance(model.conv4, PackedConv2d)
+        with torch.no_grad():
+            assert torch.allclose(model(x), expected, atol=1e-5, rtol=1e-5)
+    logger.info(
+        f"Packed {info['dense']} bytes of quantized layers into {info['packed']}"
+    )
+
+
+# --------------------------------------------------
+#   Execution
+# --------------------------------------------------
+test_pack_quantized()
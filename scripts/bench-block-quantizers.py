@@ -0,0 +1,198 @@
+#! /usr/bin/env python3
+# ---------------------------------------
+# This script benchmarks the block quantizers (block_fp, block_minifloat, block_log)
+# on LLaMA-7B weight and activation shapes, forward and forward + STE backward. The
+# quantizers view the tensor as blocks with block_strided; the reference splits it into
+# blocks with block and unblock, which pad, unfold and fold it. Both quantize the blocks
+# with the same arithmetic, and their outputs are checked to be equal.
+# ---------------------------------------
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import torch
+from tabulate import tabulate
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "machop"))
+
+from chop.passes.graph.transforms.quantize.quantizers import (  # noqa: E402
+    block_fp,
+    block_fp_quantizer,
+    block_log,
+    block_log_quantizer,
+    block_minifloat,
+    block_minifloat_quantizer,
+)
+from chop.passes.graph.transforms.quantize.quantizers.utils import (  # noqa: E402
+    block,
+    unblock,
+)
+
+# name: (shape, block_size, skip_first_dim)
+SHAPES = {
+    "weight 4096x4096": ([4096, 4096], [1, 16], False),
+    "weight 11008x4096": ([11008, 4096], [1, 16], False),
+    "weight 4096x4096, 16x16 blocks": ([4096, 4096], [16, 16], False),
+    "activation 2048x4096": ([1, 2048, 4096], [1, 16], True),
+    "activation 2048x11008": ([1, 2048, 11008], [1, 16], True),
+}
+
+QUANTIZERS = {
+    "block_fp": (
+        block_fp,
+        "_block_fp_quantize",
+        lambda x, b, s: block_fp_quantizer(x, 8, 8, None, b, s),
+    ),
+    "block_minifloat": (
+        block_minifloat,
+        "_block_minifloat_quantize",
+        lambda x, b, s: block_minifloat_quantizer(x, 8, 4, 8, b, s),
+    ),
+    "block_log": (
+        block_log,
+        "_block_log_quantize",
+        lambda x, b, s: block_log_quantizer(x, 6, 4, b, s),
+    ),
+}
+
+
+def _blocked(quantize_blocks):
+    # the former quantizer, splitting x into blocks with block and unblock
+    def quantize(x, *args, block_size, skip_first_dim):
+        blocked_x, per_block_max, padded_x_shape, block_shape = block(
+            x, block_shape=block_size, skip_first_dim=skip_first_dim
+        )
+        blocked_q = quantize_blocks(blocked_x, per_block_max, *args)
+        return unblock(
+            blocked_q,
+            x_shape_before_blocking=list(x.shape),
+            padded_x_shape=padded_x_shape,
+            block_shape=block_shape,
+            skipped_first_dim_when_blocking=skip_first_dim,
+        )
+
+    return quantize
+
+
+def _reference_block_fp(
+    x, width, exponent_width, exponent_bias, block_size, skip_first_dim
+):
+    msfp_x = _blocked(block_fp._block_fp_quantize_blocks)(
+        x,
+        width,
+        exponent_width,
+        exponent_bias,
+        block_size=block_size,
+        skip_first_dim=skip_first_dim,
+    )
+    is_close_to_0 = torch.isclose(x, torch.tensor([0.0], dtype=x.dtype))
+    return (~is_close_to_0) * msfp_x + (is_close_to_0) * x
+
+
+def _reference_block_minifloat(
+    x, width, exponent_width, exponent_bias_width, block_size, skip_first_dim
+):
+    return _blocked(block_minifloat._block_minifloat_quantize_blocks)(
+        x,
+        width,
+        exponent_width,
+        exponent_bias_width,
+        block_size=block_size,
+        skip_first_dim=skip_first_dim,
+    )
+
+
+def _reference_block_log(x, width, exponent_bias_width, block_size, skip_first_dim):
+    return _blocked(block_log._block_log_quantize_blocks)(
+        x,
+        width,
+        exponent_bias_width,
+        block_size=block_size,
+        skip_first_dim=skip_first_dim,
+    )
+
+
+REFERENCES = {
+    "block_fp": _reference_block_fp,
+    "block_minifloat": _reference_block_minifloat,
+    "block_log": _reference_block_log,
+}
+
+
+def _latency(fn, repeats):
+    fn()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def _forward_backward(quantizer, x, block_size, skip_first_dim):
+    x.grad = None
+    quantizer(x, block_size, skip_first_dim).sum().backward()
+
+
+def _measure(quantizer, x, block_size, skip_first_dim, repeats):
+    with torch.no_grad():
+        forward = _latency(lambda: quantizer(x, block_size, skip_first_dim), repeats)
+    backward = _latency(
+        lambda: _forward_backward(quantizer, x, block_size, skip_first_dim), repeats
+    )
+    return forward, backward
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    torch.manual_seed(0)
+
+    table = []
+    for shape_name, (shape, block_size, skip_first_dim) in SHAPES.items():
+        x = torch.randn(shape).requires_grad_()
+        for name, (module, function, quantizer) in QUANTIZERS.items():
+            strided = _measure(quantizer, x, block_size, skip_first_dim, args.repeats)
+            with torch.no_grad():
+                output = quantizer(x, block_size, skip_first_dim)
+            fused = getattr(module, function)
+            setattr(module, function, REFERENCES[name])
+            try:
+                with torch.no_grad():
+                    assert torch.equal(
+                        quantizer(x, block_size, skip_first_dim), output
+                    ), name
+                reference = _measure(
+                    quantizer, x, block_size, skip_first_dim, args.repeats
+                )
+            finally:
+                setattr(module, function, fused)
+            table.append(
+                [
+                    shape_name,
+                    name,
+                    f"{reference[0] * 1e3:.1f}",
+                    f"{strided[0] * 1e3:.1f}",
+                    f"{reference[0] / strided[0]:.2f}",
+                    f"{reference[1] * 1e3:.1f}",
+                    f"{strided[1] * 1e3:.1f}",
+                    f"{reference[1] / strided[1]:.2f}",
+                ]
+            )
+    headers = [
+        "Shape",
+        "Quantizer",
+        "Reference fwd (ms)",
+        "Strided fwd (ms)",
+        "Speedup",
+        "Reference fwd+bwd (ms)",
+        "Strided fwd+bwd (ms)",
+        "Speedup",
+    ]
+    print(tabulate(table, headers=headers, tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
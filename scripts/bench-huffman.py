@@ -0,0 +1,119 @@
+#! /usr/bin/env python3
+# ---------------------------------------
+# This script benchmarks the canonical Huffman coding of quantized weights: the
+# compression ratio against fp32 and the encoding and decoding throughput, in MB of
+# fp32 weights per second. With --reference, decoding is also timed for the former
+# format of one '0'/'1' string per weight looked up in a dict.
+# ---------------------------------------
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+import torch
+from tabulate import tabulate
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "machop"))
+
+from chop.passes.graph.transforms.huffman.canonical import (  # noqa: E402
+    HuffmanEncoded,
+    canonical_codes,
+)
+
+# name, weight shape
+WEIGHTS = [
+    ("conv 64x64x3x3", (64, 64, 3, 3)),
+    ("conv 256x256x3x3", (256, 256, 3, 3)),
+    ("conv 512x512x3x3", (512, 512, 3, 3)),
+    ("linear 4096x4096", (4096, 4096)),
+]
+# fixed-point width, fractional width, sparsity
+QUANTIZATIONS = [(8, 6, 0.0), (4, 3, 0.0), (8, 6, 0.9)]
+
+
+def _quantized(shape, width, frac_width, sparsity, rng):
+    weights = rng.standard_normal(shape).astype(np.float32) * 0.5
+    weights[rng.random(shape) < sparsity] = 0
+    scale = 2.0**frac_width
+    bound = 2.0 ** (width - 1)
+    return (np.clip(np.round(weights * scale), -bound, bound - 1) / scale).astype(
+        np.float32
+    )
+
+
+def _timed(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, sorted(times)[len(times) // 2]
+
+
+def _reference_format(encoded):
+    # the former format: a '0'/'1' string per weight and a list of (value, code)
+    codes = canonical_codes(encoded.lengths)
+    huffman_tree = [
+        (symbol, format(int(code), f"0{length}b"))
+        for symbol, code, length in zip(encoded.symbols, codes, encoded.lengths)
+    ]
+    bits = "".join(map(str, np.unpackbits(encoded.data, count=encoded.num_bits)))
+    codes = {code for _, code in huffman_tree}
+    encoded_weights, start = [], 0
+    for end in range(1, len(bits) + 1):
+        if bits[start:end] in codes:
+            encoded_weights.append(bits[start:end])
+            start = end
+    return encoded_weights, huffman_tree
+
+
+def _reference_decode(encoded_weights, huffman_tree, shape):
+    # the former decoder, a dict lookup per weight
+    reverse_huffman_tree = {code: weight for weight, code in huffman_tree}
+    decoded_weights = []
+    for encoded_weight in encoded_weights:
+        decoded_weights.append(reverse_huffman_tree[encoded_weight])
+    return torch.tensor(decoded_weights).reshape(shape)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--reference", action="store_true")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    table = []
+    for name, shape in WEIGHTS:
+        for width, frac_width, sparsity in QUANTIZATIONS:
+            weights = _quantized(shape, width, frac_width, sparsity, rng)
+            megabytes = weights.nbytes / 1e6
+            encoded, encode_time = _timed(
+                lambda: HuffmanEncoded.encode(weights), args.repeats
+            )
+            out = np.empty_like(weights)
+            _, decode_time = _timed(lambda: encoded.decode(out=out), args.repeats)
+            assert np.array_equal(out, weights)
+            row = [
+                name,
+                f"int{width} s{sparsity}",
+                f"{weights.nbytes / encoded.nbytes:.2f}",
+                f"{megabytes / encode_time:.0f}",
+                f"{megabytes / decode_time:.0f}",
+            ]
+            if args.reference:
+                encoded_weights, huffman_tree = _reference_format(encoded)
+                _, reference_time = _timed(
+                    lambda: _reference_decode(encoded_weights, huffman_tree, shape), 1
+                )
+                row.append(f"{megabytes / reference_time:.1f}")
+            table.append(row)
+    headers = ["Weight", "Quantization", "Ratio", "Encode (MB/s)", "Decode (MB/s)"]
+    if args.reference:
+        headers.append("Reference decode (MB/s)")
+    print(tabulate(table, headers=headers, tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#! /usr/bin/env python3
+# ---------------------------------------
+# This script benchmarks the integer backend against the fake quantization of integer
+# quantized layers and functions on CPU, in inference. Both compute the same outputs,
+# which is checked; the fake quantization multiplies and accumulates in fp32, the
+# integer backend in int8 with int32 accumulators.
+# ---------------------------------------
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import torch
+from tabulate import tabulate
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "machop"))
+
+from chop.passes.graph.transforms.quantize.integer_arith import (  # noqa: E402
+    Conv2dIntegerArith,
+    LinearIntegerArith,
+    matmul_integer_arith,
+)
+from chop.passes.graph.transforms.quantize.quantized_funcs import (  # noqa: E402
+    matmul_integer,
+)
+from chop.passes.graph.transforms.quantize.quantized_modules import (  # noqa: E402
+    Conv2dInteger,
+    LinearInteger,
+)
+
+CONFIG = {
+    "data_in_width": 8,
+    "data_in_frac_width": 4,
+    "weight_width": 8,
+    "weight_frac_width": 6,
+    "bias_width": 8,
+    "bias_frac_width": 6,
+}
+
+
+def _latency(fn, args, repeats):
+    with torch.no_grad():
+        fn(*args)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fn(*args)
+            times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def _cases(batch_size):
+    x_scale = 2**3
+    linear = LinearInteger(1024, 1024, config=CONFIG).eval()
+    yield "linear 1024x1024", linear, LinearIntegerArith(linear), (
+        torch.randn(batch_size, 64, 1024) * x_scale,
+    )
+    conv = Conv2dInteger(64, 64, 3, padding=1, config=CONFIG).eval()
+    yield "conv2d 64x64 3x3", conv, Conv2dIntegerArith(conv), (
+        torch.randn(batch_size, 64, 32, 32) * x_scale,
+    )
+    matmul = (
+        lambda x, y: matmul_integer(x, y, CONFIG),
+        lambda x, y: matmul_integer_arith(x, y, CONFIG),
+    )
+    yield "matmul 512x1024x1024", *matmul, (
+        torch.randn(512, 1024) * x_scale,
+        torch.randn(1024, 1024),
+    )
+    yield "matmul 12x(64x64x64)", *matmul, (
+        torch.randn(batch_size, 12, 64, 64) * x_scale,
+        torch.randn(batch_size, 12, 64, 64),
+    )
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    torch.manual_seed(0)
+
+    table = []
+    for name, fake_quantized, integer, inputs in _cases(args.batch_size):
+        with torch.no_grad():
+            assert torch.equal(fake_quantized(*inputs), integer(*inputs)), name
+        fake_time = _latency(fake_quantized, inputs, args.repeats)
+        integer_time = _latency(integer, inputs, args.repeats)
+        table.append(
+            [
+                name,
+                f"{fake_time * 1e3:.2f}",
+                f"{integer_time * 1e3:.2f}",
+                f"{fake_time / integer_time:.2f}",
+            ]
+        )
+    headers = ["Operation", "Fake-quantized (ms)", "Integer (ms)", "Speedup"]
+    print(tabulate(table, headers=headers, tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+# ---------------------------------------
+# This script benchmarks copying a MaseGraph with common metadata for a search trial.
+# MaseGraph.clone shares the weights and forks the node metadata copy-on-write, while
+# deepcopy_mase_graph copies the weights. For each copy, it measures the time and the
+# tensor storage that is not shared with the original graph, and checks that both
+# copies compute the outputs of the original.
+# ---------------------------------------
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+import torch
+from tabulate import tabulate
+from torchvision.models import vgg11
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "machop"))
+
+from chop.ir.graph import MaseGraph  # noqa: E402
+from chop.models.vision.resnet.resnet import get_resnet18  # noqa: E402
+from chop.passes.graph import (  # noqa: E402
+    add_common_metadata_analysis_pass,
+    init_metadata_analysis_pass,
+)
+from chop.passes.graph.utils import deepcopy_mase_graph  # noqa: E402
+
+# name: (model, input shape)
+MODELS = {
+    "resnet18": (
+        lambda: get_resnet18(SimpleNamespace(num_classes=1000)),
+        (1, 3, 224, 224),
+    ),
+    "vgg11": (lambda: vgg11(), (1, 3, 224, 224)),
+}
+COPIES = {
+    "deepcopy_mase_graph": deepcopy_mase_graph,
+    "MaseGraph.clone": lambda mg: mg.clone(),
+}
+
+
+def _storages(model):
+    tensors = list(model.parameters()) + list(model.buffers())
+    return {
+        t.untyped_storage().data_ptr(): t.untyped_storage().nbytes() for t in tensors
+    }
+
+
+def _new_storage(original, copied):
+    # bytes of the storages of the copy that the original does not use
+    shared = _storages(original)
+    return sum(n for ptr, n in _storages(copied).items() if ptr not in shared)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    torch.manual_seed(0)
+
+    table = []
+    for name, (get_model, shape) in MODELS.items():
+        x = torch.randn(shape)
+        mg = MaseGraph(get_model().eval())
+        mg, _ = init_metadata_analysis_pass(mg, None)
+        mg, _ = add_common_metadata_analysis_pass(
+            mg, {"dummy_in": {"x": x}, "add_value": False}
+        )
+        with torch.no_grad():
+            y = mg.model(x)
+        for copy_name, copy_graph in COPIES.items():
+            times = []
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                copied = copy_graph(mg)
+                times.append(time.perf_counter() - start)
+            with torch.no_grad():
+                assert torch.equal(copied.model(x), y), (name, copy_name)
+            table.append(
+                [
+                    name,
+                    copy_name,
+                    f"{sorted(times)[len(times) // 2] * 1e3:.1f}",
+                    f"{_new_storage(mg.model, copied.model) / 2**20:.2f}",
+                ]
+            )
+            del copied
+    headers = ["Model", "Copy", "Time (ms)", "New tensor storage (MiB)"]
+    print(tabulate(table, headers=headers, tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#! /usr/bin/env python3
+# ---------------------------------------
+# This script benchmarks the CPU latency and size of models whose channel-pruned
+# Conv2d layers are physically shrunk by the prune_shrink pass. Every Conv2d gets a
+# channel-wise L1 mask removing a fraction of its output channels; the masked model is
+# compared with the shrunk one, whose outputs are checked to match.
+# ---------------------------------------
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+import torch
+import torch.nn as nn
+from tabulate import tabulate
+from torch.nn.utils import parametrize
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "machop"))
+
+from chop.ir.graph import MaseGraph  # noqa: E402
+from chop.models.vision.resnet.resnet import get_resnet18  # noqa: E402
+from chop.models.vision.vgg_cifar.vgg_cifar import get_vgg7  # noqa: E402
+from chop.passes.graph import prune_shrink_transform_pass  # noqa: E402
+from chop.passes.graph.transforms.pruning.sparse_parameterization import (  # noqa: E402
+    FakeSparseWeight,
+)
+
+INFO = SimpleNamespace(image_size=(3, 32, 32), num_classes=10)
+MODELS = {
+    "VGG7": lambda: get_vgg7(INFO),
+    "ResNet18": lambda: get_resnet18(INFO),
+}
+
+
+def _prune_channels(model, sparsity):
+    # channel-wise L1 masks on every Conv2d, the biases are left as they are
+    for module in model.modules():
+        if not isinstance(module, nn.Conv2d):
+            continue
+        norms = module.weight.detach().abs().sum(dim=(1, 2, 3))
+        pruned = norms.argsort()[: int(sparsity * len(norms))]
+        mask = torch.ones_like(module.weight, dtype=torch.bool)
+        mask[pruned] = False
+        parametrize.register_parametrization(module, "weight", FakeSparseWeight(mask))
+
+
+def _randomize_batchnorm(model):
+    # trained-like statistics, so that removed channels output nonzero constants
+    for module in model.modules():
+        if isinstance(module, nn.BatchNorm2d):
+            module.running_mean.normal_(0, 0.1)
+            module.running_var.uniform_(0.5, 2)
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.normal_(0, 0.1)
+
+
+def _num_params(model):
+    return sum(p.numel() for p in model.parameters())
+
+
+def _latency(model, x, repeats):
+    with torch.no_grad():
+        for _ in range(3):
+            model(x)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model(x)
+            times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--sparsity", type=float, default=0.5)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+
+    table = []
+    x = torch.randn(args.batch_size, *INFO.image_size)
+    for name, get_model in MODELS.items():
+        model = get_model()
+        _randomize_batchnorm(model)
+        _prune_channels(model, args.sparsity)
+        model.eval()
+        mg = MaseGraph(model=model)
+        with torch.no_grad():
+            y = mg.model(x)
+        masked = _latency(mg.model, x, args.repeats)
+        params = _num_params(mg.model)
+        mg, info = prune_shrink_transform_pass(mg)
+        with torch.no_grad():
+            error = (mg.model(x) - y).abs().max().item()
+        assert error < 1e-3 * y.abs().max().item(), name
+        shrunk = _latency(mg.model, x, args.repeats)
+        table.append(
+            [
+                name,
+                f"{masked * 1e3:.1f}",
+                f"{shrunk * 1e3:.1f}",
+                f"{params / 1e6:.2f}",
+                f"{_num_params(mg.model) / 1e6:.2f}",
+                sum(info["unfoldable"].values()),
+                f"{error:.1e}",
+            ]
+        )
+    headers = [
+        "Model",
+        "Masked (ms)",
+        "Shrunk (ms)",
+        "Masked params (M)",
+        "Shrunk params (M)",
+        "Kept pruned channels",
+        "Max abs error",
+    ]
+    print(tabulate(table, headers=headers, tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
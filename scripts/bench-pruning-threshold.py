@@ -0,0 +1,98 @@
+#! /usr/bin/env python3
+# ---------------------------------------
+# This script benchmarks the selection of pruning thresholds on tensors of 100M+
+# elements, where torch.quantile refuses its input. It compares the exact streaming
+# select of sparsity_threshold with torch.kthvalue and with the former fallback, which
+# averaged the quantiles of 1M-element chunks and so misclassified some elements. The
+# global case ranks several layers together; the reference concatenates them.
+# ---------------------------------------
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import torch
+from tabulate import tabulate
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "machop"))
+
+from chop.passes.graph.transforms.pruning.selection import (  # noqa: E402
+    sparsity_threshold,
+)
+
+
+def _chunked_quantile_mean(flat, sparsity):
+    # the former fallback for inputs too large for torch.quantile
+    batch_unit = int(1e6)
+    quantiles = [
+        torch.quantile(flat[start : start + batch_unit], sparsity)
+        for start in range(0, flat.numel(), batch_unit)
+    ]
+    return torch.mean(torch.tensor(quantiles))
+
+
+def _kthvalue(flat, sparsity):
+    k = int(sparsity * (flat.numel() - 1))
+    return torch.kthvalue(flat, k + 1).values
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def _misclassified(tensors, threshold, exact):
+    return sum(int(((t.abs() > threshold) != (t.abs() > exact)).sum()) for t in tensors)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--numel", type=int, default=100_000_000)
+    parser.add_argument("--layers", type=int, default=7)
+    parser.add_argument("--sparsity", type=float, default=0.5)
+    args = parser.parse_args()
+    torch.manual_seed(0)
+    sparsity = args.sparsity
+
+    table = []
+    # local: a single tensor
+    x = torch.randn(args.numel)
+    exact, exact_time = _timed(lambda: sparsity_threshold(x, sparsity, torch.abs))
+    rows = [("local", "sparsity_threshold", [x], exact, exact_time)]
+    threshold, t = _timed(lambda: _kthvalue(x.abs(), sparsity))
+    rows.append(("local", "torch.kthvalue", [x], threshold, t))
+    threshold, t = _timed(lambda: _chunked_quantile_mean(x.abs(), sparsity))
+    rows.append(("local", "chunked quantile mean", [x], threshold, t))
+    for scope, method, tensors, threshold, t in rows:
+        misclassified = _misclassified(tensors, threshold, exact)
+        table.append([scope, args.numel, method, f"{t:.2f}", misclassified])
+    del x
+
+    # global: layers of different sizes and scales ranked together
+    sizes = [2 ** (i % 3) for i in range(args.layers)]
+    sizes = [args.numel * s // sum(sizes) for s in sizes]
+    layers = [torch.randn(size) * (i + 1) for i, size in enumerate(sizes)]
+    numel = sum(sizes)
+    exact, exact_time = _timed(lambda: sparsity_threshold(layers, sparsity, torch.abs))
+    rows = [("global", "sparsity_threshold", exact, exact_time)]
+    threshold, t = _timed(
+        lambda: _kthvalue(torch.cat([layer.abs() for layer in layers]), sparsity)
+    )
+    rows.append(("global", "concatenate + torch.kthvalue", threshold, t))
+    threshold, t = _timed(
+        lambda: _chunked_quantile_mean(
+            torch.cat([layer.abs() for layer in layers]), sparsity
+        )
+    )
+    rows.append(("global", "concatenate + chunked quantile mean", threshold, t))
+    for scope, method, threshold, t in rows:
+        misclassified = _misclassified(layers, threshold, exact)
+        table.append([scope, numel, method, f"{t:.2f}", misclassified])
+
+    headers = ["Scope", "Elements", "Method", "Time (s)", "Misclassified"]
+    print(tabulate(table, headers=headers, tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
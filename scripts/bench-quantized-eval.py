@@ -0,0 +1,159 @@
+#! /usr/bin/env python3
+# ---------------------------------------
+# This script benchmarks the evaluation of a quantized OPT model with RunnerBasicEval,
+# as run by the search strategies: in eval mode with autograd disabled. The quantized
+# linear layers memoize their quantized weights and biases across forward passes; the
+# reference quantizes them again in every forward pass. The model is randomly
+# initialised and evaluated on random tokens, so that no download is needed.
+# ---------------------------------------
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import torch
+from tabulate import tabulate
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "machop"))
+
+from chop.actions.search.strategies.runners.software import (  # noqa: E402
+    RunnerBasicEval,
+)
+from chop.models import get_model_info  # noqa: E402
+from chop.models.manual.opt_quantized import (  # noqa: E402
+    OPTQuantizedConfig,
+    OPTQuantizedForCausalLM,
+)
+from chop.passes.graph.transforms.quantize.quantized_modules import (  # noqa: E402
+    linear,
+)
+
+QUANTIZATIONS = {
+    "integer": {
+        "name": "integer",
+        "data_in_width": 8,
+        "data_in_frac_width": 4,
+        "weight_width": 8,
+        "weight_frac_width": 6,
+        "bias_width": 8,
+        "bias_frac_width": 6,
+    },
+    "minifloat_denorm": {
+        "name": "minifloat_denorm",
+        "data_in_width": 8,
+        "data_in_exponent_width": 4,
+        "data_in_exponent_bias": 7,
+        "weight_width": 8,
+        "weight_exponent_width": 4,
+        "weight_exponent_bias": 7,
+        "bias_width": 8,
+        "bias_exponent_width": 4,
+        "bias_exponent_bias": 7,
+    },
+}
+
+
+class RandomTokens:
+    """A data module of random token batches for causal language modelling."""
+
+    def __init__(self, num_batches, batch_size, seq_len, vocab_size):
+        self.batch_size = batch_size
+        generator = torch.Generator().manual_seed(0)
+        self.batches = []
+        for _ in range(num_batches):
+            input_ids = torch.randint(
+                vocab_size, (batch_size, seq_len), generator=generator
+            )
+            self.batches.append(
+                {
+                    "input_ids": input_ids,
+                    "attention_mask": torch.ones_like(input_ids),
+                    "labels": input_ids,
+                }
+            )
+
+    def val_dataloader(self):
+        return self.batches
+
+
+def _uncached(module, name, quantizer, tensor):
+    # the former forward pass, quantizing the parameters every time
+    return None if tensor is None else quantizer(tensor)
+
+
+def _evaluate(model, data_module, num_samples):
+    runner = RunnerBasicEval(
+        get_model_info("opt_quantized"),
+        "lm",
+        None,
+        "cpu",
+        {"num_samples": num_samples},
+    )
+    start = time.perf_counter()
+    with torch.no_grad():
+        metrics = runner(data_module, model, None)
+    return metrics, time.perf_counter() - start
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--layers", type=int, default=4)
+    parser.add_argument("--hidden-size", type=int, default=768)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--seq-len", type=int, default=32)
+    parser.add_argument("--num-batches", type=int, default=8)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    torch.manual_seed(0)
+
+    table = []
+    for name, quant_config in QUANTIZATIONS.items():
+        config = OPTQuantizedConfig(
+            hidden_size=args.hidden_size,
+            ffn_dim=4 * args.hidden_size,
+            num_attention_heads=args.hidden_size // 64,
+            num_hidden_layers=args.layers,
+            quant_config={"default": quant_config},
+        )
+        model = OPTQuantizedForCausalLM(config).eval()
+        data_module = RandomTokens(
+            args.num_batches, args.batch_size, args.seq_len, config.vocab_size
+        )
+        num_samples = args.num_batches * args.batch_size
+
+        cached = linear.cached_quantize
+        linear.cached_quantize = _uncached
+        try:
+            reference = [
+                _evaluate(model, data_module, num_samples) for _ in range(args.repeats)
+            ]
+        finally:
+            linear.cached_quantize = cached
+        # the first evaluation quantizes and memoizes the parameters
+        memoized = [
+            _evaluate(model, data_module, num_samples) for _ in range(args.repeats + 1)
+        ]
+        assert memoized[-1][0] == reference[-1][0]
+        reference_time = sorted(t for _, t in reference)[len(reference) // 2]
+        memoized_time = sorted(t for _, t in memoized[1:])[args.repeats // 2]
+        table.append(
+            [
+                name,
+                f"{reference_time:.3f}",
+                f"{memoized[0][1]:.3f}",
+                f"{memoized_time:.3f}",
+                f"{reference_time / memoized_time:.2f}",
+            ]
+        )
+    headers = [
+        "Quantization",
+        "Reference (s)",
+        "First eval (s)",
+        "Memoized (s)",
+        "Speedup",
+    ]
+    print(tabulate(table, headers=headers, tablefmt="github"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#! /usr/bin/env python3
+# ---------------------------------------
+# This script benchmarks the CPU latency of pruned layers run dense and with the
+# sparse modules of the sparse inference pass, across sparsity levels. The
+# predicted speedup of the pass cost model is printed next to the measured one.
+# ---------------------------------------
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+import torch
+import torch.nn as nn
+from tabulate import tabulate
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "machop"))
+
+from chop.passes.graph.transforms.pruning.sparse_inference import (  # noqa: E402
+    DEFAULT_CONFIG,
+    predicted_speedup,
+)
+from chop.passes.graph.transforms.pruning.sparse_modules import (  # noqa: E402
+    SparseConv2d,
+    SparseLinear,
+)
+
+# name, layer, input shape
+LAYERS = [
+    ("linear 1024x1024 b1", lambda: nn.Linear(1024, 1024), (1, 1024)),
+    ("linear 1024x1024 b32", lambda: nn.Linear(1024, 1024), (32, 1024)),
+    ("linear 4096x1024 b256", lambda: nn.Linear(1024, 4096), (256, 1024)),
+    ("conv 64->64 56x56 b1", lambda: nn.Conv2d(64, 64, 3, padding=1), (1, 64, 56, 56)),
+    (
+        "conv 128->128 32x32 b8",
+        lambda: nn.Conv2d(128, 128, 3, padding=1),
+        (8, 128, 32, 32),
+    ),
+    (
+        "conv 256->256 16x16 b8",
+        lambda: nn.Conv2d(256, 256, 3, padding=1),
+        (8, 256, 16, 16),
+    ),
+    ("conv 512->512 8x8 b1", lambda: nn.Conv2d(512, 512, 3, padding=1), (1, 512, 8, 8)),
+    ("conv 512->512 8x8 b8", lambda: nn.Conv2d(512, 512, 3, padding=1), (8, 512, 8, 8)),
+]
+SPARSITIES = [0.5, 0.7, 0.8, 0.9, 0.95, 0.98]
+
+
+def _prune(layer, sparsity):
+    scores = layer.weight.detach().abs().flatten()
+    k = int(sparsity * scores.numel())
+    if k > 0:
+        threshold = scores.kthvalue(k).values
+        layer.weight.data[layer.weight.abs() <= threshold] = 0
+
+
+def _latency(module, x, repeats):
+    with torch.no_grad():
+        for _ in range(3):
+            module(x)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            module(x)
+            times.append(time.perf_counter() - start)
+    return sorted(times)[len(times) // 2]
+
+
+def main():
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument(
+        "--sparsity", type=float, nargs="+", default=SPARSITIES, help="levels to test"
+    )
+    args = parser.parse_args()
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+
+    table = []
+    for name, make_layer, shape in LAYERS:
+        x = torch.randn(shape)
+        for sparsity in args.sparsity:
+            layer = make_layer().eval()
+            _prune(layer, sparsity)
+            cls = SparseLinear if isinstance(layer, nn.Linear) else SparseConv2d
+            sparse = cls.from_dense(layer)
+            dense_time = _latency(layer, x, args.repeats)
+            sparse_time = _latency(sparse, x, args.repeats)
+            table.append(
+                [
+                    name,
+                    f"{sparsity:.2f}",
+                    f"{dense_time * 1e3:.2f}",
+                    f"{sparse_time * 1e3:.2f}",
+                    f"{dense_time / sparse_time:.2f}",
+                    f"{predicted_speedup(layer, sparse.density, DEFAULT_CONFIG):.2f}",
+                ]
+            )
+    print(
+        tabulate(
+            table,
+            headers=[
+                "Layer",
+                "Sparsity",
+                "Dense (ms)",
+                "Sparse (ms)",
+                "Speedup",
+                "Predicted",
+            ],
+            tablefmt="github",
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()